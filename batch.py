@@ -0,0 +1,110 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from workflow import app
+from state import initial_state, time_to_first_file
+from cache import response_cache
+from routing import pool
+from plans import record_run
+import tracing
+import config
+
+
+def load_specs(path):
+    """Reads one {"requirements", "project_root"} object per line, skipping blank lines."""
+    specs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            spec = json.loads(line)
+            if "requirements" not in spec or "project_root" not in spec:
+                raise ValueError(f"{path}:{line_no}: spec needs 'requirements' and 'project_root'")
+            specs.append(spec)
+    return specs
+
+
+async def build_project(spec, limit):
+    """Runs one spec through the workflow and writes its summary into the project root."""
+    async with limit:
+        print(f"\n🚀 [Batch] Starting {spec['project_root']}")
+        start = time.perf_counter()
+        summary = {"project_root": spec["project_root"], "requirements": spec["requirements"]}
+        try:
+            final_state = await app.ainvoke(
+                initial_state(spec["requirements"], spec["project_root"]),
+                config={"recursion_limit": 50}
+            )
+            summary.update({
+                "test_status": final_state["test_status"],
+                "iterations": final_state["iteration_count"],
+                "tasks_completed": len(final_state["completed_tasks"]),
+                "time_to_first_file": time_to_first_file(final_state),
+                "final_report": final_state.get("final_report"),
+                "reused_plan_from": (final_state.get("reused_plan") or {}).get("run_id"),
+            })
+            record_run(final_state)
+        except Exception as e:
+            summary.update({"test_status": "error", "error": str(e)})
+        summary["seconds"] = round(time.perf_counter() - start, 2)
+
+        os.makedirs(spec["project_root"], exist_ok=True)
+        with open(os.path.join(spec["project_root"], "build_summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+        print(f"\n🏁 [Batch] {spec['project_root']}: {summary['test_status'].upper()} in {summary['seconds']}s")
+        return summary
+
+
+async def run_batch(specs, concurrency=config.BATCH_CONCURRENCY):
+    """Builds every spec, at most `concurrency` projects at a time."""
+    limit = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*(build_project(spec, limit) for spec in specs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build many DynamicFlow projects from a JSONL file of specs.")
+    parser.add_argument("specs", help="JSONL file with one {requirements, project_root} object per line")
+    parser.add_argument("-c", "--concurrency", type=int, default=config.BATCH_CONCURRENCY,
+                        help="Projects to build at the same time")
+    parser.add_argument("-o", "--output", default=os.path.join(config.STATE_DIR, "batch_results.jsonl"),
+                        help="Where to write one result line per project")
+    args = parser.parse_args(argv)
+
+    os.makedirs("./builds", exist_ok=True)
+    specs = load_specs(args.specs)
+    print(f"📦 [Batch] Building {len(specs)} projects, {args.concurrency} at a time...")
+
+    start = time.perf_counter()
+    results = asyncio.run(run_batch(specs, args.concurrency))
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        for summary in results:
+            f.write(json.dumps(summary) + "\n")
+
+    passed = sum(1 for r in results if r["test_status"] == "passed")
+    cache_stats = response_cache.stats()
+    print("\n" + "="*50)
+    print("📦 BATCH FINISHED")
+    print("="*50)
+    print(f"Projects Passed:   {passed}/{len(results)}")
+    print(f"Wall Time:         {elapsed:.1f}s")
+    print(f"LLM Cache:         {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+    for url, endpoint in pool.metrics()["endpoints"].items():
+        print(f"LLM Endpoint:      {url} (concurrency limit {endpoint['limit']}, {'up' if endpoint['healthy'] else 'down'})")
+    print(f"Results:           {args.output}")
+
+    if tracing.ENABLED:
+        print("\n" + tracing.summary_table())
+        print(f"\nTrace written to {tracing.export()}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,747 @@
+"""
+Deterministic benchmark of the orchestration overhead.
+
+Swaps tools.llm / tools.llm_worker for a scripted fake model with configurable
+latency and canned tool calls, then runs the real `app` graph at several plan
+sizes. Reports throughput, p50/p99 node latency and peak Python memory, and
+compares them with a stored baseline so a regression fails the run.
+
+    python benchmark.py                      # 1, 10, 100 and 1000 tasks
+    python benchmark.py --latency 0.05       # add 50ms per model call
+    python benchmark.py --update-baseline    # record the current numbers
+    python benchmark.py --state-tasks 10000  # graph-state merge and checkpoint cost only
+    python benchmark.py --startup            # import cost of each main.py subcommand
+    python benchmark.py --pool 1 2 4 8       # worker tasks/s through the work queue at 1..8 processes
+    python benchmark.py --parse 200          # tasks recovered from malformed plans, old parse vs repair
+    python benchmark.py --similarity         # plan-reuse scores of rewordings and stack swaps
+    python benchmark.py --coalesce           # same-file tasks merge into one worker call
+    python benchmark.py --routing            # balancing, failover and health checks over 2 stub Ollama servers
+"""
+import os
+
+# Node latencies are read from the tracer, and cached responses would skip the graph work
+os.environ["DYNAMICFLOW_TRACE"] = "1"
+os.environ["DYNAMICFLOW_CACHE"] = "0"
+
+import re
+import sys
+import json
+import time
+import shutil
+import threading
+import asyncio
+import argparse
+import tracemalloc
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+import config
+import tools
+import tracing
+from state import initial_state, merge_status
+from tasktable import TaskRecord, TaskStore
+
+SIZES = [1, 10, 100, 1000]
+BASELINE_PATH = os.path.join(config.STATE_DIR, "bench_baseline.json")
+
+
+class ScriptedLLM:
+    """
+    Stands in for ChatOllama. Recognises which agent is calling from the prompt
+    and returns a canned response after `latency` seconds.
+    """
+
+    def __init__(self, n_tasks, project_root, latency=0.0):
+        self.n_tasks = n_tasks
+        self.project_root = project_root
+        self.latency = latency
+
+    def plan(self):
+        tasks = [
+            {
+                "id": f"task_{i}",
+                "description": f"Create file_{i}.txt",
+                "assigned_agent": "frontend" if i % 2 else "backend",
+                "status": "pending",
+                "depends_on": [f"task_{i - 1}"] if i % 10 == 0 else [],
+            }
+            for i in range(1, self.n_tasks + 1)
+        ]
+        return json.dumps({"tasks": tasks})
+
+    def respond(self, prompt):
+        messages = [prompt] if isinstance(prompt, str) else prompt
+        first = messages[0] if isinstance(messages[0], str) else messages[0].content
+
+        if "Lead System Architect" in first:
+            return AIMessage(content='{"backend": "none", "frontend_ui": "static files"}')
+        if "**Planner**" in first:
+            return AIMessage(content=self.plan())
+        if "QA Tester" in first:
+            return AIMessage(content='{"command_executed": "true", "logs": "ok"}')
+        if "Developer" in first:
+            if len(messages) > 1:  # Tool results came back, finish the task
+                return AIMessage(content="done")
+            name = re.search(r"Create (\S+)", first).group(1)
+            return AIMessage(content="", tool_calls=[{
+                "name": "write_file",
+                "args": {"file_path": os.path.join(self.project_root, name), "content": name},
+                "id": f"call_{name}",
+            }])
+        return AIMessage(content="{}")
+
+    def with_format(self, schema):
+        return self
+
+    def invoke(self, prompt, **kwargs):
+        time.sleep(self.latency)
+        return self.respond(prompt)
+
+    async def ainvoke(self, prompt, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self.respond(prompt)
+
+    async def astream(self, prompt, **kwargs):
+        await asyncio.sleep(self.latency)
+        content = self.respond(prompt).content
+        for i in range(0, len(content), 64):
+            yield AIMessageChunk(content=content[i:i + 64])
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_once(app, n_tasks, latency):
+    project_root = f"./builds/bench-{n_tasks}"
+    shutil.rmtree(project_root, ignore_errors=True)
+    tools.llm = tools.llm_worker = ScriptedLLM(n_tasks, project_root, latency)
+    tracing.tracer = tracing.Tracer()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    final_state = asyncio.run(app.ainvoke(
+        initial_state(f"Benchmark with {n_tasks} tasks", project_root),
+        config={"recursion_limit": 50}
+    ))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    shutil.rmtree(project_root, ignore_errors=True)
+
+    completed = len(final_state["completed_tasks"])
+    if completed != n_tasks:
+        raise RuntimeError(f"{n_tasks}-task run completed {completed} tasks")
+
+    node_ms = [e["dur"] / 1000 for e in tracing.tracer.events if e.get("cat") == "node"]
+    return {
+        "tasks": n_tasks,
+        "seconds": elapsed,
+        "tasks_per_s": n_tasks / elapsed,
+        "node_p50_ms": percentile(node_ms, 50),
+        "node_p99_ms": percentile(node_ms, 99),
+        "peak_mb": peak / 1e6,
+    }
+
+
+def merge_task_dicts(existing, new):
+    """The previous completed_tasks reducer: full task dicts upserted by id."""
+    merged = {t["id"]: t for t in existing or []}
+    for task in new or []:
+        merged[task["id"]] = task
+    return list(merged.values())
+
+
+def state_benchmark(n_tasks, supersteps=100):
+    """
+    Per-superstep cost of completed_tasks when `n_tasks` complete over `supersteps`
+    steps: full task dicts in graph state, vs. id/status deltas backed by the task store.
+    Each step is a reducer merge plus writing the merged value to a SQLite checkpoint.
+    """
+    import sqlite3
+    import tempfile
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+    serde = JsonPlusSerializer()
+    tmp = tempfile.TemporaryDirectory()
+    tasks = [
+        {
+            "id": f"task_{i}", "description": f"Create module_{i}.py with the handlers for resource {i} " * 2,
+            "assigned_agent": "backend", "status": "completed", "depends_on": [f"task_{i - 1}"] if i else [],
+            "tool_seconds": 0.5, "first_write_at": time.time(), "context_tokens_saved": 120,
+            "files": {f"src/module_{i}.py": "0123456789abcdef"}, "batched_with": [],
+        }
+        for i in range(n_tasks)
+    ]
+    step = max(1, n_tasks // supersteps)
+    batches = [tasks[i:i + step] for i in range(0, n_tasks, step)]
+
+    def measure(name, make_step):
+        """Timings from one pass, memory still held at the end from a second, traced pass."""
+        checkpoints = sqlite3.connect(os.path.join(tmp.name, f"{name}.sqlite"))
+        checkpoints.execute("CREATE TABLE checkpoints (step INTEGER PRIMARY KEY, value BLOB)")
+        run_step, value, merge, write, size, store_s = make_step("timed"), None, 0.0, 0.0, 0, 0.0
+        for batch in batches:
+            t0 = time.perf_counter()
+            delta = run_step(batch)
+            t1 = time.perf_counter()
+            value = merge_fn(value, delta)
+            t2 = time.perf_counter()
+            blob = serde.dumps_typed(value)[1]
+            checkpoints.execute("INSERT INTO checkpoints (value) VALUES (?)", (blob,))
+            checkpoints.commit()
+            t3 = time.perf_counter()
+            store_s += t1 - t0
+            merge += t2 - t1
+            write += t3 - t2
+            size = len(blob)
+        checkpoints.close()
+
+        run_step, value = make_step("traced"), None
+        tracemalloc.start()
+        for batch in batches:
+            value = merge_fn(value, run_step(batch))
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        n = len(batches)
+        return {"merge_ms": merge / n * 1000, "serialize_ms": write / n * 1000, "store_ms": store_s / n * 1000,
+                "checkpoint_kb": size / 1000, "memory_mb": memory / 1e6}
+
+    def store_step(run):
+        store = TaskStore(os.path.join(tmp.name, f"tasks-{run}.sqlite"))
+        stores.append(store)
+        return lambda batch: store.put("bench", [TaskRecord.from_task(t) for t in batch])
+
+    rows, stores = {}, []
+    merge_fn = merge_task_dicts
+    rows["task dicts"] = measure("dicts", lambda run: lambda batch: [dict(t) for t in batch])  # task.copy()
+    merge_fn = merge_status
+    rows["ids + store"] = measure("ids", store_step)
+    for store in stores:
+        store._db().close()
+    tmp.cleanup()
+
+    print(f"{n_tasks} tasks over {len(batches)} supersteps (per-superstep means; checkpoint size and memory at the end)")
+    print(f"{'State':>12} {'Merge ms':>9} {'Ckpt ms':>9} {'Store ms':>9} {'Ckpt KB':>9} {'Memory MB':>10}")
+    for name, row in rows.items():
+        print(f"{name:>12} {row['merge_ms']:>9.2f} {row['serialize_ms']:>9.2f} {row['store_ms']:>9.2f} "
+              f"{row['checkpoint_kb']:>9.1f} {row['memory_mb']:>10.2f}")
+    return rows
+
+
+# Modules no subcommand should import before it needs them, and those too heavy for the light ones
+LAZY_MODULES = ("langchain_ollama",)
+HEAVY_MODULES = ("langchain_ollama", "langgraph.graph", "langchain_core.tools")
+LIGHT_COMMANDS = ("config", "report")
+
+
+def startup_benchmark():
+    """
+    Import cost of every main.py subcommand, read from `python -X importtime`. Each
+    subcommand runs with --startup-only, which exits once its imports are done.
+    Returns the failures: light commands importing heavy modules, or any command
+    importing a module that should only load on first use.
+    """
+    import subprocess
+    from main import COMMAND_MODULES
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    failures = []
+    print(f"{'Command':>8} {'Import s':>9} {'Wall s':>8} {'Modules':>8}")
+    for command in COMMAND_MODULES:
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "main.py", command, "--startup-only"],
+            cwd=here, capture_output=True, text=True,
+        )
+        wall = time.perf_counter() - start
+        if proc.returncode != 0:
+            failures.append(f"{command}: exited with {proc.returncode}\n{proc.stderr[-500:]}")
+            continue
+
+        modules, total = set(), 0
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line.split("|")
+            modules.add(name.strip())
+            if not name.startswith("  "):  # Top-level imports; nested ones are inside their cumulative time
+                total += int(cumulative)
+        print(f"{command:>8} {total / 1e6:>9.3f} {wall:>8.2f} {len(modules):>8}")
+
+        banned = HEAVY_MODULES if command in LIGHT_COMMANDS else LAZY_MODULES
+        failures += [f"{command}: imports {m} at startup" for m in banned if m in modules]
+    return failures
+
+
+_scripted = False
+
+
+async def pool_job(payload):
+    """
+    Work-queue handler for the pool benchmark: the real worker and write_file tool with
+    the scripted model, plus `cpu_ms` of pure-Python work standing in for the parsing,
+    hashing and indexing a worker does in the interpreter.
+    """
+    global _scripted
+    if not _scripted:
+        tools.llm = tools.llm_worker = ScriptedLLM(0, payload["project_root"], payload["latency"])
+        _scripted = True
+    from workflow import WORKERS
+
+    end = time.process_time() + payload["cpu_ms"] / 1000  # CPU time, so processes sharing a core don't overlap it
+    while time.process_time() < end:
+        pass
+    return (await WORKERS[payload["task"]["assigned_agent"]](payload))["completed"]
+
+
+def pool_benchmark(process_counts, n_jobs=64, latency=0.05, cpu_ms=50):
+    """Worker tasks per second in this process, and through the work queue at each pool size."""
+    import tempfile
+    import workqueue
+
+    project_root = "./builds/pool-bench"
+    payloads = [
+        {
+            "task": {"id": f"task_{i}", "description": f"Create file_{i}.txt",
+                     "assigned_agent": "frontend" if i % 2 else "backend", "status": "pending"},
+            "project_root": project_root, "architecture": None, "latency": latency, "cpu_ms": cpu_ms,
+        }
+        for i in range(n_jobs)
+    ]
+
+    async def in_process():
+        limit = asyncio.Semaphore(config.MAX_WORKERS)
+
+        async def one(payload):
+            async with limit:
+                return await pool_job(payload)
+        return await asyncio.gather(*(one(p) for p in payloads))
+
+    def quietly(fn, *args):
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                return fn(*args)
+            finally:
+                sys.stdout = stdout
+
+    rows = []
+    start = time.perf_counter()
+    quietly(asyncio.run, in_process())
+    rows.append(("in-process", n_jobs / (time.perf_counter() - start)))
+
+    for count in process_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            queue = workqueue.WorkQueue(os.path.join(tmp, "queue.sqlite"))
+            processes = workqueue.spawn(count, queue.path, config.WORKER_CONCURRENCY, "benchmark:pool_job", quiet=True)
+            try:
+                deadline = time.monotonic() + 120
+                while len(queue.live_workers()) < count:  # Workers register once their imports are done
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"only {len(queue.live_workers())} of {count} worker processes started")
+                    time.sleep(0.1)
+
+                start = time.perf_counter()
+                ids = [queue.submit(p) for p in payloads]
+                done = []
+                while len(done) < n_jobs:
+                    time.sleep(0.02)
+                    done = queue.finished(ids)
+                elapsed = time.perf_counter() - start
+                failed = [error for _, status, _, error, _ in done if status == "failed"]
+                if failed:
+                    raise RuntimeError(f"{len(failed)} jobs failed: {failed[0]}")
+            finally:
+                workqueue.stop(processes)
+        rows.append((f"{count} proc", n_jobs / elapsed))
+    shutil.rmtree(project_root, ignore_errors=True)
+
+    base = rows[1][1] if len(rows) > 1 else rows[0][1]
+    print(f"{n_jobs} worker tasks, {latency * 1000:.0f}ms per model call, {cpu_ms}ms interpreter work per task")
+    print(f"{'Executor':>11} {'Tasks/s':>9} {'vs 1st pool':>12}")
+    for name, rate in rows:
+        print(f"{name:>11} {rate:>9.1f} {rate / base:>11.2f}x")
+    return rows
+
+
+def _corrupt(text, kind, rng):
+    """A plan answer damaged the way model output tends to be."""
+    if kind == "truncated":
+        return text[:rng.randint(len(text) // 2, len(text) - 2)]
+    if kind == "trailing comma":
+        return text.replace("}]", "},]")
+    if kind == "fenced prose":
+        return f"Here is the plan:\n```json\n{text}\n```\nLet me know if you need changes."
+    if kind == "raw newline":
+        return text.replace("Create file_3", "Create\nfile_3")
+    if kind == "wrong agent":
+        return text.replace('"backend"', '"fullstack"', 1)
+    return text
+
+
+def parse_benchmark(n_answers, n_tasks=10):
+    """
+    Share of planned tasks recovered from malformed plan answers by the old fence-strip
+    and json.loads parse, and by structured.parse_items, plus how many answers would
+    still need a re-ask.
+    """
+    import random
+    from structured import parse_items, check_task
+
+    rng = random.Random(0)
+    text = ScriptedLLM(n_tasks, "./builds/parse-bench").plan()
+    kinds = ["clean", "truncated", "trailing comma", "fenced prose", "raw newline", "wrong agent"]
+    print(f"{'Damage':>15} {'Old parse':>10} {'Repaired':>10} {'Re-asks':>8} {'us/answer':>10}")
+    for kind in kinds:
+        old = new = reasks = 0
+        seconds = 0.0
+        for _ in range(n_answers):
+            answer = _corrupt(text, kind, rng)
+            try:
+                tasks = json.loads(answer.replace("```json", "").replace("```", "").strip())
+                tasks = tasks["tasks"] if isinstance(tasks, dict) else tasks
+                old += sum(check_task(t) is None for t in tasks)
+            except (ValueError, KeyError):
+                pass
+            start = time.perf_counter()
+            parsed = parse_items(answer, "tasks")
+            seconds += time.perf_counter() - start
+            new += len(parsed.items)
+            reasks += bool(parsed.broken)
+        total = n_answers * n_tasks
+        print(f"{kind:>15} {old / total:>10.0%} {new / total:>10.0%} {reasks:>8} {seconds / n_answers * 1e6:>10.0f}")
+
+
+SIMILARITY_STORED = [
+    "Create me a Simple HTML AND JavaScript based calculator that can perform addition, subtraction, multiplication, and division.",
+    "Build a todo list app with Python Flask and SQLite, with add, edit and delete",
+    "Create a React blog with posts, comments and a markdown editor",
+    "Make a weather dashboard in HTML, CSS and JavaScript that fetches a forecast API",
+    "Build a chat app with Node, Express and WebSockets with rooms and usernames",
+    "Create a Django e-commerce store with a product catalogue, cart and checkout",
+    "Make a Pomodoro timer in HTML and JavaScript with start, pause and reset",
+    "Build a URL shortener with FastAPI and SQLite that tracks click counts",
+    "Create a Vue expense tracker with categories and a monthly chart",
+    "Make a snake game in HTML canvas and JavaScript with a high score",
+]
+# (case, index of the stored run it resembles, requirements). Rewordings must be reused
+# outright; nothing else may be, and stack swaps and unrelated requests may not even be offered.
+SIMILARITY_CASES = [
+    ("rewording", 0, "Create a simple HTML and JavaScript calculator that can add, subtract, multiply and divide."),
+    ("rewording", 0, "Build me a basic calculator using HTML and JavaScript supporting addition, subtraction, multiplication and division"),
+    ("rewording", 0, "Make a simple calculator web page in HTML/JavaScript for addition, subtraction, multiplication and division."),
+    ("stack swap", 0, "Create me a Simple Python Flask based calculator that can perform addition, subtraction, multiplication, and division."),
+    ("stack swap", 0, "Create a React calculator that can perform addition, subtraction, multiplication, and division."),
+    ("unrelated", 0, "Create an HTML and JavaScript tic-tac-toe game with a scoreboard"),
+]
+# Other apps and feature changes of the stored runs, kept out of setting the thresholds
+SIMILARITY_HELD_OUT = [
+    ("rewording", 1, "Flask + SQLite todo list application: add, edit and delete items"),
+    ("rewording", 6, "Pomodoro timer using HTML/JS with start, pause and reset buttons"),
+    ("rewording", 7, "URL shortener in FastAPI with SQLite storage, tracking click counts"),
+    ("rewording", 2, "Build a blog in React with posts and comments and a markdown editor"),
+    ("different app", 1, "shopping list app Flask SQLite add/edit/delete"),
+    ("different app", 1, "Build a contacts app with Python Flask and SQLite, with add, edit and delete"),
+    ("different app", 6, "Make a countdown timer in HTML and JavaScript with start, pause and reset"),
+    ("different app", 9, "Make a tetris game in HTML canvas and JavaScript with a high score"),
+    ("different app", 0, "Create a simple HTML and JavaScript unit converter for length, weight and temperature"),
+    ("different app", 7, "Build a pastebin with FastAPI and SQLite that tracks view counts"),
+    ("feature change", 1, "Build a todo list app with Python Flask and SQLite, with add, edit, delete, due dates, tags and user accounts"),
+    ("feature change", 0, "Create a scientific calculator in HTML and JavaScript with sin, cos, tan, log and memory keys"),
+    ("feature change", 2, "Create a React blog with posts, comments, a markdown editor, user login, likes and RSS feed"),
+    ("feature change", 6, "Make a Pomodoro timer in HTML and JavaScript with start, pause, reset, task list, statistics and sound alerts"),
+    ("stack swap", 7, "Build a URL shortener with Express and MongoDB that tracks click counts"),
+    ("unrelated", 5, "Build a REST API for a library with books, authors and loans in Django"),
+    ("unrelated", 8, "Create a markdown to PDF converter command line tool in Python"),
+]
+
+
+def similarity_check():
+    """
+    Scores each case against a plan store of ten past runs, first the cases the thresholds
+    were tuned on and then a held-out set. Returns the failures: rewordings that would not
+    be reused, anything else that would be, and stack swaps or unrelated requests that
+    would be offered the run they resemble.
+    """
+    import tempfile
+    from plans import PlanStore, reusable
+
+    store = PlanStore(os.path.join(tempfile.mkdtemp(), "plans.sqlite"))
+    for requirements in SIMILARITY_STORED:
+        store.record(requirements, "./builds/x", "{}", [], True)
+
+    failures = []
+    for title, cases in (("Tuning", SIMILARITY_CASES), ("Held out", SIMILARITY_HELD_OUT)):
+        print(f"{title:>14} {'Score':>6} {'Subject':>8}  Requirements")
+        for case, index, requirements in cases:
+            score, run = store.most_similar(requirements)
+            resembled = run is not None and run["requirements"] == SIMILARITY_STORED[index]
+            subject = run["subject_match"] if run else 0.0
+            print(f"{case:>14} {score:>6.3f} {subject:>8.2f}  {requirements[:70]}")
+            if case == "rewording" and not (resembled and reusable(score, run)):
+                failures.append(f"rewording would not be reused ({score:.3f}, subject {subject:.2f}): {requirements}")
+            if case != "rewording" and reusable(score, run):
+                failures.append(f"{case} would be reused ({score:.3f}, subject {subject:.2f}): {requirements}")
+            if case in ("stack swap", "unrelated") and resembled and score >= config.PLAN_OFFER_THRESHOLD:
+                failures.append(f"{case} scored {score:.3f}, offered at {config.PLAN_OFFER_THRESHOLD}: {requirements}")
+    return failures
+
+
+def coalesce_check(sizes=(2, 4)):
+    """
+    Schedules n small tasks on one file, as a list and as a stream, and returns the
+    failures: any case where they were not merged into exactly one worker call.
+    """
+    from coalesce import FileCoalescer
+    from scheduler import run_schedule
+
+    def plan(n):
+        return [
+            {"id": str(i), "description": f"Add operation {i} to calculator.js", "assigned_agent": "frontend",
+             "status": "pending", "depends_on": []}
+            for i in range(1, n + 1)
+        ]
+
+    async def streamed(tasks):
+        for task in tasks:
+            yield task
+
+    async def schedule(tasks):
+        calls = []
+
+        async def run_task(task):
+            calls.append(task["id"])
+            return task
+
+        await run_schedule(tasks, run_task, max_workers=4, coalescer=FileCoalescer())
+        return calls
+
+    failures = []
+    print(f"{'Tasks':>6} {'Input':>8}  Worker calls")
+    for n in sizes:
+        for name, tasks in (("list", plan(n)), ("stream", streamed(plan(n)))):
+            calls = asyncio.run(schedule(tasks))
+            print(f"{n:>6} {name:>8}  {calls}")
+            if len(calls) != 1:
+                failures.append(f"{n} same-file tasks ({name}) took {len(calls)} worker calls: {calls}")
+    return failures
+
+
+class StubOllama:
+    """
+    A local HTTP server answering /api/tags and /api/chat like Ollama, counting the chat
+    requests it gets. With `drop` set it closes chat connections without answering.
+    """
+
+    def __init__(self, name, port=0, latency=0.05):
+        import http.server
+
+        self.name = name
+        self.latency = latency
+        self.chats = 0
+        self.drop = False
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _json(self, body):
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._json({"models": []})
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                stub.chats += 1
+                if stub.drop:
+                    self.close_connection = True
+                    self.connection.shutdown(2)
+                    return
+                time.sleep(stub.latency)
+                self._json({
+                    "model": request.get("model"), "created_at": "2025-01-01T00:00:00Z",
+                    "message": {"role": "assistant", "content": f"from {stub.name}"},
+                    "done": True, "done_reason": "stop", "eval_count": 3, "prompt_eval_count": 3,
+                })
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.port = self.server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def routing_check():
+    """
+    Routes chat calls through an EndpointPool over two stub servers. Returns the failures
+    of: calls spreading over both, a failing endpoint's calls being retried on the other,
+    a down endpoint being skipped, and its /api/tags health check bringing it back.
+    """
+    from routing import EndpointPool, RoutedLLM
+
+    a, b = StubOllama("a"), StubOllama("b")
+    pool = EndpointPool([a.url, b.url], health_interval=0.1)
+    llm = RoutedLLM("stub", pool)
+    failures = []
+
+    async def calls(n):
+        return [r.content for r in await asyncio.gather(*(llm.ainvoke("hi") for _ in range(n)))]
+
+    def wait_for(condition, seconds=3.0):
+        deadline = time.time() + seconds
+        while not condition() and time.time() < deadline:
+            time.sleep(0.05)
+        return condition()
+
+    def check(name, ok, detail):
+        print(f"{'✅' if ok else '❌'} {name}: {detail}")
+        if not ok:
+            failures.append(f"{name}: {detail}")
+
+    answers = asyncio.run(calls(8))
+    check("balancing", a.chats and b.chats, f"{a.chats} calls on a, {b.chats} on b")
+
+    b.drop, b.chats = True, 0
+    answers = asyncio.run(calls(4))
+    check("failover", b.chats > 0 and answers == ["from a"] * 4,
+          f"b dropped {b.chats} calls, answers {sorted(set(answers))}")
+
+    b.stop()
+    down = wait_for(lambda: not pool.endpoints[1].healthy)
+    leased = []
+    client = pool.endpoints[1].client
+    pool.endpoints[1].client = lambda *args: leased.append(1) or client(*args)
+    answers = asyncio.run(calls(4))
+    check("skip down endpoint", down and not leased and answers == ["from a"] * 4,
+          f"b marked down: {down}, calls sent to b: {len(leased)}")
+
+    b = StubOllama("b", port=b.port)
+    recovered = wait_for(lambda: pool.endpoints[1].healthy)
+    answers = asyncio.run(calls(8))
+    check("health recovery", recovered and b.chats > 0, f"b healthy again: {recovered}, {b.chats} calls on b")
+
+    a.stop()
+    b.stop()
+    return failures
+
+
+def regressions(results, baseline, tolerance):
+    """Metrics that got worse than the baseline by more than `tolerance` (a fraction)."""
+    failures = []
+    for row in results:
+        base = baseline.get(str(row["tasks"]))
+        if not base:
+            continue
+        if row["tasks_per_s"] < base["tasks_per_s"] * (1 - tolerance):
+            failures.append(f"{row['tasks']} tasks: throughput {row['tasks_per_s']:.1f}/s vs {base['tasks_per_s']:.1f}/s")
+        for key in ("node_p99_ms", "peak_mb"):
+            if row[key] > base[key] * (1 + tolerance):
+                failures.append(f"{row['tasks']} tasks: {key} {row[key]:.2f} vs {base[key]:.2f}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the workflow graph against a scripted fake LLM.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Plan sizes to run")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each fake model call takes")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression, as a fraction")
+    parser.add_argument("--state-tasks", type=int, metavar="N",
+                        help="Only measure graph-state merge and checkpoint cost with N completed tasks")
+    parser.add_argument("--startup", action="store_true", help="Only measure each CLI subcommand's import cost")
+    parser.add_argument("--pool", type=int, nargs="+", metavar="PROCESSES",
+                        help="Only measure worker throughput through the work queue at these pool sizes")
+    parser.add_argument("--parse", type=int, metavar="N",
+                        help="Only measure plan parsing on N malformed answers of each kind")
+    parser.add_argument("--similarity", action="store_true",
+                        help="Only check plan-reuse scores of rewordings and stack swaps against the thresholds")
+    parser.add_argument("--coalesce", action="store_true",
+                        help="Only check that small same-file tasks are merged into one worker call")
+    parser.add_argument("--routing", action="store_true",
+                        help="Only check load balancing, failover and health checks against two stub Ollama servers")
+    args = parser.parse_args(argv)
+
+    if args.state_tasks:
+        state_benchmark(args.state_tasks)
+        return 0
+    if args.pool:
+        pool_benchmark(args.pool, latency=args.latency or 0.05)
+        return 0
+    if args.similarity:
+        failures = similarity_check()
+        for failure in failures:
+            print(f"❌ {failure}")
+        return 1 if failures else 0
+    if args.routing:
+        return 1 if routing_check() else 0
+    if args.coalesce:
+        failures = coalesce_check()
+        for failure in failures:
+            print(f"❌ {failure}")
+        return 1 if failures else 0
+    if args.parse:
+        parse_benchmark(args.parse)
+        return 0
+    if args.startup:
+        failures = startup_benchmark()
+        for failure in failures:
+            print(f"❌ {failure}")
+        return 1 if failures else 0
+
+    # Imported here so the environment above is in place first
+    from workflow import build_app
+    app = build_app()
+    os.makedirs("./builds", exist_ok=True)
+
+    results = []
+    print(f"{'Tasks':>6} {'Seconds':>9} {'Tasks/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'Peak MB':>9}")
+    for n in args.sizes:
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull  # Silence the nodes' progress output
+            try:
+                row = run_once(app, n, args.latency)
+            finally:
+                sys.stdout = stdout
+        results.append(row)
+        print(f"{row['tasks']:>6} {row['seconds']:>9.2f} {row['tasks_per_s']:>9.1f} "
+              f"{row['node_p50_ms']:>9.2f} {row['node_p99_ms']:>9.2f} {row['peak_mb']:>9.2f}")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({str(r["tasks"]): r for r in results}, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to record one.")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        failures = regressions(results, json.load(f), args.tolerance)
+    if failures:
+        print("\n❌ Regressions against baseline:")
+        for failure in failures:
+            print(f"   - {failure}")
+        return 1
+    print("\n✅ No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from langchain_core.messages import convert_to_messages, message_to_dict, messages_from_dict
+
+import config
+
+
+class ResponseCache:
+    """
+    On-disk, content-addressed cache of LLM responses.
+    Entries are evicted least-recently-used first once the store exceeds max_bytes.
+    """
+
+    def __init__(self, path=config.CACHE_PATH, max_bytes=config.CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access)"
+            )
+        return self._conn
+
+    def get(self, key):
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            db.commit()
+        return messages_from_dict([json.loads(row[0])])[0]
+
+    def put(self, key, message):
+        value = json.dumps(message_to_dict(message))
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            self._evict(db)
+            db.commit()
+
+    def _evict(self, db):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock:
+            self._db().execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+response_cache = ResponseCache()
+
+
+def model_fingerprint(runnable):
+    """Describes everything about a (possibly tool-bound) chat model that affects its output."""
+    if hasattr(runnable, "fingerprint"):
+        return runnable.fingerprint()
+    model = getattr(runnable, "bound", runnable)
+    kwargs = getattr(runnable, "kwargs", {}) if model is not runnable else {}
+    return {
+        "model": getattr(model, "model", type(model).__name__),
+        "temperature": getattr(model, "temperature", None),
+        "format": getattr(model, "format", None),
+        "tools": kwargs.get("tools"),
+    }
+
+
+def cache_key(runnable, prompt):
+    messages = [message_to_dict(m) for m in convert_to_messages(
+        [prompt] if isinstance(prompt, str) else prompt
+    )]
+    payload = json.dumps(
+        {"llm": model_fingerprint(runnable), "messages": messages},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CachedLLM:
+    """Wraps a chat model so identical calls are answered from the response cache."""
+
+    def __init__(self, runnable, node, cache=None):
+        self.runnable = runnable
+        self.node = node
+        self.cache = cache or response_cache
+
+    @property
+    def enabled(self):
+        return config.CACHE_ENABLED and self.node not in config.CACHE_DISABLED_NODES
+
+    def invoke(self, prompt, **kwargs):
+        if not self.enabled:
+            return self.runnable.invoke(prompt, **kwargs)
+
+        key = cache_key(self.runnable, prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            print(f"   💾 [{self.node}] Cache hit")
+            return cached
+
+        response = self.runnable.invoke(prompt, **kwargs)
+        self.cache.put(key, response)
+        return response
+
+    async def ainvoke(self, prompt, **kwargs):
+        if not self.enabled:
+            return await self.runnable.ainvoke(prompt, **kwargs)
+
+        key = cache_key(self.runnable, prompt)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            print(f"   💾 [{self.node}] Cache hit")
+            return cached
+
+        response = await self.runnable.ainvoke(prompt, **kwargs)
+        await asyncio.to_thread(self.cache.put, key, response)
+        return response
+
+    async def astream(self, prompt, **kwargs):
+        """Streams the response; a cached response is replayed as a single chunk."""
+        if not self.enabled:
+            async for chunk in self.runnable.astream(prompt, **kwargs):
+                yield chunk
+            return
+
+        key = cache_key(self.runnable, prompt)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            print(f"   💾 [{self.node}] Cache hit")
+            yield cached
+            return
+
+        response = None
+        async for chunk in self.runnable.astream(prompt, **kwargs):
+            response = chunk if response is None else response + chunk
+            yield chunk
+        if response is not None:
+            await asyncio.to_thread(self.cache.put, key, response)
@@ -0,0 +1,102 @@
+import os
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+import config
+from tasktable import task_store
+
+
+def new_thread_id():
+    return uuid.uuid4().hex[:12]
+
+
+@asynccontextmanager
+async def open_checkpointer(path=config.CHECKPOINT_PATH, prune_on_exit=True):
+    """Opens the SQLite checkpoint store, pruning old checkpoints when the run ends."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    async with AsyncSqliteSaver.from_conn_string(path) as saver:
+        await saver.setup()
+        try:
+            yield saver
+        finally:
+            if prune_on_exit:
+                await prune(saver)
+
+
+async def latest_thread_id(saver):
+    """The thread id of the most recently checkpointed run, or None."""
+    await saver.setup()
+    async with saver.conn.execute(
+        "SELECT thread_id FROM checkpoints ORDER BY checkpoint_id DESC LIMIT 1"
+    ) as cursor:
+        row = await cursor.fetchone()
+    return row[0] if row else None
+
+
+async def recent_thread_ids(saver, limit=20):
+    """Thread ids of the most recently checkpointed runs, newest first."""
+    await saver.setup()
+    async with saver.conn.execute(
+        "SELECT thread_id FROM checkpoints GROUP BY thread_id ORDER BY MAX(checkpoint_id) DESC LIMIT ?",
+        (limit,),
+    ) as cursor:
+        return [row[0] for row in await cursor.fetchall()]
+
+
+async def latest_values(saver, thread_id):
+    """The state of a run as of its last checkpoint, or None if it has none."""
+    saved = await saver.aget_tuple({"configurable": {"thread_id": thread_id}})
+    return saved.checkpoint["channel_values"] if saved else None
+
+
+async def prune(saver, keep=config.CHECKPOINT_KEEP, max_threads=config.CHECKPOINT_MAX_THREADS):
+    """
+    Keeps the newest `keep` checkpoints of each of the `max_threads` most recent runs
+    and deletes everything else, including the task records of the runs dropped.
+    Checkpoint ids are time-ordered, so they sort by age.
+    """
+    await saver.setup()
+    async with saver.lock:
+        threads_before = await _thread_ids(saver)
+        await saver.conn.execute(
+            """
+            DELETE FROM checkpoints WHERE thread_id NOT IN (
+                SELECT thread_id FROM checkpoints
+                GROUP BY thread_id ORDER BY MAX(checkpoint_id) DESC LIMIT ?
+            )
+            """,
+            (max_threads,),
+        )
+        await saver.conn.execute(
+            """
+            DELETE FROM checkpoints WHERE checkpoint_id NOT IN (
+                SELECT checkpoint_id FROM (
+                    SELECT checkpoint_id, ROW_NUMBER() OVER (
+                        PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                    ) AS age FROM checkpoints
+                ) WHERE age <= ?
+            )
+            """,
+            (keep,),
+        )
+        await saver.conn.execute(
+            """
+            DELETE FROM writes WHERE NOT EXISTS (
+                SELECT 1 FROM checkpoints c
+                WHERE c.thread_id = writes.thread_id
+                  AND c.checkpoint_ns = writes.checkpoint_ns
+                  AND c.checkpoint_id = writes.checkpoint_id
+            )
+            """
+        )
+        await saver.conn.commit()
+        threads = await _thread_ids(saver)
+    await asyncio.to_thread(task_store.prune, threads, threads_before - threads)
+
+
+async def _thread_ids(saver):
+    async with saver.conn.execute("SELECT DISTINCT thread_id FROM checkpoints") as cursor:
+        return {row[0] for row in await cursor.fetchall()}
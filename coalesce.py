@@ -0,0 +1,71 @@
+import os
+import re
+
+import config
+from context import estimate_tokens
+
+# File names mentioned in a task description, e.g. "calculator.js" or "builds/app/static/style.css"
+_FILE = re.compile(
+    r"(?<![\w/.-])((?:[\w.-]+/)*[\w-]+\.(?:py|js|jsx|mjs|ts|tsx|html|htm|css|scss|json|md|txt|sql|sh|ya?ml|toml|ini|cfg))\b",
+    re.IGNORECASE,
+)
+
+
+def target_files(task):
+    """Names of the files a task says it works on; basenames, so 'calculator.js' and 'static/calculator.js' match."""
+    return frozenset(os.path.basename(m).lower() for m in _FILE.findall(task.get("description", "")))
+
+
+class FileCoalescer:
+    """
+    Scheduling policy for worker tasks: tasks naming the same file never run at once
+    (so parallel workers can't overwrite each other's version of it), and small ready
+    tasks for the same agent and file are merged into one worker call.
+    """
+
+    def __init__(self, budget=config.COALESCE_BUDGET):
+        self.budget = budget
+
+    def resources(self, task):
+        return target_files(task)
+
+    def can_join(self, group, task):
+        leader = group[0]
+        if task.get("assigned_agent") != leader.get("assigned_agent"):
+            return False
+        if not target_files(task) & target_files(leader):
+            return False
+        size = sum(estimate_tokens(t.get("description", "")) for t in group)
+        return size + estimate_tokens(task.get("description", "")) <= self.budget
+
+    def merge(self, tasks):
+        """One task carrying every grouped task's instructions; the originals ride along under 'batch'."""
+        steps = "\n".join(f"{i}. [{t['id']}] {t['description']}" for i, t in enumerate(tasks, 1))
+        return {
+            "id": "+".join(t["id"] for t in tasks),
+            "description": f"Complete these related tasks together, in one pass over the files they share:\n{steps}",
+            "assigned_agent": tasks[0].get("assigned_agent"),
+            "status": "pending",
+            "batch": tasks,
+        }
+
+
+def split_batch(completed):
+    """Turns a completed merged task back into one record per original task id."""
+    originals = completed.get("batch")
+    if not originals:
+        return [completed]
+    share = len(originals)
+    records = []
+    for task in originals:
+        record = dict(task)
+        record.update({
+            "status": completed.get("status", "completed"),
+            "batched_with": [t["id"] for t in originals if t is not task],
+            "context_tokens_saved": (completed.get("context_tokens_saved") or 0) // share,
+            "tool_seconds": round((completed.get("tool_seconds") or 0) / share, 3),
+            "first_write_at": completed.get("first_write_at"),
+            "files": completed.get("files", {}),
+        })
+        records.append(record)
+    return records
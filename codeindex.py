@@ -0,0 +1,288 @@
+import os
+import re
+import ast
+import difflib
+import threading
+
+import config
+from context import estimate_tokens
+from filecache import file_cache
+from indexer import walk_files
+
+_JS_SYMBOLS = [
+    (re.compile(r"^\s*(?:export\s+)?(?:async\s+)?function\s*\*?\s*([A-Za-z_$][\w$]*)\s*\("), "function"),
+    (re.compile(r"^\s*(?:export\s+)?class\s+([A-Za-z_$][\w$]*)"), "class"),
+    (re.compile(r"^\s*(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>|[A-Za-z_$][\w$]*\s*=>)"), "function"),
+    # Module-level only; locals inside functions aren't worth indexing
+    (re.compile(r"^(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*="), "variable"),
+]
+_JS_IMPORT = re.compile(r"""(?:\bfrom\s+|\brequire\(\s*|\bimport\s*\(?\s*)['"]([^'"]+)['"]""")
+_JS_DOM_REF = re.compile(r"""getElementById\(\s*['"]([\w-]+)['"]|querySelector(?:All)?\(\s*['"]#([\w-]+)""")
+_HTML_ID = re.compile(r"""\bid\s*=\s*['"]([^'"]+)['"]""")
+_HTML_REF = re.compile(r"""<(?:script|link|img)\b[^>]*?\b(?:src|href)\s*=\s*['"]([^'"]+)['"]""", re.IGNORECASE)
+_HTML_HANDLER = re.compile(r"""\bon\w+\s*=\s*['"]\s*([A-Za-z_$][\w$]*)\s*\(""")
+_CSS_ID = re.compile(r"#([A-Za-z_][\w-]*)\s*[{,:.\s]")
+
+# "path", line N (Python) / path:N (node, preflight, most linters)
+_LOCATION = re.compile(
+    r"""["']?((?:[\w.-]+[/\\])*[\w.-]+\.(?:py|js|mjs|cjs|jsx|ts|html|htm|css|json))["']?(?:,\s*line\s+|:)(\d+)"""
+)
+# Names an error message is about
+_ERROR_NAMES = [
+    re.compile(r"name '([\w$]+)' is not defined"),
+    re.compile(r"cannot import name '([\w$]+)'"),
+    re.compile(r"No module named '([\w.]+)'"),
+    re.compile(r"has no attribute '([\w$]+)'"),
+    re.compile(r"\b([A-Za-z_$][\w$]*) is not defined"),
+    re.compile(r"\b([A-Za-z_$][\w$.]*) is not a function"),
+    re.compile(r"getElementById\(['\"]([\w-]+)['\"]\)"),
+]
+
+
+def _symbol(name, kind, line, end=None):
+    return {"name": name, "kind": kind, "line": line, "end": end or line}
+
+
+def _scan_python(text):
+    symbols, imports = [], []
+    try:
+        tree = ast.parse(text)
+    except SyntaxError:
+        return _scan_lines(text, [(re.compile(r"^\s*(?:async\s+)?def\s+(\w+)"), "function"),
+                                  (re.compile(r"^\s*class\s+(\w+)"), "class")]), [], []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            symbols.append(_symbol(node.name, "function", node.lineno, node.end_lineno))
+        elif isinstance(node, ast.ClassDef):
+            symbols.append(_symbol(node.name, "class", node.lineno, node.end_lineno))
+        elif isinstance(node, ast.Import):
+            imports.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            imports.append("." * node.level + node.module)
+    return sorted(symbols, key=lambda s: s["line"]), imports, []
+
+
+def _scan_lines(text, patterns):
+    symbols = []
+    for number, line in enumerate(text.splitlines(), 1):
+        for pattern, kind in patterns:
+            match = pattern.match(line)
+            if match:
+                symbols.append(_symbol(match.group(1), kind, number))
+                break
+    return symbols
+
+
+def _block_ends(symbols, lines):
+    """Ends a brace-delimited block where its braces balance, so snippets cover whole functions."""
+    for sym in symbols:
+        depth, opened = 0, False
+        for number in range(sym["line"], min(len(lines), sym["line"] + 300) + 1):
+            line = lines[number - 1]
+            depth += line.count("{") - line.count("}")
+            opened = opened or "{" in line
+            if depth < 0:
+                break  # Closed an outer block first: the declaration had no block of its own
+            if opened and depth == 0:
+                sym["end"] = number
+                break
+    return symbols
+
+
+def _scan_javascript(text):
+    lines = text.splitlines()
+    symbols = _block_ends(_scan_lines(text, _JS_SYMBOLS), lines)
+    imports = _JS_IMPORT.findall(text)
+    refs = sorted({a or b for a, b in _JS_DOM_REF.findall(text)})
+    return symbols, imports, [f"#{r}" for r in refs]
+
+
+def _scan_html(text):
+    symbols, refs = [], []
+    for number, line in enumerate(text.splitlines(), 1):
+        symbols.extend(_symbol(dom_id, "dom id", number) for dom_id in _HTML_ID.findall(line))
+        refs.extend(_HTML_HANDLER.findall(line))
+    return symbols, _HTML_REF.findall(text), refs
+
+
+def _scan_css(text):
+    refs = set()
+    for line in text.splitlines():
+        refs.update(f"#{i}" for i in _CSS_ID.findall(line + " "))
+    return [], [], sorted(refs)
+
+
+SCANNERS = {
+    ".py": _scan_python,
+    ".js": _scan_javascript, ".mjs": _scan_javascript, ".cjs": _scan_javascript,
+    ".jsx": _scan_javascript, ".ts": _scan_javascript,
+    ".html": _scan_html, ".htm": _scan_html,
+    ".css": _scan_css,
+}
+
+
+class CodeIndex:
+    """
+    Functions, classes and DOM ids defined in each source file, plus what each file
+    imports or references (modules, script/link targets, DOM ids, inline handlers).
+    Files are re-scanned only when their mtime or size changes.
+    """
+
+    def __init__(self):
+        self.files = {}  # abs path -> {"mtime_ns", "size", "symbols", "imports", "refs"}
+        self._lock = threading.Lock()
+
+    def update(self, path):
+        """(Re)indexes one file; called after every write, and by refresh() for changed files."""
+        path = os.path.abspath(path)
+        scanner = SCANNERS.get(os.path.splitext(path)[1].lower())
+        if scanner is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self.files.pop(path, None)
+            return None
+        with self._lock:
+            entry = self.files.get(path)
+        if entry and (entry["mtime_ns"], entry["size"]) == (st.st_mtime_ns, st.st_size):
+            return entry
+
+        symbols, imports, refs = scanner(file_cache.get(path).text)
+        entry = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "symbols": symbols, "imports": imports, "refs": refs}
+        with self._lock:
+            self.files[path] = entry
+        return entry
+
+    def refresh(self, root):
+        """Brings every file under root up to date and returns {abs path: entry} for them."""
+        root = os.path.abspath(root)
+        present = set()
+        for path in walk_files(root):
+            if self.update(path) is not None:
+                present.add(os.path.abspath(path))
+        with self._lock:
+            for path in [p for p in self.files if p.startswith(root + os.sep) and p not in present]:
+                del self.files[path]
+            return {p: self.files[p] for p in present}
+
+    def outline(self, root):
+        """One line per file: what it defines, imports and references."""
+        entries = self.refresh(root)
+        lines = []
+        for path, entry in sorted(entries.items()):
+            parts = []
+            if entry["symbols"]:
+                parts.append("defines " + ", ".join(f"{s['name']}:{s['line']}" for s in entry["symbols"]))
+            if entry["imports"]:
+                parts.append("imports " + ", ".join(entry["imports"]))
+            if entry["refs"]:
+                parts.append("uses " + ", ".join(entry["refs"]))
+            lines.append(f"{os.path.relpath(path, root)}: {'; '.join(parts) or '(nothing indexed)'}")
+        return "\n".join(lines)
+
+    def definitions(self, root, name, entries=None):
+        """(abs path, symbol) for every definition of name under root; `entries` from refresh(root) if given."""
+        name = name.lstrip("#").split(".")[-1]
+        entries = self.refresh(root) if entries is None else entries
+        return [
+            (path, sym) for path, entry in sorted(entries.items())
+            for sym in entry["symbols"] if sym["name"] == name
+        ]
+
+    def references(self, root, name, entries=None):
+        """Abs paths of the files that import or reference name; `entries` from refresh(root) if given."""
+        bare = name.lstrip("#")
+        entries = self.refresh(root) if entries is None else entries
+        return [
+            path for path, entry in sorted(entries.items())
+            if bare in entry["refs"] or f"#{bare}" in entry["refs"]
+            or any(bare == os.path.splitext(os.path.basename(i))[0] or bare == i for i in entry["imports"])
+        ]
+
+    def resolve(self, root, rel_or_name, entries=None):
+        """The indexed file a path from a log refers to, matched by the longest path suffix."""
+        wanted = rel_or_name.replace("\\", "/")
+        while wanted.startswith("./"):  # Not lstrip: hidden files like .eslintrc.js keep their dot
+            wanted = wanted.removeprefix("./")
+        best, best_len = None, 0
+        for path in self.refresh(root) if entries is None else entries:
+            candidate = os.path.relpath(path, root).replace(os.sep, "/")
+            if candidate == wanted or wanted.endswith("/" + candidate) or candidate.endswith("/" + wanted):
+                length = len(os.path.commonprefix([candidate[::-1], wanted[::-1]]))
+                if length > best_len:
+                    best, best_len = path, length
+        return best
+
+
+code_index = CodeIndex()
+
+
+def snippet(path, first, last, mark=None, root=None):
+    lines = file_cache.get(path).lines
+    first, last = max(first, 1), min(last, len(lines))
+    title = os.path.relpath(path, root) if root else path
+    body = "".join(
+        f"{'>>' if n == mark else '  '}{n:4d} | {lines[n - 1].rstrip()}\n" for n in range(first, last + 1)
+    )
+    return f"--- {title} (lines {first}-{last})\n{body}"
+
+
+def _around(path, entry, line, window):
+    """The whole enclosing function/class when it is short, otherwise a window around the line."""
+    enclosing = [s for s in entry["symbols"] if s["line"] <= line <= s["end"] and s["kind"] != "dom id"]
+    if enclosing:
+        inner = max(enclosing, key=lambda s: s["line"])
+        if inner["end"] - inner["line"] <= window * 3:
+            return inner["line"], inner["end"]
+    return line - window, line + window
+
+
+def excerpts_for(root, logs, budget=config.DEBUG_CONTEXT_BUDGET, window=6):
+    """
+    Resolves file:line locations and the names in error messages found in `logs` to
+    code snippets via the index, and returns as many as fit in `budget` tokens.
+    Reads the whole tree; async callers should run it in a thread.
+    """
+    if not logs or not os.path.isdir(root):
+        return ""
+    entries = code_index.refresh(root)
+    blocks, seen = [], set()
+
+    def add(block, key):
+        if key not in seen:
+            seen.add(key)
+            blocks.append(block)
+
+    # Innermost frames come last in a traceback, and matter most
+    for rel, line in reversed(_LOCATION.findall(logs)):
+        path = code_index.resolve(root, rel, entries)
+        if path is None:
+            continue
+        first, last = _around(path, entries[path], int(line), window)
+        add(snippet(path, first, last, mark=int(line), root=root), (path, first))
+
+    all_names = sorted({s["name"] for e in entries.values() for s in e["symbols"]})
+    for pattern in _ERROR_NAMES:
+        for name in pattern.findall(logs):
+            found = code_index.definitions(root, name, entries)
+            for path, sym in found:
+                first, last = (sym["line"], sym["end"]) if sym["end"] - sym["line"] <= window * 3 \
+                    else (sym["line"] - 1, sym["line"] + window)
+                add(snippet(path, first, last, mark=sym["line"], root=root), (path, first))
+            if not found:
+                close = difflib.get_close_matches(name.split(".")[-1], all_names, n=3)
+                users = [os.path.relpath(p, root) for p in code_index.references(root, name, entries)]
+                hint = f" Referenced in: {', '.join(users)}." if users else ""
+                hint += f" Closest defined names: {', '.join(close)}." if close else ""
+                add(f"--- '{name}' is not defined anywhere in the project.{hint}\n", name)
+
+    parts, used = [], 0
+    for block in blocks:
+        cost = estimate_tokens(block)
+        if used + cost > budget:
+            continue
+        parts.append(block)
+        used += cost
+    return "\n".join(parts)
@@ -0,0 +1,156 @@
+import os
+
+# Local state (caches, checkpoints, stores) lives next to the code, outside ./builds/
+STATE_DIR = os.environ.get("DYNAMICFLOW_STATE_DIR", ".dynamicflow")
+
+# --- LLM RESPONSE CACHE ---
+CACHE_ENABLED = os.environ.get("DYNAMICFLOW_CACHE", "1") != "0"
+CACHE_PATH = os.path.join(STATE_DIR, "llm_cache.sqlite")
+CACHE_MAX_BYTES = int(os.environ.get("DYNAMICFLOW_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Nodes whose LLM calls always go to the model, e.g. "tester,debugger"
+CACHE_DISABLED_NODES = {
+    n.strip() for n in os.environ.get("DYNAMICFLOW_CACHE_SKIP", "").split(",") if n.strip()
+}
+
+# --- TASK SCHEDULER ---
+# Number of worker tasks that may run at the same time; model calls are further limited per endpoint
+MAX_WORKERS = int(os.environ.get("DYNAMICFLOW_MAX_WORKERS", 16))
+
+# --- WORKER AGENT LOOP ---
+# Upper bounds on one worker's conversation with the model
+AGENT_MAX_ROUNDS = int(os.environ.get("DYNAMICFLOW_AGENT_MAX_ROUNDS", 8))
+AGENT_TOKEN_BUDGET = int(os.environ.get("DYNAMICFLOW_AGENT_TOKEN_BUDGET", 32000))
+# Independent tool calls from one model turn that may run at the same time
+TOOL_CONCURRENCY = int(os.environ.get("DYNAMICFLOW_TOOL_CONCURRENCY", 4))
+
+# --- BATCH MODE ---
+# Projects batch.py builds at the same time
+BATCH_CONCURRENCY = int(os.environ.get("DYNAMICFLOW_BATCH_CONCURRENCY", 4))
+
+# --- CHECKPOINTS ---
+CHECKPOINT_PATH = os.path.join(STATE_DIR, "checkpoints.sqlite")
+# Checkpoints kept per run, and runs kept in total, after pruning
+CHECKPOINT_KEEP = int(os.environ.get("DYNAMICFLOW_CHECKPOINT_KEEP", 5))
+CHECKPOINT_MAX_THREADS = int(os.environ.get("DYNAMICFLOW_CHECKPOINT_MAX_THREADS", 20))
+
+# --- TRACING ---
+# Set DYNAMICFLOW_TRACE=1 to record per-node, per-LLM-call and per-tool spans
+TRACE_ENABLED = os.environ.get("DYNAMICFLOW_TRACE", "0") == "1"
+TRACE_PATH = os.environ.get("DYNAMICFLOW_TRACE_PATH", os.path.join(STATE_DIR, "trace.json"))
+
+# --- PROJECT TREE LISTING ---
+LIST_MAX_DEPTH = int(os.environ.get("DYNAMICFLOW_LIST_MAX_DEPTH", 6))
+LIST_MAX_ENTRIES = int(os.environ.get("DYNAMICFLOW_LIST_MAX_ENTRIES", 400))
+# Folders with more entries than this are summarised
+LIST_FOLDER_LIMIT = int(os.environ.get("DYNAMICFLOW_LIST_FOLDER_LIMIT", 40))
+
+# --- FILE READS ---
+# read_file returns files longer than this in numbered chunks
+READ_CHUNK_CHARS = int(os.environ.get("DYNAMICFLOW_READ_CHUNK_CHARS", 12000))
+READ_CACHE_MAX_BYTES = int(os.environ.get("DYNAMICFLOW_READ_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Files at least this big are read through mmap
+READ_MMAP_BYTES = 1024 * 1024
+
+# --- WORKER CONTEXT ---
+# Token budget for the slice of the architecture sent with each worker task
+CONTEXT_BUDGET = int(os.environ.get("DYNAMICFLOW_CONTEXT_BUDGET", 1500))
+# Per-node overrides, e.g. DYNAMICFLOW_CONTEXT_BUDGET_FRONTEND_WORKER=2500
+CONTEXT_BUDGETS = {
+    node: int(os.environ[f"DYNAMICFLOW_CONTEXT_BUDGET_{node.upper()}"])
+    for node in ("backend_worker", "frontend_worker")
+    if f"DYNAMICFLOW_CONTEXT_BUDGET_{node.upper()}" in os.environ
+}
+# Share of that budget kept for the API contract, so a large section of the worker's own kind can't crowd it out
+CONTEXT_API_SHARE = float(os.environ.get("DYNAMICFLOW_CONTEXT_API_SHARE", 0.3))
+
+# --- MODELS AND ENDPOINTS ---
+DEFAULT_MODEL = os.environ.get("DYNAMICFLOW_MODEL", "llama3.1:8b")
+# Per-node models, e.g. DYNAMICFLOW_MODEL_BACKEND_WORKER=qwen2.5-coder:3b
+NODE_MODELS = {
+    node: os.environ[f"DYNAMICFLOW_MODEL_{node.upper()}"]
+    for node in ("architect", "planner", "backend_worker", "frontend_worker", "tester", "debugger")
+    if f"DYNAMICFLOW_MODEL_{node.upper()}" in os.environ
+}
+# Comma-separated Ollama servers that requests are balanced across
+OLLAMA_ENDPOINTS = [
+    url.strip() for url in os.environ.get("DYNAMICFLOW_OLLAMA_ENDPOINTS", "http://localhost:11434").split(",")
+    if url.strip()
+]
+HEALTH_CHECK_INTERVAL = float(os.environ.get("DYNAMICFLOW_HEALTH_CHECK_INTERVAL", 15))
+
+# --- LLM CONCURRENCY ---
+# Adaptive (AIMD) limit on concurrent requests per endpoint
+LLM_CONCURRENCY_INITIAL = int(os.environ.get("DYNAMICFLOW_LLM_CONCURRENCY", 2))
+LLM_CONCURRENCY_MIN = 1
+LLM_CONCURRENCY_MAX = int(os.environ.get("DYNAMICFLOW_LLM_CONCURRENCY_MAX", 16))
+# Back off when per-token latency exceeds this multiple of its baseline
+LLM_LATENCY_SPIKE = float(os.environ.get("DYNAMICFLOW_LLM_LATENCY_SPIKE", 2.0))
+LLM_TIMEOUT = float(os.environ.get("DYNAMICFLOW_LLM_TIMEOUT", 300))
+
+# --- SPECULATIVE DEBUGGING ---
+# Candidate fixes the debugger proposes per failure, each tried in its own workspace clone (1 = one fix at a time)
+SPECULATIVE_FIXES = int(os.environ.get("DYNAMICFLOW_SPECULATIVE_FIXES", 3))
+
+# --- PREFLIGHT ---
+# Files syntax-checked at once before the LLM tester runs
+PREFLIGHT_CONCURRENCY = int(os.environ.get("DYNAMICFLOW_PREFLIGHT_CONCURRENCY", 8))
+
+# --- SHELL COMMANDS AND SERVERS ---
+# Seconds before a foreground command's whole process group is killed
+SHELL_TIMEOUT = float(os.environ.get("DYNAMICFLOW_SHELL_TIMEOUT", 120))
+# Seconds a background server gets to open its port or print its ready line
+SERVICE_READY_TIMEOUT = float(os.environ.get("DYNAMICFLOW_SERVICE_READY_TIMEOUT", 30))
+# Lines of stdout and of stderr kept per process
+PROCESS_LOG_LINES = int(os.environ.get("DYNAMICFLOW_PROCESS_LOG_LINES", 200))
+
+# --- PLAN REUSE ---
+# Past runs' architecture and plan are reused for near-duplicate requirements
+PLAN_REUSE_ENABLED = os.environ.get("DYNAMICFLOW_PLAN_REUSE", "1") != "0"
+PLAN_STORE_PATH = os.path.join(STATE_DIR, "plans.sqlite")
+# Similarity (0-1) at which a past successful plan is reused outright, skipping the architect and planner
+PLAN_REUSE_THRESHOLD = float(os.environ.get("DYNAMICFLOW_PLAN_REUSE_THRESHOLD", 0.75))
+# Share (0-1) of each request's subject, what is being built, the other must name for outright reuse
+PLAN_SUBJECT_THRESHOLD = float(os.environ.get("DYNAMICFLOW_PLAN_SUBJECT_THRESHOLD", 0.8))
+# Similarity at which the past design is only offered to the architect as a reference
+PLAN_OFFER_THRESHOLD = float(os.environ.get("DYNAMICFLOW_PLAN_OFFER_THRESHOLD", 0.4))
+
+# --- TASK COALESCING ---
+# Small ready tasks for the same agent and file are merged into one worker call
+COALESCE_ENABLED = os.environ.get("DYNAMICFLOW_COALESCE", "1") != "0"
+# Most description tokens one merged worker call may carry
+COALESCE_BUDGET = int(os.environ.get("DYNAMICFLOW_COALESCE_BUDGET", 400))
+
+# --- CODE INDEX ---
+# Tokens of code excerpts (resolved from traceback lines and error messages) given to the debugger
+DEBUG_CONTEXT_BUDGET = int(os.environ.get("DYNAMICFLOW_DEBUG_CONTEXT_BUDGET", 1500))
+
+# --- TASK STORE ---
+# Completed task records; graph state and checkpoints carry only task ids and statuses
+TASK_STORE_PATH = os.path.join(STATE_DIR, "tasks.sqlite")
+# Days the records of a run without a checkpoint (e.g. a batch build) are kept after its last write
+TASK_RETENTION_DAYS = float(os.environ.get("DYNAMICFLOW_TASK_RETENTION_DAYS", 7))
+
+# --- WORK QUEUE ---
+# Run worker tasks in separate processes through a SQLite work queue instead of in the graph process
+WORK_QUEUE_ENABLED = os.environ.get("DYNAMICFLOW_WORK_QUEUE", "0") == "1"
+# Shared with worker pools on other hosts; keep it on storage they can all reach
+WORK_QUEUE_PATH = os.environ.get("DYNAMICFLOW_WORK_QUEUE_PATH", os.path.join(STATE_DIR, "work_queue.sqlite"))
+# Worker processes a run starts on this host (0 = rely on pools started with `python workqueue.py`)
+WORKER_PROCESSES = int(os.environ.get("DYNAMICFLOW_WORKER_PROCESSES", 1))
+# Tasks each worker process runs at once
+WORKER_CONCURRENCY = int(os.environ.get("DYNAMICFLOW_WORKER_CONCURRENCY", 4))
+# Seconds a claimed task stays leased without a heartbeat before another worker may take it
+WORK_LEASE_SECONDS = float(os.environ.get("DYNAMICFLOW_WORK_LEASE", 60))
+# Claims per task before it is failed (crashed workers and raised errors both count)
+WORK_MAX_ATTEMPTS = int(os.environ.get("DYNAMICFLOW_WORK_MAX_ATTEMPTS", 3))
+# Processes on this host calling the same endpoints; each keeps 1/N of every endpoint's concurrency
+# limit, so together they stay within it. Worker pools set it for the processes they start.
+LLM_PROCESS_SHARE = max(1, int(os.environ.get(
+    "DYNAMICFLOW_LLM_PROCESS_SHARE", WORKER_PROCESSES + 1 if WORK_QUEUE_ENABLED and WORKER_PROCESSES else 1
+)))
+
+# --- STRUCTURED OUTPUT ---
+# Constrain the planner's and debugger's answers to a JSON schema (Ollama structured outputs)
+STRUCTURED_OUTPUT = os.environ.get("DYNAMICFLOW_STRUCTURED_OUTPUT", "1") == "1"
+# Follow-up requests for the parts of an answer that still don't parse after repair
+REPAIR_REASKS = int(os.environ.get("DYNAMICFLOW_REPAIR_REASKS", 1))
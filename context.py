@@ -0,0 +1,147 @@
+import re
+import json
+
+import config
+
+# Words in a section's title that say which part of the design it covers
+SECTION_KINDS = {
+    "schema": ("schema", "data", "database", "model", "storage", "field", "table"),
+    "api": ("api", "endpoint", "route", "contract", "request", "response", "cors", "connectivity", "url"),
+    "frontend": ("frontend", "ui", "html", "css", "component", "layout", "page", "javascript", "js"),
+    # Checked last, so e.g. "backend api" counts as api and "frontend logic" as frontend
+    "backend": (
+        "backend", "server", "logic", "service", "services", "business", "auth", "authentication",
+        "python", "flask", "fastapi", "django", "express",
+    ),
+}
+
+# Which kinds of section each worker needs, most important first
+AGENT_KINDS = {
+    "backend": ("backend", "schema", "api", "other"),
+    "frontend": ("frontend", "api", "other"),
+}
+
+_WORD = re.compile(r"[a-z0-9_.]+")
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token) for budgeting local-model prompts."""
+    return len(text) // 4
+
+
+def split_architecture(architecture):
+    """
+    Splits the architect's output into (title, text) sections: top-level keys when
+    it is JSON, markdown headings otherwise, or a single section as a last resort.
+    """
+    if not architecture:
+        return []
+    try:
+        design = json.loads(architecture)
+    except ValueError:
+        design = None
+
+    if isinstance(design, dict):
+        return [
+            (key, value if isinstance(value, str) else json.dumps(value, indent=1))
+            for key, value in design.items()
+        ]
+
+    sections, title, lines = [], "overview", []
+    for line in architecture.splitlines():
+        heading = re.match(r"^#{1,4}\s+(.*)", line)
+        if heading:
+            if "".join(lines).strip():
+                sections.append((title, "\n".join(lines).strip()))
+            title, lines = heading.group(1).strip(), []
+        else:
+            lines.append(line)
+    if "".join(lines).strip():
+        sections.append((title, "\n".join(lines).strip()))
+    return sections
+
+
+def section_kind(title):
+    words = set(_WORD.findall(title.lower().replace("_", " ")))
+    for kind, keywords in SECTION_KINDS.items():
+        if words & set(keywords):
+            return kind
+    return "other"
+
+
+TRIMMED = "\n... (trimmed)"
+
+
+def trim_lines(block, max_chars):
+    """
+    The leading whole lines of `block` that fit in `max_chars`, so JSON entries and
+    sentences are never cut mid-token. A first content line too long to fit on its own
+    is cut at the last space or comma before the limit.
+    """
+    lines = block.split("\n")
+    kept, size = [lines[0]], len(lines[0])
+    for line in lines[1:]:
+        room = max_chars - size - 1
+        if len(line) > room:
+            if len(kept) == 1 and room > 0:
+                cut = max(line.rfind(" ", 0, room), line.rfind(",", 0, room))
+                if cut > 0:
+                    kept.append(line[:cut + 1].rstrip())
+            break
+        kept.append(line)
+        size += 1 + len(line)
+    return "\n".join(kept)
+
+
+def build_context(architecture, task, budget, api_share=config.CONTEXT_API_SHARE):
+    """
+    Picks the architecture sections relevant to `task` and trims them to `budget` tokens.
+    Up to `api_share` of the budget goes to API sections first, so the contract between
+    backend and frontend survives a large section of the worker's own kind.
+    Returns (context_text, tokens_saved) where tokens_saved is measured against pasting
+    the whole architecture.
+    """
+    sections = split_architecture(architecture)
+    if not sections:
+        return "", 0
+
+    kinds = AGENT_KINDS.get(task.get("assigned_agent"), ("backend", "schema", "api", "frontend", "other"))
+    task_words = set(_WORD.findall(task.get("description", "").lower()))
+
+    def relevance(section):
+        title, text = section
+        kind = section_kind(title)
+        rank = kinds.index(kind) if kind in kinds else len(kinds)
+        overlap = len(task_words & set(_WORD.findall(text.lower())))
+        return (rank, -overlap)
+
+    # Not a kind this agent needs
+    ranked = [s for s in sorted(sections, key=relevance) if relevance(s)[0] < len(kinds)]
+    placed = {}  # index in ranked -> block
+    used = 0
+
+    def fill(indexes, limit):
+        nonlocal used
+        for i in indexes:
+            title, text = ranked[i]
+            block = f"## {title}\n{text}"
+            remaining = limit - used
+            if remaining <= 0:
+                break
+            if estimate_tokens(block) > remaining:
+                block = trim_lines(block, remaining * 4 - len(TRIMMED))
+                if block.count("\n") == 0:
+                    continue  # Not even one line of it fits; a later, smaller section may
+                block += TRIMMED
+            placed[i] = block
+            used += estimate_tokens(block)
+
+    fill([i for i, (title, _) in enumerate(ranked) if section_kind(title) == "api"], int(budget * api_share))
+    fill([i for i in range(len(ranked)) if i not in placed], budget)
+
+    context = "\n\n".join(placed[i] for i in sorted(placed))
+    return context, max(estimate_tokens(architecture) - estimate_tokens(context), 0)
+
+
+def context_budget(node):
+    return config.CONTEXT_BUDGETS.get(node, config.CONTEXT_BUDGET)
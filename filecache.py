@@ -0,0 +1,104 @@
+import os
+import mmap
+import threading
+from collections import OrderedDict
+
+import config
+
+
+class CachedFile:
+    """Decoded contents of one file version, split into lines and size-bounded chunks."""
+
+    def __init__(self, mtime_ns, size, text, chunk_chars):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.text = text
+        self.lines = text.splitlines(keepends=True)
+        self.chunks = []  # (first_line, last_line), 0-based and exclusive
+        start, chars = 0, 0
+        for i, line in enumerate(self.lines):
+            if chars and chars + len(line) > chunk_chars:
+                self.chunks.append((start, i))
+                start, chars = i, 0
+            chars += len(line)
+        if self.lines:
+            self.chunks.append((start, len(self.lines)))
+
+    def chunk(self, number):
+        first, last = self.chunks[number - 1]
+        return first, last, "".join(self.lines[first:last])
+
+
+def _read_bytes(path, size):
+    # Map big files instead of copying them through a read buffer
+    if size >= config.READ_MMAP_BYTES:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[:]
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class FileCache:
+    """
+    Process-wide cache of file contents keyed by path and mtime.
+    Concurrent readers of the same path share a single disk read.
+    """
+
+    def __init__(self, max_bytes=config.READ_CACHE_MAX_BYTES, chunk_chars=config.READ_CHUNK_CHARS):
+        self.max_bytes = max_bytes
+        self.chunk_chars = chunk_chars
+        self.entries = OrderedDict()
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._path_locks = {}  # path -> [lock, readers]; dropped when its last reader is done
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            path_lock = self._path_locks.setdefault(path, [threading.Lock(), 0])
+            path_lock[1] += 1
+        try:
+            return self._get(path, st, path_lock[0])
+        finally:
+            with self._lock:
+                path_lock[1] -= 1
+                if not path_lock[1]:
+                    del self._path_locks[path]
+
+    def _get(self, path, st, path_lock):
+        with path_lock:
+            with self._lock:
+                entry = self.entries.get(path)
+                if entry and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+                    self.entries.move_to_end(path)
+                    self.hits += 1
+                    return entry
+                self.misses += 1
+
+            text = _read_bytes(path, st.st_size).decode("utf-8", errors="replace")
+            entry = CachedFile(st.st_mtime_ns, st.st_size, text, self.chunk_chars)
+            with self._lock:
+                old = self.entries.pop(path, None)
+                if old:
+                    self.total -= old.size
+                self.entries[path] = entry
+                self.total += entry.size
+                while self.total > self.max_bytes and len(self.entries) > 1:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.total -= evicted.size
+            return entry
+
+    def read_range(self, path, start, end=None):
+        """Raw bytes [start, end) of a file, via mmap so large files are never fully loaded."""
+        size = os.path.getsize(path)
+        end = size if end is None else min(end, size)
+        if size == 0 or start >= end:
+            return b""
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[start:end]
+
+
+file_cache = FileCache()
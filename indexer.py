@@ -0,0 +1,144 @@
+import os
+import fnmatch
+import threading
+
+import config
+
+# Always skipped: dependency, VCS and build folders that can hold tens of thousands of files
+DEFAULT_IGNORES = [
+    ".git/", "node_modules/", "__pycache__/", ".venv/", "venv/", "env/",
+    ".pytest_cache/", ".mypy_cache/", ".next/", "dist/", "build/", ".cache/",
+    "*.pyc", ".DS_Store",
+]
+
+
+def load_ignore_patterns(root):
+    """Default ignores plus the project's own .gitignore, if it has one."""
+    patterns = list(DEFAULT_IGNORES)
+    try:
+        with open(os.path.join(root, ".gitignore"), "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                # Negations are rare in generated projects and are not supported
+                if line and not line.startswith(("#", "!")):
+                    patterns.append(line)
+    except OSError:
+        pass
+    return patterns
+
+
+def is_ignored(rel_path, is_dir, patterns):
+    """gitignore-style matching: 'dir/' matches directories only, 'a/b' is anchored to the root."""
+    name = os.path.basename(rel_path)
+    for pattern in patterns:
+        if pattern.endswith("/"):
+            if not is_dir:
+                continue
+            pattern = pattern.rstrip("/")
+        if "/" in pattern:
+            if fnmatch.fnmatch(rel_path, pattern.lstrip("/")):
+                return True
+        elif fnmatch.fnmatch(name, pattern):
+            return True
+    return False
+
+
+def walk_files(root):
+    """Every non-ignored file under root, as sorted paths."""
+    patterns = load_ignore_patterns(root)
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root)
+        rel_dir = "" if rel_dir == "." else f"{rel_dir}/"
+        dirnames[:] = [d for d in dirnames if not is_ignored(f"{rel_dir}{d}", True, patterns)]
+        found.extend(
+            os.path.join(dirpath, name) for name in filenames
+            if not is_ignored(f"{rel_dir}{name}", False, patterns)
+        )
+    return sorted(found)
+
+
+class TreeIndex:
+    """A scan of one project root, plus the directory mtimes needed to tell when it is stale."""
+
+    def __init__(self, root, max_depth, max_entries, folder_limit):
+        self.root = root
+        self.max_depth = max_depth
+        self.max_entries = max_entries
+        self.folder_limit = folder_limit
+        self.dir_mtimes = {}
+        self.lines = []
+        self.truncated = False
+        self._scan()
+
+    def _scan(self):
+        patterns = load_ignore_patterns(self.root)
+        self.lines.append(f"{os.path.basename(os.path.normpath(self.root))}/")
+        self._scan_dir(self.root, "", 1, patterns)
+        if self.truncated:
+            self.lines.append(f"... (listing stopped at {self.max_entries} entries)")
+
+    def _scan_dir(self, path, rel, depth, patterns):
+        try:
+            self.dir_mtimes[path] = os.stat(path).st_mtime_ns
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda e: (not e.is_dir(follow_symlinks=False), e.name))
+        except OSError:
+            return
+
+        indent = "  " * depth
+        shown = 0
+        for entry in entries:
+            if len(self.lines) >= self.max_entries:
+                self.truncated = True
+                return
+            is_dir = entry.is_dir(follow_symlinks=False)
+            entry_rel = f"{rel}{entry.name}"
+            if is_ignored(entry_rel, is_dir, patterns):
+                if is_dir:
+                    self.lines.append(f"{indent}{entry.name}/ (skipped)")
+                continue
+
+            if shown >= self.folder_limit:
+                remaining = len(entries) - shown
+                self.lines.append(f"{indent}... ({remaining} more entries)")
+                return
+            shown += 1
+
+            if is_dir:
+                if depth >= self.max_depth:
+                    self.lines.append(f"{indent}{entry.name}/ (not expanded)")
+                else:
+                    self.lines.append(f"{indent}{entry.name}/")
+                    self._scan_dir(entry.path, f"{entry_rel}/", depth + 1, patterns)
+            else:
+                self.lines.append(f"{indent}{entry.name}")
+
+    def is_stale(self):
+        # A directory's mtime changes whenever an entry is added, removed or renamed in it
+        for path, mtime in self.dir_mtimes.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def render(self):
+        return "\n".join(self.lines)
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def project_tree(root, max_depth=config.LIST_MAX_DEPTH, max_entries=config.LIST_MAX_ENTRIES,
+                 folder_limit=config.LIST_FOLDER_LIMIT):
+    """Returns the rendered tree for root, rescanning only if a directory in it changed."""
+    key = (os.path.abspath(root), max_depth, max_entries, folder_limit)
+    with _lock:
+        index = _indexes.get(key)
+        if index is None or index.is_stale():
+            index = TreeIndex(root, max_depth, max_entries, folder_limit)
+            _indexes[key] = index
+        return index.render()
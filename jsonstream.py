@@ -0,0 +1,51 @@
+import json
+
+
+class TaskStreamParser:
+    """
+    Incrementally scans streamed model output and yields each task object as soon
+    as its closing brace arrives. Works whether the plan is a bare list, wrapped
+    as {"tasks": [...]}, or surrounded by code fences.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.in_string = False
+        self.escaped = False
+        self.starts = []  # Buffer offsets of the currently open objects
+
+    def feed(self, text):
+        """Adds a chunk of output and returns the tasks it completed."""
+        self.buffer += text
+        tasks = []
+        while self.pos < len(self.buffer):
+            ch = self.buffer[self.pos]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.starts.append(self.pos)
+            elif ch == "}" and self.starts:
+                start = self.starts.pop()
+                task = self._as_task(self.buffer[start:self.pos + 1])
+                if task is not None:
+                    tasks.append(task)
+            self.pos += 1
+        return tasks
+
+    @staticmethod
+    def _as_task(text):
+        try:
+            obj = json.loads(text)
+        except ValueError:
+            return None
+        if isinstance(obj, dict) and "description" in obj and "assigned_agent" in obj:
+            return obj
+        return None
@@ -1,34 +1,223 @@
+"""
+DynamicFlow command line.
+
+    python main.py run "Build a todo app with Flask" --project-root ./builds/todo
+    python main.py plan "Build a todo app with Flask"   # design and plan only, no code
+    python main.py resume [THREAD_ID]
+    python main.py report [THREAD_ID]
+    python main.py config
+
+`python main.py` on its own builds the calculator example. Each subcommand imports
+only what it needs, so `report` and `config` don't pay for LangGraph or the model client.
+"""
 import os
-from workflow import app
-
-os.makedirs("./builds", exist_ok=True)
-
-inputs = {
-    "requirements": "Create me a Simple HTML AND JavaScript based calculator that can perform addition, subtraction, multiplication, and division.",
-    "project_root": "./builds/app-calculator",
-    "architecture": None,
-    "task_queue": [],
-    "completed_tasks": [],
-    "current_task": None,
-    "test_logs": None,
-    "test_status": "pending",
-    "iteration_count": 0,
-    "final_report": None
+import sys
+import json
+import asyncio
+import argparse
+import importlib
+
+import config
+
+EXAMPLE_REQUIREMENTS = "Create me a Simple HTML AND JavaScript based calculator that can perform addition, subtraction, multiplication, and division."
+EXAMPLE_ROOT = "./builds/app-calculator"
+
+# Modules each subcommand needs; imported only once that subcommand is chosen
+COMMAND_MODULES = {
+    "run": ("workflow", "checkpoints"),
+    "plan": ("workflow",),
+    "resume": ("workflow", "checkpoints"),
+    "report": ("checkpoints", "state"),
+    "config": (),
 }
 
-try:
-    final_state = app.invoke(
-        inputs, 
-        config={"recursion_limit": 50}
-    )
 
-    # 4. Report Final Results
+def print_summary(thread_id, state):
+    from state import time_to_first_file
+
+    print(f"Run Id:            {thread_id}")
+    print(f"Project Root:      {state.get('project_root')}")
+    print(f"Final Test Status: {state.get('test_status', 'pending').upper()}")
+    print(f"Total Iterations:  {state.get('iteration_count', 0)}")
+    print(f"Tasks Completed:   {len(state.get('completed_tasks') or {})}")
+    first_file = time_to_first_file(state)
+    if first_file is not None:
+        print(f"First File After:  {first_file:.1f}s")
+    reused = state.get("reused_plan")
+    if reused:
+        print(f"Plan Reused From:  run {reused['run_id']} ({reused['score']:.2f} similar)")
+
+
+async def run_graph(run_input, thread_id):
+    """Runs (or, with no input, resumes) the full graph under a checkpointed thread id."""
+    from workflow import build_app
+    from checkpoints import open_checkpointer, latest_thread_id
+
+    async with open_checkpointer() as saver:
+        if run_input is None:
+            thread_id = await latest_thread_id(saver) if thread_id == "latest" else thread_id
+            if thread_id is None:
+                raise RuntimeError("No checkpointed run to resume.")
+            print(f"⏯️  Resuming run {thread_id}")
+        final_state = await build_app(checkpointer=saver).ainvoke(
+            run_input,
+            config={"recursion_limit": 50, "configurable": {"thread_id": thread_id}},
+            durability="async",  # Persist checkpoints while the next step runs
+        )
+        return thread_id, final_state
+
+
+def finish_run(thread_id, final_state):
+    from plans import record_run
+    from cache import response_cache
+    from routing import pool
+    from structured import parse_stats
+    import tracing
+
+    record_run(final_state)
+
     print("\n" + "="*50)
     print("🏁 WORKFLOW FINISHED")
     print("="*50)
-    print(f"Final Test Status: {final_state['test_status'].upper()}")
-    print(f"Total Iterations:  {final_state['iteration_count']}")
-    print(f"Tasks Completed:   {len(final_state['completed_tasks'])}")
+    print_summary(thread_id, final_state)
+    cache_stats = response_cache.stats()
+    print(f"LLM Cache:         {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+    for line in parse_stats.summary():
+        print(f"Structured Output: {line}")
+    for url, endpoint in pool.metrics()["endpoints"].items():
+        print(f"LLM Endpoint:      {url} (concurrency limit {endpoint['limit']}, {'up' if endpoint['healthy'] else 'down'})")
+
+    if tracing.ENABLED:
+        print("\n" + tracing.summary_table())
+        print(f"\nTrace written to {tracing.export()}")
+
+
+def cmd_run(args):
+    from state import initial_state
+    from checkpoints import new_thread_id
+
+    os.makedirs("./builds", exist_ok=True)
+    thread_id = args.thread_id or new_thread_id()
+    print(f"▶️  Starting run {thread_id} (resume with: python main.py resume {thread_id})")
+    finish_run(*asyncio.run(run_graph(initial_state(args.requirements, args.project_root, thread_id), thread_id)))
+
+
+def cmd_resume(args):
+    finish_run(*asyncio.run(run_graph(None, args.thread_id or "latest")))
+
+
+def cmd_plan(args):
+    from workflow import build_app
+    from state import initial_state
+
+    final_state = asyncio.run(build_app(plan_only=True).ainvoke(
+        initial_state(args.requirements, args.project_root),
+        config={"recursion_limit": 50},
+    ))
+    tasks = final_state.get("plan") or []
+
+    print("\n" + "="*50)
+    print(f"📋 PLAN: {len(tasks)} tasks")
+    print("="*50)
+    for task in tasks:
+        after = f" (after {', '.join(task['depends_on'])})" if task.get("depends_on") else ""
+        print(f"{task.get('id')} [{task.get('assigned_agent')}]{after}: {task.get('description')}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "requirements": args.requirements,
+                "project_root": args.project_root,
+                "architecture": final_state.get("architecture"),
+                "tasks": tasks,
+            }, f, indent=2)
+        print(f"\nPlan written to {args.output}")
+
+
+def cmd_report(args):
+    from checkpoints import open_checkpointer, recent_thread_ids, latest_values
+
+    async def load():
+        async with open_checkpointer(prune_on_exit=False) as saver:
+            ids = [args.thread_id] if args.thread_id else await recent_thread_ids(saver, args.limit)
+            return [(thread_id, await latest_values(saver, thread_id)) for thread_id in ids]
+
+    runs = asyncio.run(load())
+    if args.thread_id:
+        thread_id, state = runs[0]
+        if state is None:
+            raise RuntimeError(f"No checkpoints for run {thread_id}.")
+        print_summary(thread_id, state)
+        if state.get("final_report"):
+            print("\n" + state["final_report"])
+        return
+
+    if not runs:
+        print("No checkpointed runs yet.")
+        return
+    print(f"{'Run Id':<14} {'Status':<8} {'Iter':>4} {'Tasks':>5}  Project")
+    for thread_id, state in runs:
+        state = state or {}
+        print(f"{thread_id:<14} {state.get('test_status', '?'):<8} {state.get('iteration_count', 0):>4} "
+              f"{len(state.get('completed_tasks') or {}):>5}  {state.get('project_root', '?')}")
+
+
+def cmd_config(args):
+    for name in sorted(vars(config)):
+        if name.isupper():
+            print(f"{name} = {getattr(config, name)!r}")
+
+
+def build_parser():
+    # Stops once the subcommand's imports are done; used to measure startup cost
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--startup-only", action="store_true", help=argparse.SUPPRESS)
+
+    parser = argparse.ArgumentParser(description="Build applications with the DynamicFlow agent graph.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", parents=[common], help="Design, plan, build and test a project")
+    plan = commands.add_parser("plan", parents=[common], help="Design and plan a project, then stop")
+    for sub in (run, plan):
+        sub.add_argument("requirements", nargs="?", default=EXAMPLE_REQUIREMENTS, help="What to build")
+        sub.add_argument("--project-root", default=EXAMPLE_ROOT, help="Directory to build into")
+    run.add_argument("--thread-id", help="Id to checkpoint this run under (default: a new id)")
+    plan.add_argument("--output", metavar="PATH", help="Also write the design and tasks to a JSON file")
+    run.set_defaults(handler=cmd_run)
+    plan.set_defaults(handler=cmd_plan)
+
+    resume = commands.add_parser("resume", parents=[common], help="Resume a run from its last completed step")
+    resume.add_argument("thread_id", nargs="?", help="Run to resume (default: the most recent run)")
+    resume.set_defaults(handler=cmd_resume)
+
+    report = commands.add_parser("report", parents=[common], help="List recent runs, or summarise one")
+    report.add_argument("thread_id", nargs="?", help="Run to summarise")
+    report.add_argument("--limit", type=int, default=20, help="Runs to list")
+    report.set_defaults(handler=cmd_report)
+
+    show = commands.add_parser("config", parents=[common], help="Print the effective settings")
+    show.set_defaults(handler=cmd_config)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        argv = ["run"]  # Builds the example, as `python main.py` always has
+    args = build_parser().parse_args(argv)
+
+    for module in COMMAND_MODULES[args.command]:
+        importlib.import_module(module)
+    if args.startup_only:
+        return 0
+
+    try:
+        args.handler(args)
+        return 0
+    except Exception as e:
+        print(f"\n❌ Execution Error: {e}")
+        return 1
+
 
-except Exception as e:
-    print(f"\n❌ Execution Error: {e}")
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
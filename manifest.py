@@ -0,0 +1,62 @@
+import os
+import hashlib
+import threading
+
+from indexer import walk_files
+
+_hashes = {}  # abs path -> (mtime_ns, size, hash)
+_lock = threading.Lock()
+
+
+def file_hash(path):
+    """Content hash of a file, recomputed only when its mtime or size changes."""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    with _lock:
+        cached = _hashes.get(path)
+    if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    digest = h.hexdigest()[:16]
+    with _lock:
+        _hashes[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def scan(root):
+    """{relative path: content hash} for every non-ignored file under root."""
+    hashes = {}
+    for path in walk_files(root):
+        try:
+            hashes[os.path.relpath(path, root)] = file_hash(path)
+        except OSError:
+            continue  # Deleted while scanning
+    return hashes
+
+
+def hashes_for(root, paths):
+    """Content hashes of the given files (relative to root); missing files are left out."""
+    hashes = {}
+    for path in paths:
+        try:
+            hashes[path] = file_hash(os.path.join(root, path))
+        except OSError:
+            continue
+    return hashes
+
+
+def digest(hashes):
+    """One hash for a whole scan, to tell whether anything in the project changed."""
+    h = hashlib.sha256()
+    for path, file_digest in sorted(hashes.items()):
+        h.update(f"{path}\0{file_digest}\n".encode())
+    return h.hexdigest()[:16]
+
+
+def changed(old, new):
+    """Paths added, modified or removed between two scans."""
+    return sorted(p for p in set(old) | set(new) if old.get(p) != new.get(p))
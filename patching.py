@@ -0,0 +1,126 @@
+import re
+import difflib
+from dataclasses import dataclass
+from typing import List, Optional
+
+# Lowest similarity at which a hunk's context still counts as a match
+FUZZ_THRESHOLD = 0.8
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+_SEARCH = re.compile(r"^<{5,} ?SEARCH\s*$")
+_DIVIDER = re.compile(r"^={5,}\s*$")
+_REPLACE = re.compile(r"^>{5,} ?REPLACE\s*$")
+_LINE_END = re.compile(r"\r\n|\n|\r")
+
+
+@dataclass
+class Hunk:
+    old: List[str]
+    new: List[str]
+    hint: Optional[int] = None  # 0-based line the hunk is expected at, if known
+
+
+def parse_patch(patch: str) -> List[Hunk]:
+    """Parses SEARCH/REPLACE blocks or a unified diff into hunks."""
+    lines = patch.splitlines()
+    if any(_SEARCH.match(line) for line in lines):
+        return _parse_search_replace(lines)
+    return _parse_unified(lines)
+
+
+def _parse_search_replace(lines):
+    hunks, old, new, section = [], [], [], None
+    for line in lines:
+        if _SEARCH.match(line):
+            old, new, section = [], [], "old"
+        elif _DIVIDER.match(line) and section == "old":
+            section = "new"
+        elif _REPLACE.match(line) and section == "new":
+            hunks.append(Hunk(old, new))
+            section = None
+        elif section == "old":
+            old.append(line)
+        elif section == "new":
+            new.append(line)
+    return hunks
+
+
+def _parse_unified(lines):
+    hunks, current = [], None
+    for line in lines:
+        header = _HUNK_HEADER.match(line)
+        if header:
+            current = Hunk([], [], max(int(header.group(1)) - 1, 0))
+            hunks.append(current)
+        elif current is None or line.startswith(("--- ", "+++ ", "\\ No newline")):
+            continue
+        elif line.startswith("-"):
+            current.old.append(line[1:])
+        elif line.startswith("+"):
+            current.new.append(line[1:])
+        else:
+            # Context line; a bare empty line is an empty context line
+            text = line[1:] if line.startswith(" ") else line
+            current.old.append(text)
+            current.new.append(text)
+    return hunks
+
+
+def _closest(candidates, hint):
+    if hint is None:
+        return candidates[0]
+    return min(candidates, key=lambda i: abs(i - hint))
+
+
+def find_hunk(lines: List[str], old: List[str], hint: Optional[int] = None):
+    """
+    Locates `old` in `lines`: exactly, then ignoring whitespace, then by similarity.
+    Returns the start index, or None when nothing is close enough.
+    """
+    n, m = len(lines), len(old)
+    if m == 0:
+        return min(hint, n) if hint is not None else n
+    if m > n:
+        return None
+
+    for normalise in (lambda s: s, lambda s: " ".join(s.split())):
+        target = [normalise(s) for s in old]
+        matches = [i for i in range(n - m + 1) if [normalise(s) for s in lines[i:i + m]] == target]
+        if matches:
+            return _closest(matches, hint)
+
+    joined = "\n".join(old)
+    best, best_ratio = None, FUZZ_THRESHOLD
+    for i in range(n - m + 1):
+        ratio = difflib.SequenceMatcher(None, joined, "\n".join(lines[i:i + m])).ratio()
+        if ratio > best_ratio or (ratio == best_ratio and best is not None and hint is not None
+                                  and abs(i - hint) < abs(best - hint)):
+            best, best_ratio = i, ratio
+    return best
+
+
+def apply_patch(text: str, patch: str):
+    """
+    Applies every hunk of `patch` to `text`, keeping its line ending (that of its first line).
+    Returns (new_text, applied, rejected) where rejected lists (hunk_number, first_old_line).
+    """
+    hunks = parse_patch(patch)
+    first_end = _LINE_END.search(text)
+    newline = first_end.group() if first_end else "\n"
+    lines = text.splitlines()
+    trailing_newline = text.endswith("\n") or not text
+    offset = 0
+    applied, rejected = 0, []
+
+    for number, hunk in enumerate(hunks, 1):
+        hint = hunk.hint + offset if hunk.hint is not None else None
+        start = find_hunk(lines, hunk.old, hint)
+        if start is None:
+            rejected.append((number, hunk.old[0] if hunk.old else ""))
+            continue
+        lines[start:start + len(hunk.old)] = hunk.new
+        offset += len(hunk.new) - len(hunk.old)
+        applied += 1
+
+    new_text = newline.join(lines) + (newline if trailing_newline and lines else "")
+    return new_text, applied, rejected
@@ -0,0 +1,242 @@
+import os
+import re
+import json
+import math
+import time
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+
+import config
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Words that say nothing about what is being built
+STOP_WORDS = set(
+    "a an the with and or in on of for to using use build create make simple basic "
+    "app application that which it is me my i we need want please can could should will "
+    "be able based perform support allow let user do web website webpage page site webapp program".split()
+)
+# Words after which a request stops naming what is being built and starts describing it
+SUBJECT_END = set(
+    "with that which where who using in for to supporting featuring including allowing having "
+    "so via by from where plus".split()
+)
+_CLAUSE = re.compile(r"[,.;:!?()\n]")
+# Languages, frameworks and stores, by their usual spellings. A plan is tied to its stack,
+# so these are compared separately from what is being built. HTML and CSS come with any
+# web stack, so they are ignored rather than counted.
+STACK_ALIASES = {
+    "html": None, "html5": None, "css": None, "css3": None, "javascript": "javascript", "js": "javascript",
+    "vanilla": "javascript", "typescript": "typescript", "ts": "typescript", "python": "python", "flask": "flask",
+    "django": "django", "fastapi": "fastapi", "node": "node", "nodejs": "node", "express": "express",
+    "react": "react", "reactjs": "react", "vue": "vue", "vuejs": "vue", "angular": "angular", "svelte": "svelte",
+    "nextjs": "next", "next": "next", "sqlite": "sqlite", "postgres": "postgres", "postgresql": "postgres",
+    "mysql": "mysql", "mongodb": "mongodb", "mongo": "mongodb", "php": "php", "laravel": "laravel",
+    "ruby": "ruby", "rails": "rails", "java": "java", "spring": "spring", "go": "go", "golang": "go",
+    "rust": "rust", "tailwind": "tailwind", "bootstrap": "bootstrap",
+}
+# Frameworks name their language too, so "Flask" and "Python Flask" are the same stack
+STACK_LANGUAGE = {
+    "flask": "python", "django": "python", "fastapi": "python", "express": "javascript", "node": "javascript",
+    "react": "javascript", "vue": "javascript", "angular": "typescript", "svelte": "javascript",
+    "next": "javascript", "laravel": "php", "rails": "ruby", "spring": "java",
+}
+# Score factor when only one of two requests names its stack
+UNKNOWN_STACK = 0.8
+# Suffixes folded so e.g. "addition"/"adding", "multiply"/"multiplication" match; applied twice
+_SUFFIXES = (
+    ("ication", ""), ("ation", ""), ("ition", ""), ("sion", "d"), ("ing", ""), ("ion", ""),
+    ("ies", "y"), ("es", ""), ("ed", ""), ("s", ""), ("e", ""), ("y", ""),
+)
+
+
+def stem(word):
+    for _ in range(2):
+        for suffix, replacement in _SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                word = word[:-len(suffix)] + replacement
+                break
+    return word
+
+
+def terms(text):
+    """(Stemmed content words as term frequencies, set of stack names) of a request."""
+    words, stack = [], set()
+    for word in _WORD.findall(text.lower()):
+        if word in STACK_ALIASES:
+            if STACK_ALIASES[word]:
+                stack.add(STACK_ALIASES[word])
+                stack.add(STACK_LANGUAGE.get(STACK_ALIASES[word], STACK_ALIASES[word]))
+        elif word not in STOP_WORDS:
+            words.append(stem(word))
+    return Counter(words), stack
+
+
+def subject(text):
+    """
+    Stemmed words naming what is being built: those of the request's first clause before
+    it starts describing features, e.g. {"todo", "list"} for "Build a todo list app with ...".
+    """
+    words = set()
+    for word in _WORD.findall(_CLAUSE.split(text.lower(), 1)[0]):
+        if word in SUBJECT_END:
+            break
+        if word not in STACK_ALIASES and word not in STOP_WORDS:
+            words.add(stem(word))
+    return words or set(terms(text)[0])
+
+
+def stack_match(query, run):
+    """
+    Weighted Jaccard similarity of two stacks, with frameworks counting double their
+    language: 1.0 for the same stack, UNKNOWN_STACK if only one request names one.
+    """
+    if not query and not run:
+        return 1.0
+    if not query or not run:
+        return UNKNOWN_STACK
+    weight = lambda names: sum(2 if name in STACK_LANGUAGE else 1 for name in names)
+    return weight(query & run) / weight(query | run)
+
+
+class PlanStore:
+    """
+    Past runs' requirements, architecture, plan and outcome, with an in-memory TF-IDF
+    index over the requirements. Lookups score only the runs that share a term with
+    the query, so they stay in the milliseconds with thousands of stored runs.
+    """
+
+    def __init__(self, path=config.PLAN_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._postings = defaultdict(dict)  # term -> {run id: term frequency}
+        self._runs = {}  # run id -> (passed, term frequencies, stack, subject)
+        self._norms = {}  # run id -> vector length under the IDF of when it was computed
+        self._norms_at = 0  # Number of runs when the norms were last recomputed
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, requirements TEXT NOT NULL, "
+                "project_root TEXT NOT NULL, architecture TEXT, tasks TEXT NOT NULL, "
+                "passed INTEGER NOT NULL, created_at REAL NOT NULL)"
+            )
+            for run_id, requirements, passed in self._conn.execute("SELECT id, requirements, passed FROM runs"):
+                self._index(run_id, requirements, passed)
+        return self._conn
+
+    def _index(self, run_id, requirements, passed):
+        tf, stack = terms(requirements)
+        self._runs[run_id] = (bool(passed), tf, stack, subject(requirements))
+        for term, count in tf.items():
+            self._postings[term][run_id] = count
+        # IDF drifts slowly; recompute every norm only once the store has grown by a tenth
+        if len(self._runs) > self._norms_at * 1.1:
+            self._norms.clear()
+            self._norms_at = len(self._runs)
+
+    def _idf(self, term):
+        return math.log((1 + len(self._runs)) / (1 + len(self._postings.get(term, ())))) + 1
+
+    def _norm(self, run_id):
+        if run_id not in self._norms:
+            tf = self._runs[run_id][1]
+            self._norms[run_id] = math.sqrt(sum(((1 + math.log(c)) * self._idf(t)) ** 2 for t, c in tf.items())) or 1.0
+        return self._norms[run_id]
+
+    def _coverage(self, words, tf):
+        """IDF-weighted share of `words` that occur in the term frequencies `tf`."""
+        total = sum(self._idf(w) for w in words)
+        return sum(self._idf(w) for w in words if w in tf) / total if total else 1.0
+
+    def record(self, requirements, project_root, architecture, tasks, passed):
+        with self._lock:
+            db = self._db()
+            cursor = db.execute(
+                "INSERT INTO runs (requirements, project_root, architecture, tasks, passed, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (requirements, project_root, architecture, json.dumps(tasks), int(passed), time.time()),
+            )
+            db.commit()
+            self._index(cursor.lastrowid, requirements, passed)
+            return cursor.lastrowid
+
+    def most_similar(self, requirements, passed_only=True):
+        """
+        (similarity, run) for the closest stored run, or (0.0, None). Similarity is the
+        TF-IDF cosine of the requests' content words, scaled by how well the stacks match.
+        run["subject_match"] is how fully each request's subject (what is being built)
+        appears in the other, so e.g. a shopping list is not taken for a todo list.
+        """
+        with self._lock:
+            db = self._db()
+            tf, stack = terms(requirements)
+            idf = {t: self._idf(t) for t in tf}
+            query = {t: (1 + math.log(c)) * idf[t] for t, c in tf.items()}
+            query_norm = math.sqrt(sum(w * w for w in query.values())) or 1.0
+
+            scores = defaultdict(float)
+            for term, weight in query.items():
+                weight *= idf[term]
+                for run_id, count in self._postings.get(term, {}).items():
+                    if self._runs[run_id][0] or not passed_only:
+                        scores[run_id] += weight * (1 + math.log(count))
+            if not scores:
+                return 0.0, None
+
+            for run_id in scores:
+                scores[run_id] *= stack_match(stack, self._runs[run_id][2]) / (self._norm(run_id) * query_norm)
+            best = max(scores, key=lambda run_id: (scores[run_id], run_id))
+            score = scores[best]
+            _, best_tf, _, best_subject = self._runs[best]
+            subject_match = min(self._coverage(subject(requirements), best_tf), self._coverage(best_subject, tf))
+            row = db.execute(
+                "SELECT id, requirements, project_root, architecture, tasks, passed FROM runs WHERE id = ?", (best,)
+            ).fetchone()
+
+        run = dict(zip(("id", "requirements", "project_root", "architecture", "tasks", "passed"), row))
+        run["tasks"] = json.loads(run["tasks"])
+        run["subject_match"] = subject_match
+        return score, run
+
+    def stats(self):
+        with self._lock:
+            self._db()
+            return {"runs": len(self._runs), "passed": sum(p for p, *_ in self._runs.values())}
+
+
+def rebase(run, project_root):
+    """The stored architecture and tasks, with paths moved from the old project root to the new one."""
+    old = run["project_root"].rstrip("/")
+    new = project_root.rstrip("/")
+    architecture = (run["architecture"] or "").replace(old, new)
+    tasks = [
+        {k: (v.replace(old, new) if isinstance(v, str) else v) for k, v in task.items()}
+        for task in run["tasks"]
+    ]
+    return architecture, tasks
+
+
+def reusable(score, run):
+    """Whether a most_similar match is close enough to reuse its design and plan outright."""
+    return (
+        run is not None and score >= config.PLAN_REUSE_THRESHOLD
+        and run["subject_match"] >= config.PLAN_SUBJECT_THRESHOLD
+    )
+
+
+plan_store = PlanStore()
+
+
+def record_run(state):
+    """Stores a finished run so later runs with similar requirements can reuse its plan."""
+    if not config.PLAN_REUSE_ENABLED or not state.get("plan"):
+        return None
+    return plan_store.record(
+        state["requirements"], state["project_root"], state.get("architecture"),
+        state["plan"], state.get("test_status") == "passed",
+    )
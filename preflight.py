@@ -0,0 +1,156 @@
+import os
+import json
+import shutil
+import asyncio
+import subprocess
+from html.parser import HTMLParser
+
+import config
+from indexer import walk_files
+from manifest import file_hash
+
+# Elements that never have a closing tag
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr", "!doctype",
+}
+# Elements whose closing tag HTML lets you leave out
+OPTIONAL_CLOSE = {
+    "html", "head", "body", "p", "li", "dt", "dd", "tr", "td", "th", "thead", "tbody", "tfoot",
+    "option", "optgroup", "colgroup",
+}
+
+
+# (checker, content hash) -> result, so unchanged files are not checked again
+_results = {}
+
+
+def _result(path, check, error=None, line=None):
+    return {"path": path, "check": check, "ok": error is None, "line": line, "message": error, "cached": False}
+
+
+def check_python(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        source = f.read()
+    try:
+        compile(source, path, "exec")  # What py_compile does, without writing a .pyc
+    except SyntaxError as e:
+        return _result(path, "python", f"{type(e).__name__}: {e.msg}", e.lineno)
+    return _result(path, "python")
+
+
+def check_json(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    try:
+        json.loads(text)
+    except ValueError as e:
+        return _result(path, "json", str(e), getattr(e, "lineno", None))
+    return _result(path, "json")
+
+
+class _TagChecker(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.stack = []  # (tag, line)
+        self.errors = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in VOID_TAGS:
+            self.stack.append((tag, self.getpos()[0]))
+
+    def handle_endtag(self, tag):
+        line = self.getpos()[0]
+        if tag in VOID_TAGS:
+            return
+        if not any(open_tag == tag for open_tag, _ in self.stack):
+            self.errors.append((line, f"</{tag}> has no matching <{tag}>"))
+            return
+        while self.stack:
+            open_tag, opened = self.stack.pop()
+            if open_tag == tag:
+                break
+            if open_tag not in OPTIONAL_CLOSE:
+                self.errors.append((opened, f"<{open_tag}> is not closed before </{tag}> on line {line}"))
+
+
+def check_html(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    parser = _TagChecker()
+    parser.feed(text)
+    parser.close()
+    errors = parser.errors + [
+        (line, f"<{tag}> is never closed") for tag, line in parser.stack if tag not in OPTIONAL_CLOSE
+    ]
+    if errors:
+        line, message = min(errors)
+        more = f" (and {len(errors) - 1} more)" if len(errors) > 1 else ""
+        return _result(path, "html", message + more, line)
+    return _result(path, "html")
+
+
+def check_javascript(path):
+    result = subprocess.run(["node", "--check", path], capture_output=True, text=True, timeout=20)
+    if result.returncode == 0:
+        return _result(path, "javascript")
+    # node prints "file:line" on the first line of a syntax error
+    first = result.stderr.strip().splitlines()[0] if result.stderr.strip() else ""
+    line = first.rsplit(":", 1)[-1]
+    message = next((l for l in result.stderr.splitlines() if "Error" in l), result.stderr.strip())
+    return _result(path, "javascript", message, int(line) if line.isdigit() else None)
+
+
+CHECKERS = {
+    ".py": check_python,
+    ".json": check_json,
+    ".html": check_html,
+    ".htm": check_html,
+}
+if shutil.which("node"):
+    CHECKERS.update({".js": check_javascript, ".mjs": check_javascript, ".cjs": check_javascript})
+
+
+def checkable_files(root):
+    """Files under root that have a checker, skipping ignored folders such as node_modules."""
+    return [path for path in walk_files(root) if os.path.splitext(path)[1].lower() in CHECKERS]
+
+
+def check_file(path):
+    checker = CHECKERS[os.path.splitext(path)[1].lower()]
+    try:
+        key = (checker.__name__, file_hash(path))
+        if key in _results:
+            return {**_results[key], "path": path, "cached": True}
+        result = checker(path)
+    except (OSError, subprocess.SubprocessError) as e:
+        return _result(path, checker.__name__.replace("check_", ""), f"Could not check: {e}")
+    _results[key] = result
+    return result
+
+
+async def run_preflight(root, concurrency=config.PREFLIGHT_CONCURRENCY):
+    """
+    Syntax-checks every generated file under root in parallel. Returns one result per
+    file; files whose content was already checked reuse the earlier result.
+    """
+    files = await asyncio.to_thread(checkable_files, root)
+    limit = asyncio.Semaphore(concurrency)
+
+    async def check(path):
+        async with limit:
+            return await asyncio.to_thread(check_file, path)
+
+    return list(await asyncio.gather(*(check(path) for path in files)))
+
+
+def format_diagnostics(results, root=None):
+    """Failed checks as 'file:line: message' lines for the debugger."""
+    lines = []
+    for r in results:
+        if r["ok"]:
+            continue
+        path = os.path.relpath(r["path"], root) if root else r["path"]
+        location = f"{path}:{r['line']}" if r["line"] else path
+        lines.append(f"{location}: [{r['check']}] {r['message']}")
+    return "\n".join(lines)
@@ -0,0 +1,225 @@
+import os
+import re
+import time
+import atexit
+import signal
+import socket
+import threading
+import subprocess
+from collections import deque
+
+import config
+from manifest import scan, digest
+
+# Longest line kept in a log buffer; the rest is cut off
+MAX_LINE_CHARS = 2000
+# Files a running server writes itself; changes to them don't make it stale
+RUNTIME_FILES = (".db", ".sqlite", ".sqlite3", ".log", ".pid")
+
+
+def port_in_use(port):
+    """Whether something on this host accepts connections on `port`."""
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+class ManagedProcess:
+    """
+    A shell command in its own process group, with stdout and stderr streamed into
+    bounded ring buffers so a chatty server can't grow memory without limit.
+    """
+
+    def __init__(self, command, work_dir, log_lines=config.PROCESS_LOG_LINES):
+        self.command = command
+        self.work_dir = work_dir
+        self.stdout = deque(maxlen=log_lines)
+        self.stderr = deque(maxlen=log_lines)
+        self._new_output = threading.Condition()
+        self.proc = subprocess.Popen(
+            command,
+            cwd=work_dir,
+            shell=True,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            errors="replace",
+            start_new_session=True,  # Own process group, so children die with it
+        )
+        self._readers = [
+            threading.Thread(target=self._pump, args=(self.proc.stdout, self.stdout), daemon=True),
+            threading.Thread(target=self._pump, args=(self.proc.stderr, self.stderr), daemon=True),
+        ]
+        for reader in self._readers:
+            reader.start()
+
+    def _pump(self, pipe, buffer):
+        for line in iter(pipe.readline, ""):
+            with self._new_output:
+                buffer.append(line[:MAX_LINE_CHARS])
+                self._new_output.notify_all()
+        pipe.close()
+
+    @property
+    def pid(self):
+        return self.proc.pid
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def output(self):
+        return "".join(self.stdout), "".join(self.stderr)
+
+    def wait(self, timeout):
+        """
+        Waits for the command to exit. Returns its exit code, or None if it was killed
+        on timeout. Anything it left running in the background is stopped either way.
+        """
+        try:
+            self.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            pass
+        timed_out = self.alive()
+        self.kill()
+        for reader in self._readers:
+            reader.join(timeout=1)
+        return None if timed_out else self.proc.returncode
+
+    def kill(self, grace=3):
+        """Stops the whole process group: SIGTERM first, SIGKILL if it doesn't exit in time."""
+        try:
+            os.killpg(self.proc.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return  # The group is already gone
+        try:
+            self.proc.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            self.proc.wait()
+
+    def wait_for_port(self, port, deadline, settle=0.3):
+        """
+        Waits until `port` accepts connections while this process is running. Callers make
+        sure nothing else held the port before launch, so a connection means this process
+        is listening; the short settle catches a process that connected to a late-bound
+        port and then exited on its own bind error.
+        """
+        while time.monotonic() < deadline and self.alive():
+            if port_in_use(port):
+                time.sleep(settle)
+                return self.alive()
+            time.sleep(0.2)
+        return False
+
+    def wait_for_log(self, pattern, deadline):
+        regex = re.compile(pattern)
+        with self._new_output:
+            while True:
+                if any(regex.search(line) for line in (*self.stdout, *self.stderr)):
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.alive():
+                    return False
+                self._new_output.wait(timeout=min(remaining, 0.5))
+
+
+class ProcessManager:
+    """
+    Runs foreground commands with process-group timeouts, and keeps background services
+    (dev servers) alive between tester iterations. A service is restarted only when it
+    died or a file in its directory changed since it started.
+    """
+
+    def __init__(self):
+        self.services = {}  # (abs work_dir, command) -> (ManagedProcess, project digest at start)
+        self.ports = {}  # port -> key of the service started to listen on it
+        self._lock = threading.Lock()
+        self._port_released = threading.Condition(self._lock)
+
+    def run(self, command, work_dir, timeout=config.SHELL_TIMEOUT):
+        """Returns (exit code or None on timeout, stdout, stderr)."""
+        process = ManagedProcess(command, work_dir)
+        code = process.wait(timeout)
+        stdout, stderr = process.output()
+        return code, stdout, stderr
+
+    def _claim_port(self, port, key, deadline):
+        """
+        Waits (lock held) until no other running service owns `port`, e.g. the server of a
+        speculative candidate testing in another workspace, then takes it. Raises if it stays
+        owned, or if a process this manager didn't start is listening on it.
+        """
+        while True:
+            owner = self.ports.get(port)
+            if owner is None or owner == key or owner not in self.services or not self.services[owner][0].alive():
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(f"port {port} is still in use by `{owner[1]}` in {owner[0]}")
+            self._port_released.wait(timeout=min(remaining, 0.5))
+        # A server stopped a moment ago may still be closing its socket
+        grace = min(deadline, time.monotonic() + 2)
+        while port_in_use(port) and time.monotonic() < grace:
+            time.sleep(0.1)
+        if port_in_use(port):
+            raise RuntimeError(f"port {port} is already in use by a process not started with start_server; stop it or use another port")
+        self.ports[port] = key
+
+    def start_service(self, command, work_dir, port=None, ready_pattern=None,
+                      timeout=config.SERVICE_READY_TIMEOUT, port_wait=config.SHELL_TIMEOUT):
+        """
+        Starts `command` in the background, or reuses the warm one already running.
+        Waits until `port` accepts connections or `ready_pattern` appears in its output.
+        A port owned by another service is waited for up to `port_wait` seconds, so
+        servers of parallel workspaces take turns. Returns (process, reused, ready).
+        """
+        key = (os.path.abspath(work_dir), command)
+        files = digest({p: h for p, h in scan(work_dir).items() if not p.endswith(RUNTIME_FILES)})
+        with self._lock:
+            running = self.services.get(key)
+            if running and running[0].alive() and running[1] == files:
+                return running[0], True, True
+            if running:
+                running[0].kill()
+            if port:
+                self._claim_port(port, key, time.monotonic() + port_wait)
+            process = ManagedProcess(command, work_dir)
+            self.services[key] = (process, files)
+
+        deadline = time.monotonic() + timeout
+        if port:
+            ready = process.wait_for_port(port, deadline)
+        elif ready_pattern:
+            ready = process.wait_for_log(ready_pattern, deadline)
+        else:
+            time.sleep(min(1.0, timeout))  # No probe given: just make sure it didn't exit straight away
+            ready = process.alive()
+        return process, False, ready
+
+    def service_logs(self, work_dir):
+        """(command, process) for every service started in work_dir."""
+        root = os.path.abspath(work_dir)
+        with self._lock:
+            return [(command, process) for (path, command), (process, _) in self.services.items() if path == root]
+
+    def stop_services(self, under=None):
+        """Stops every service, or only those running inside the `under` directory."""
+        root = os.path.abspath(under) if under else None
+        with self._lock:
+            keys = [key for key in self.services if root is None or os.path.commonpath([key[0], root]) == root]
+            stopping = [self.services.pop(key)[0] for key in keys]
+        for process in stopping:
+            process.kill()
+        with self._lock:
+            self.ports = {port: key for port, key in self.ports.items() if key not in keys}
+            self._port_released.notify_all()
+
+
+process_manager = ProcessManager()
+atexit.register(process_manager.stop_services)
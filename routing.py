@@ -0,0 +1,323 @@
+import json
+import time
+import asyncio
+import itertools
+import threading
+import collections
+import urllib.request
+from contextlib import contextmanager, asynccontextmanager
+
+import httpx
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+import config
+import tracing
+
+# Errors that mean the endpoint itself is unreachable, rather than a bad request
+ENDPOINT_DOWN = (httpx.ConnectError, ConnectionError)
+# Errors that mean the endpoint is up but overloaded
+ENDPOINT_OVERLOADED = (httpx.TimeoutException,)
+ENDPOINT_ERRORS = (httpx.TransportError, ConnectionError)
+
+
+class AdaptiveLimit:
+    """
+    AIMD concurrency limit for one endpoint. Grows by about one slot per round of
+    requests while latency stays near its baseline, and is cut multiplicatively on
+    timeouts or when latency jumps past `spike` times the baseline.
+    """
+
+    def __init__(self, initial=config.LLM_CONCURRENCY_INITIAL, minimum=config.LLM_CONCURRENCY_MIN,
+                 maximum=config.LLM_CONCURRENCY_MAX, spike=config.LLM_LATENCY_SPIKE, backoff=0.7,
+                 share=config.LLM_PROCESS_SHARE):
+        # Processes sharing the endpoint each get an equal part of its limit
+        self.value = float(max(minimum, initial / share))
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum // share)
+        self.spike = spike
+        self.backoff = backoff
+        self.baseline = None  # Typical seconds per completion token when the server is not contended
+        self.last_cut = 0.0
+
+    @property
+    def limit(self):
+        return max(self.minimum, int(self.value))
+
+    def on_success(self, seconds, tokens=0):
+        # Per-token latency is stable across short and long answers; fall back to raw time
+        sample = seconds / tokens if tokens else seconds
+        if self.baseline is None:
+            self.baseline = sample
+        elif sample < self.baseline:
+            self.baseline = sample
+        else:
+            self.baseline += 0.02 * (sample - self.baseline)  # Drift up slowly so the baseline tracks load changes
+
+        if sample <= self.baseline * self.spike:
+            self.value = min(self.maximum, self.value + 1 / self.value)
+        elif time.perf_counter() - seconds > self.last_cut:
+            # Requests that started before the last cut reflect the old limit; cut once per window
+            self._cut(self.backoff)
+
+    def on_overload(self):
+        self._cut(0.5)
+
+    def _cut(self, factor):
+        self.value = max(self.minimum, self.value * factor)
+        self.last_cut = time.perf_counter()
+
+
+class Endpoint:
+    """One Ollama server, with its in-flight request count, concurrency limit and a client per model."""
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.healthy = True
+        self.limit = AdaptiveLimit()
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self, model, params, tools):
+        """Reuses one ChatOllama (and its HTTP connection pool) per model, parameters and tool set."""
+        key = (model, json.dumps(params, sort_keys=True), tuple(id(t) for t in tools or ()))
+        with self._lock:
+            if key not in self._clients:
+                from langchain_ollama import ChatOllama  # Slow to import; only needed once a model is called
+                chat = ChatOllama(
+                    model=model, base_url=self.url,
+                    client_kwargs={"timeout": config.LLM_TIMEOUT}, **params
+                )
+                self._clients[key] = chat.bind_tools(tools) if tools else chat
+            return self._clients[key]
+
+    def check(self, timeout=2.0):
+        try:
+            with urllib.request.urlopen(f"{self.url}/api/tags", timeout=timeout) as resp:
+                json.load(resp)
+            self.healthy = True
+        except Exception:
+            self.healthy = False
+        return self.healthy
+
+
+class EndpointPool:
+    """
+    Spreads requests over several Ollama servers, sending each one to the healthy
+    endpoint with the fewest requests in flight. Each endpoint admits at most its
+    adaptive limit of requests; async callers beyond that wait in a queue.
+    Unreachable endpoints are taken out of rotation and re-checked in the background.
+    """
+
+    def __init__(self, urls, health_interval=config.HEALTH_CHECK_INTERVAL):
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+        self._checker = None
+        self._waiters = collections.deque()  # (loop, future) of queued async callers
+
+    def _start_health_checks(self):
+        if self._checker is None and len(self.endpoints) > 1:
+            self._checker = threading.Thread(target=self._health_loop, daemon=True)
+            self._checker.start()
+
+    def _health_loop(self):
+        while True:
+            for endpoint in self.endpoints:
+                endpoint.check()
+            self._wake()
+            time.sleep(self.health_interval)
+
+    def _pick(self, exclude, respect_limit):
+        self._start_health_checks()
+        candidates = [e for e in self.endpoints if e not in exclude]
+        usable = [e for e in candidates if e.healthy] or candidates
+        if respect_limit:
+            usable = [e for e in usable if e.outstanding < e.limit.limit]
+        if not usable:
+            return None
+        # Least outstanding requests; rotate between ties so idle endpoints share the load
+        turn = next(self._turn)
+        endpoint = min(
+            usable,
+            key=lambda e: (e.outstanding / e.limit.limit, (self.endpoints.index(e) - turn) % len(self.endpoints)),
+        )
+        endpoint.outstanding += 1
+        return endpoint
+
+    def _wake(self):
+        """Wakes one queued caller per free slot, e.g. after a release or when a limit grows."""
+        with self._lock:
+            usable = [e for e in self.endpoints if e.healthy] or self.endpoints
+            free = sum(max(e.limit.limit - e.outstanding, 0) for e in usable)
+            while self._waiters and free > 0:
+                loop, future = self._waiters.popleft()
+                if not future.done():
+                    loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+                    free -= 1
+
+    def release(self, endpoint, seconds=None, tokens=0, error=None):
+        with self._lock:
+            endpoint.outstanding -= 1
+            if isinstance(error, ENDPOINT_DOWN):
+                endpoint.healthy = False
+            elif isinstance(error, ENDPOINT_OVERLOADED):
+                endpoint.limit.on_overload()
+            elif error is None and seconds is not None:
+                endpoint.limit.on_success(seconds, tokens)
+        tracing.counter("llm limit", **{e.url: e.limit.limit for e in self.endpoints})
+        self._wake()
+
+    @contextmanager
+    def lease(self, exclude=()):
+        """Blocking callers are not queued; they go to the least-loaded endpoint straight away."""
+        if len(exclude) >= len(self.endpoints):
+            raise ConnectionError("No Ollama endpoint left to try")
+        with self._lock:
+            endpoint = self._pick(exclude, respect_limit=False)
+        outcome = {"tokens": 0}
+        start = time.perf_counter()
+        try:
+            yield endpoint, outcome
+        except ENDPOINT_ERRORS as e:
+            self.release(endpoint, error=e)
+            raise
+        except BaseException:
+            self.release(endpoint)
+            raise
+        self.release(endpoint, time.perf_counter() - start, outcome["tokens"])
+
+    @asynccontextmanager
+    async def alease(self, exclude=()):
+        """Waits for a free slot under some endpoint's adaptive limit (backpressure)."""
+        if len(exclude) >= len(self.endpoints):
+            raise ConnectionError("No Ollama endpoint left to try")
+        while True:
+            with self._lock:
+                endpoint = self._pick(exclude, respect_limit=True)
+                if endpoint is None:
+                    future = asyncio.get_running_loop().create_future()
+                    self._waiters.append((asyncio.get_running_loop(), future))
+            if endpoint is not None:
+                break
+            tracing.counter("llm queue", depth=len(self._waiters))
+            try:
+                await future
+            except asyncio.CancelledError:
+                self._wake()  # Pass on a wake-up this caller can no longer use
+                raise
+
+        outcome = {"tokens": 0}
+        start = time.perf_counter()
+        try:
+            yield endpoint, outcome
+        except ENDPOINT_ERRORS as e:
+            self.release(endpoint, error=e)
+            raise
+        except BaseException:
+            self.release(endpoint)
+            raise
+        self.release(endpoint, time.perf_counter() - start, outcome["tokens"])
+
+    def metrics(self):
+        """Current limit, in-flight requests and health per endpoint, plus the wait queue depth."""
+        return {
+            "queue_depth": len(self._waiters),
+            "endpoints": {
+                e.url: {"limit": e.limit.limit, "outstanding": e.outstanding, "healthy": e.healthy}
+                for e in self.endpoints
+            },
+        }
+
+
+pool = EndpointPool(config.OLLAMA_ENDPOINTS)
+
+
+def _completion_tokens(msg):
+    usage = getattr(msg, "usage_metadata", None) or {}
+    return usage.get("output_tokens", 0)
+
+
+class RoutedLLM:
+    """
+    Chat model for one model name whose calls are load-balanced across the endpoint
+    pool. A call that can't reach its endpoint, or times out, is retried on the next one.
+    """
+
+    def __init__(self, model, endpoints=None, tools=None, **params):
+        self.model = model
+        self.pool = endpoints or pool
+        self.tools = tools
+        self.params = params
+        self.temperature = params.get("temperature")
+        self.format = params.get("format")
+
+    def bind_tools(self, tools):
+        return RoutedLLM(self.model, self.pool, list(tools), **self.params)
+
+    def with_model(self, model):
+        return RoutedLLM(model, self.pool, self.tools, **self.params)
+
+    def with_format(self, schema):
+        """The same model with its output constrained to a JSON schema."""
+        return RoutedLLM(self.model, self.pool, self.tools, **{**self.params, "format": schema})
+
+    def fingerprint(self):
+        """What the response cache keys on; the endpoint that served a call doesn't matter."""
+        return {
+            "model": self.model,
+            "temperature": self.temperature,
+            "format": self.format,
+            "tools": [convert_to_openai_tool(t) for t in self.tools] if self.tools else None,
+        }
+
+    def _attempts(self):
+        return len(self.pool.endpoints)
+
+    def invoke(self, prompt, **kwargs):
+        tried = []
+        for attempt in range(self._attempts()):
+            try:
+                with self.pool.lease(tried) as (endpoint, outcome):
+                    tried.append(endpoint)
+                    response = endpoint.client(self.model, self.params, self.tools).invoke(prompt, **kwargs)
+                    outcome["tokens"] = _completion_tokens(response)
+                    return response
+            except ENDPOINT_ERRORS as e:
+                if attempt + 1 == self._attempts():
+                    raise
+                print(f"   ⚠️  {tried[-1].url} failed ({type(e).__name__}); retrying on another endpoint")
+
+    async def ainvoke(self, prompt, **kwargs):
+        tried = []
+        for attempt in range(self._attempts()):
+            try:
+                async with self.pool.alease(tried) as (endpoint, outcome):
+                    tried.append(endpoint)
+                    response = await endpoint.client(self.model, self.params, self.tools).ainvoke(prompt, **kwargs)
+                    outcome["tokens"] = _completion_tokens(response)
+                    return response
+            except ENDPOINT_ERRORS as e:
+                if attempt + 1 == self._attempts():
+                    raise
+                print(f"   ⚠️  {tried[-1].url} failed ({type(e).__name__}); retrying on another endpoint")
+
+    async def astream(self, prompt, **kwargs):
+        tried = []
+        for attempt in range(self._attempts()):
+            started = False
+            try:
+                async with self.pool.alease(tried) as (endpoint, outcome):
+                    tried.append(endpoint)
+                    client = endpoint.client(self.model, self.params, self.tools)
+                    async for chunk in client.astream(prompt, **kwargs):
+                        started = True
+                        outcome["tokens"] += _completion_tokens(chunk)
+                        yield chunk
+                return
+            except ENDPOINT_ERRORS as e:
+                # Once chunks have been yielded the stream can't be replayed elsewhere
+                if started or attempt + 1 == self._attempts():
+                    raise
+                print(f"   ⚠️  {tried[-1].url} failed ({type(e).__name__}); retrying on another endpoint")
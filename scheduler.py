@@ -0,0 +1,278 @@
+import heapq
+import asyncio
+import time
+
+import tracing
+
+
+def task_dependencies(task):
+    """The ids a task waits on, as a list."""
+    deps = task.get("depends_on") or []
+    if isinstance(deps, str):
+        deps = [deps]
+    return [d for d in deps if d != task["id"]]
+
+
+def dependency_graph(tasks):
+    """
+    Maps each task id to the ids it waits on.
+    Dependencies on ids outside this batch (e.g. finished in an earlier iteration) are dropped.
+    """
+    ids = {t["id"] for t in tasks}
+    return {t["id"]: [d for d in task_dependencies(t) if d in ids] for t in tasks}
+
+
+def critical_path_priority(graph):
+    """
+    Length of the longest chain of tasks that waits on each task, itself included.
+    Tasks with a higher value sit on the critical path and are dispatched first.
+    """
+    dependents = {tid: [] for tid in graph}
+    for tid, deps in graph.items():
+        for dep in deps:
+            dependents[dep].append(tid)
+
+    priority = {}
+
+    def chain(tid, visiting):
+        if tid in priority:
+            return priority[tid]
+        if tid in visiting:  # Part of a cycle; it gets broken at dispatch time
+            return 0
+        visiting.add(tid)
+        priority[tid] = 1 + max((chain(c, visiting) for c in dependents[tid]), default=0)
+        visiting.discard(tid)
+        return priority[tid]
+
+    for tid in graph:
+        chain(tid, set())
+    return priority
+
+
+async def run_schedule(tasks, run_task, max_workers=4, coalescer=None):
+    """
+    Awaits run_task(task) for every task, starting each one as soon as all of its
+    depends_on tasks have finished rather than in fixed supersteps.
+
+    `tasks` may be a list or an async iterator (e.g. a plan still being streamed);
+    tasks are scheduled as they arrive, and a dependency on an id that has not
+    arrived yet waits until the stream ends. A dependency cycle is broken by
+    starting its earliest task in planner order.
+
+    With a `coalescer`, tasks that share a resource (e.g. a target file) never run
+    at the same time, and ready tasks it allows to be grouped are merged into one
+    run_task call.
+
+    Returns (results, stats) where results follow the order tasks finished in and
+    stats compares the schedule makespan with running every task serially.
+    """
+    stream = tasks.__aiter__() if hasattr(tasks, "__aiter__") else None
+    by_id = {}
+    order = {}  # id -> arrival index
+    unmet = {}  # id -> dependencies not finished yet
+    dependents = {}  # id -> ids waiting on it
+    missing = {}  # id not arrived yet -> ids waiting on it
+    priority = {}  # id -> critical path length, only ever raised as tasks arrive
+    started = set()
+    done = set()
+    durations = {}
+    results = []
+    start = time.perf_counter()
+
+    ready = []  # heap of (-priority, arrival index, id); stale entries are skipped
+    ready_by_resource = {}  # resource -> ready ids that use it
+    held = set()  # ready ids waiting for a busy resource
+    busy = set()
+    next_unstarted = 0
+    arrival = []
+
+    ready_at = {}
+    queue_wait = {}
+    max_width = 0
+    batches = 0
+
+    def resources(tid):
+        return coalescer.resources(by_id[tid]) if coalescer else frozenset()
+
+    def push_ready(tid):
+        ready_at.setdefault(tid, time.perf_counter())
+        heapq.heappush(ready, (-priority[tid], order[tid], tid))
+        for resource in resources(tid):
+            ready_by_resource.setdefault(resource, set()).add(tid)
+
+    def raise_priority(tid, value):
+        # Walk up the dependencies, raising each one's chain length; stops where nothing changes
+        stack = [(tid, value)]
+        while stack:
+            tid, value = stack.pop()
+            if priority.get(tid, 0) >= value or value > len(by_id):
+                continue
+            priority[tid] = value
+            if tid not in started and not unmet[tid]:
+                push_ready(tid)  # Re-queue at its new priority
+            stack.extend((dep, value + 1) for dep in task_dependencies(by_id[tid]) if dep in by_id)
+
+    def arrive(task):
+        task.setdefault("id", f"task_{len(arrival) + 1}")
+        if task["id"] in by_id:
+            task["id"] = f"{task['id']}_{len(arrival) + 1}"
+        tid = task["id"]
+        by_id[tid] = task
+        order[tid] = len(arrival)
+        arrival.append(tid)
+        dependents.setdefault(tid, [])
+
+        unmet[tid] = 0
+        for dep in task_dependencies(task):
+            if dep in done:
+                continue
+            unmet[tid] += 1
+            if dep in by_id:
+                dependents[dep].append(tid)
+            else:
+                missing.setdefault(dep, []).append(tid)
+
+        waiting = missing.pop(tid, [])
+        dependents[tid].extend(waiting)
+        priority[tid] = 0
+        raise_priority(tid, 1 + max((priority[w] for w in waiting), default=0))
+
+    def finish(tid):
+        done.add(tid)
+        for waiting in dependents.get(tid, ()):
+            unmet[waiting] -= 1
+            if not unmet[waiting] and waiting not in started:
+                push_ready(waiting)
+
+    def end_of_stream():
+        # Dependencies on ids that never arrived are dropped
+        for dep, waiting in missing.items():
+            for tid in waiting:
+                unmet[tid] -= 1
+                if not unmet[tid] and tid not in started:
+                    push_ready(tid)
+        missing.clear()
+
+    def receive(future):
+        """Handles one arrival from the stream; returns the future for the next, or None once it is over."""
+        task = future.result()
+        if task is None:
+            end_of_stream()
+            return None
+        arrive(task)  # Queues it straight away if nothing it needs is outstanding
+        return asyncio.ensure_future(anext(stream, None))
+
+    def take_group():
+        """Pops the highest-priority startable task plus any ready tasks the coalescer groups with it."""
+        while ready:
+            neg, _, tid = heapq.heappop(ready)
+            if tid in started or -neg != priority[tid] or tid in held:
+                continue
+            uses = resources(tid)
+            if uses & busy:
+                held.add(tid)
+                continue
+
+            group = [tid]
+            if coalescer:
+                candidates = set().union(*(ready_by_resource.get(r, ()) for r in uses)) - {tid}
+                for other in sorted(candidates, key=order.get):
+                    if other in started or other in held or resources(other) & busy:
+                        continue
+                    if coalescer.can_join([by_id[g] for g in group], by_id[other]):
+                        group.append(other)
+            return group
+        return None
+
+    def launch(group):
+        nonlocal batches
+        uses = frozenset().union(*(resources(g) for g in group))
+        busy.update(uses)
+        for tid in group:
+            started.add(tid)
+            for resource in resources(tid):
+                ready_by_resource.get(resource, set()).discard(tid)
+        batches += 1
+        return asyncio.create_task(timed(group, uses))
+
+    async def timed(group, uses):
+        t0 = time.perf_counter()
+        for tid in group:
+            queue_wait[tid] = t0 - ready_at.get(tid, t0)
+        task = by_id[group[0]] if len(group) == 1 else coalescer.merge([by_id[g] for g in group])
+        with tracing.lane(f"{tracing.current_lane()}/{task['id']}"), \
+                tracing.span(f"task {task['id']}", "task", queue_wait=round(queue_wait[group[0]], 4)):
+            result = await run_task(task)
+        return group, uses, result, time.perf_counter() - t0
+
+    if stream is None:
+        # A list arrives whole, so the first tasks on a file are already there to be coalesced
+        for task in tasks:
+            arrive(task)
+        end_of_stream()
+        next_task = None
+    else:
+        next_task = asyncio.ensure_future(anext(stream, None))
+    running = set()
+    try:
+        while next_task or running or len(started) < len(by_id):
+            # Take every arrival that is already available before launching, so it can join a group
+            while next_task:
+                await asyncio.sleep(0)
+                if not next_task.done():
+                    break
+                next_task = receive(next_task)
+
+            while len(running) < max_workers:
+                group = take_group()
+                if group is None:
+                    break
+                running.add(launch(group))
+
+            if not running and not next_task and len(started) < len(by_id) and not held:
+                while arrival[next_unstarted] in started:
+                    next_unstarted += 1
+                stuck = [t for t in arrival[next_unstarted:] if t not in started]
+                print(f"   ⚠️  Dependency cycle between tasks: {', '.join(stuck)}. Starting {stuck[0]} first.")
+                ready_at.setdefault(stuck[0], time.perf_counter())
+                running.add(launch([stuck[0]]))
+
+            max_width = max(max_width, len(running))
+            tracing.counter("running tasks", tasks=len(running))
+
+            finished, _ = await asyncio.wait(
+                running | ({next_task} if next_task else set()),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for future in finished:
+                if future is next_task:
+                    next_task = receive(future)
+                    continue
+
+                running.discard(future)
+                group, uses, result, elapsed = future.result()
+                busy.difference_update(uses)
+                for tid in held:
+                    push_ready(tid)
+                held.clear()
+                durations[group[0]] = elapsed
+                for tid in group:
+                    finish(tid)
+                results.append(result)
+    finally:
+        for future in running | ({next_task} if next_task else set()):
+            future.cancel()
+
+    makespan = time.perf_counter() - start
+    serial = sum(durations.values())
+    stats = {
+        "tasks": len(by_id),
+        "batches": batches,
+        "critical_path": max(critical_path_priority(dependency_graph(list(by_id.values()))).values(), default=0),
+        "makespan": makespan,
+        "serial": serial,
+        "speedup": serial / makespan if makespan else 1.0,
+        "max_width": max_width,
+        "queue_wait": sum(queue_wait.values()),
+    }
+    return results, stats
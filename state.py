@@ -1,33 +1,87 @@
-from typing import TypedDict, List, Optional, Annotated
-from langgraph.graph import StateGraph, END
-import operator
+from typing import TypedDict, List, Dict, Optional, Annotated, NotRequired
+import time
+import uuid
+
+from tasktable import completed_records
 
 class Task(TypedDict):
     id: str
     description: str
     assigned_agent: str
     status: str
+    # Ids of tasks that must finish before this one starts
+    depends_on: NotRequired[List[str]]
+    # Filled in by the worker that completed the task
+    tool_seconds: NotRequired[float]
+    first_write_at: NotRequired[Optional[float]]
+    context_tokens_saved: NotRequired[int]
+    files: NotRequired[Dict[str, str]]  # Relative path -> content hash of each file the task wrote
+    batched_with: NotRequired[List[str]]  # Ids of tasks coalesced into the same worker call
+
+def merge_status(existing: Dict[str, str], new: Dict[str, str]) -> Dict[str, str]:
+    """Reducer for completed_tasks: upserts task statuses by id."""
+    return {**(existing or {}), **(new or {})}
 
 class AgentState(TypedDict):
     """Main state for the entire workflow"""
+    run_id: str  # Checkpoint thread id of the run; its task records are stored under it
     project_root: str
     requirements: str
     architecture: Optional[str]
     
+    plan: Optional[List[Task]]  # The tasks as planned, stored for reuse by similar runs
+    reused_plan: Optional[dict]  # Past run whose design and plan this run reuses: run_id, score, tasks
     task_queue: List[Task]
     current_task: Optional[Task]
-    # Use Annotated with operator.add to allow parallel workers to write concurrently
-    completed_tasks: Annotated[List[Task], operator.add]
+    # Task id -> status, upserted by id; the full records are in tasktable.task_store
+    completed_tasks: Annotated[Dict[str, str], merge_status]
 
+    preflight_results: Optional[List[dict]]  # Per-file syntax check results
     test_logs: Optional[str]
     test_status: str
     iteration_count: int
     final_report: Optional[str]  # Synthesized results from all workers
+    schedule_stats: Optional[dict]  # Makespan of the last dispatch vs serial execution
+    speculation_stats: Optional[dict]  # Time to green of the last speculative debugging round
+    manifest: Optional[dict]  # Relative path -> {"hash", "task"} for every file in the project
+    last_test: Optional[dict]  # Digest of the project the tester last ran on, and its result
+    started_at: float  # Wall-clock time the run started
 
 
 class WorkerState(TypedDict):
     """State for individual worker execution - receives single task"""
     task: Task
     project_root: str
-    # Workers write back to this key which merges with main state
-    completed_tasks: Annotated[List[Task], operator.add]
\ No newline at end of file
+    architecture: Optional[str]
+
+def initial_state(requirements: str, project_root: str, run_id: Optional[str] = None) -> AgentState:
+    """Fresh workflow state for building one project; pass the checkpoint thread id as run_id"""
+    return {
+        "run_id": run_id or uuid.uuid4().hex[:12],
+        "requirements": requirements,
+        "project_root": project_root,
+        "architecture": None,
+        "plan": None,
+        "reused_plan": None,
+        "task_queue": [],
+        "completed_tasks": {},
+        "current_task": None,
+        "preflight_results": None,
+        "test_logs": None,
+        "test_status": "pending",
+        "iteration_count": 0,
+        "final_report": None,
+        "schedule_stats": None,
+        "speculation_stats": None,
+        "manifest": None,
+        "last_test": None,
+        "started_at": time.time()
+    }
+
+
+def time_to_first_file(state) -> Optional[float]:
+    """Seconds from the start of the run until a worker first wrote a file"""
+    writes = [t.first_write_at for t in completed_records(state) if t.first_write_at]
+    if not writes or not state.get("started_at"):
+        return None
+    return min(writes) - state["started_at"]
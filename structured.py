@@ -0,0 +1,214 @@
+import json
+import threading
+
+import config
+import tracing
+from prompts import repair_prompt
+
+AGENTS = ("backend", "frontend")
+
+# JSON schemas passed to Ollama as `format`, so the model can only emit matching JSON
+TASK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "string"},
+        "description": {"type": "string", "minLength": 1},
+        "assigned_agent": {"type": "string", "enum": list(AGENTS)},
+        "status": {"type": "string"},
+        "depends_on": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["id", "description", "assigned_agent", "depends_on"],
+}
+FIX_SCHEMA = {
+    "type": "object",
+    "properties": {k: v for k, v in TASK_SCHEMA["properties"].items() if k != "depends_on"},
+    "required": ["id", "description", "assigned_agent"],
+}
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {"tasks": {"type": "array", "items": TASK_SCHEMA}},
+    "required": ["tasks"],
+}
+CANDIDATES_SCHEMA = {
+    "type": "object",
+    "properties": {"candidates": {"type": "array", "items": FIX_SCHEMA}},
+    "required": ["candidates"],
+}
+
+
+def repair_json(text):
+    """
+    Parses the first JSON value in `text`, tolerating code fences and surrounding prose,
+    trailing commas, raw newlines inside strings, mismatched closers, and output cut off
+    mid-list (the unfinished item is dropped and the open containers are closed).
+
+    Returns (value, repaired, tail): whether anything had to be fixed, and for a truncated
+    answer the text of its unfinished element (None if the answer was complete).
+    Raises ValueError if no JSON value can be recovered.
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise ValueError("no JSON object or array in the response")
+    text = text[min(starts):]
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text)
+        return value, False, None
+    except ValueError:
+        pass
+
+    out, stack = [], []
+    safe = None  # (output length, open closers, input offset) after the last object completed in an array
+    in_string = escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                out.append("\\n")
+                continue
+            out.append(ch)
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            closer = stack.pop()
+            out.append(closer)
+            if not stack:
+                return json.loads("".join(out)), True, None
+            # Only whole list items are kept from a cut-off answer, never a half-written one
+            if closer == "}" and stack[-1] == "]":
+                safe = (len(out), tuple(stack), i + 1)
+            continue
+        out.append(ch)
+
+    if safe is None:
+        raise ValueError("response was cut off before its first complete item")
+    length, closers, offset = safe
+    value = json.loads("".join(out[:length]) + "".join(reversed(closers)))
+    return value, True, text[offset:].lstrip(", \n\t")
+
+
+def check_task(task):
+    """Why a planned task can't be used, or None if it can."""
+    if not isinstance(task, dict):
+        return "not an object"
+    if not isinstance(task.get("description"), str) or not task["description"].strip():
+        return "missing description"
+    if task.get("assigned_agent") not in AGENTS:
+        return f"assigned_agent must be one of {', '.join(AGENTS)}"
+    if not isinstance(task.get("depends_on", []), list):
+        return "depends_on must be a list of task ids"
+    return None
+
+
+class ParsedItems:
+    """The usable items of a JSON answer, and the parts that still need a re-ask."""
+
+    def __init__(self, items=None, broken=None, repaired=False, error=None):
+        self.items = items or []
+        self.broken = broken or []  # (problem, fragment)
+        self.repaired = repaired
+        self.error = error  # Set when nothing could be parsed at all
+
+    @property
+    def problem(self):
+        return self.error or (self.broken[0][0] if self.broken else None)
+
+
+def parse_items(text, key, check=check_task):
+    """Items under `key` (or a bare list, or a single item) in a possibly malformed answer."""
+    try:
+        value, repaired, tail = repair_json(text or "")
+    except ValueError as e:
+        return ParsedItems(broken=[(str(e), (text or "").strip()[-2000:])], error=str(e))
+
+    if isinstance(value, dict):
+        value = value.get(key, [value])
+    if not isinstance(value, list):
+        value = [value]
+
+    result = ParsedItems(repaired=repaired)
+    for item in value:
+        problem = check(item)
+        if problem:
+            result.broken.append((problem, json.dumps(item)))
+        else:
+            result.items.append(item)
+    if tail is not None:
+        result.broken.append(("the answer was cut off after the items above", tail[:2000] or "(nothing)"))
+    return result
+
+
+async def reask(model, key, parsed, accepted_ids):
+    """Asks the model again for only the broken parts of an answer, and parses its reply."""
+    problems = "\n".join(f"  - {problem}:\n    {fragment}" for problem, fragment in parsed.broken)
+    msg = repair_prompt.format(
+        key=key,
+        problems=problems,
+        accepted=", ".join(accepted_ids) or "(none)",
+        agents=", ".join(AGENTS),
+    )
+    response = await model.ainvoke(msg)
+    return parse_items(response.content, key)
+
+
+async def repair(node, model, key, parsed, accepted_ids=(), attempts=config.REPAIR_REASKS):
+    """
+    Re-asks up to `attempts` times for whatever is still broken in a parsed answer, then
+    records how the answer fared in parse_stats. Returns the items the re-asks recovered.
+    """
+    recovered, pending = [], parsed
+    for _ in range(attempts):
+        if not pending.broken:
+            break
+        print(f"   -> Re-asking {node} for {len(pending.broken)} unusable part(s) of its answer")
+        accepted = [*accepted_ids, *(item.get("id", "") for item in recovered)]
+        pending = await reask(model, key, pending, accepted)
+        recovered += pending.items
+    parse_stats.record(node, parsed, reasked=pending is not parsed, recovered=len(recovered))
+    return recovered
+
+
+class ParseStats:
+    """Per-node counts of how structured answers parsed: cleanly, after repair, after a re-ask, or not at all."""
+
+    FIELDS = ("answers", "clean", "repaired", "reasked", "recovered", "failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def record(self, node, parsed, reasked=False, recovered=0):
+        with self._lock:
+            counts = self.counts.setdefault(node, dict.fromkeys(self.FIELDS, 0))
+            counts["answers"] += 1
+            if parsed.repaired:
+                counts["repaired"] += 1
+            elif not parsed.broken and not parsed.error:
+                counts["clean"] += 1
+            counts["reasked"] += int(reasked)
+            counts["recovered"] += int(recovered > 0)
+            counts["failed"] += int(not parsed.items and not recovered)
+        tracing.counter(f"structured_output/{node}", **counts)
+
+    def summary(self):
+        """One line per node, e.g. 'planner: 3 answers, 1 repaired, 1 re-asked (1 recovered), 0 failed'."""
+        with self._lock:
+            return [
+                f"{node}: {c['answers']} answers, {c['repaired']} repaired, "
+                f"{c['reasked']} re-asked ({c['recovered']} recovered), {c['failed']} failed"
+                for node, c in self.counts.items()
+            ]
+
+
+parse_stats = ParseStats()
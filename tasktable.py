@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+import config
+
+# Task fields stored as JSON in the table; the rest are plain columns
+_JSON_FIELDS = ("depends_on", "files", "batched_with")
+
+
+class TaskRecord:
+    """One task and what the worker that completed it did. Slots keep 10k of these small."""
+
+    __slots__ = (
+        "id", "description", "assigned_agent", "status", "depends_on",
+        "tool_seconds", "first_write_at", "context_tokens_saved", "files", "batched_with",
+    )
+
+    def __init__(self, id, description="", assigned_agent=None, status="pending", depends_on=None,
+                 tool_seconds=None, first_write_at=None, context_tokens_saved=0, files=None, batched_with=None):
+        self.id = id
+        self.description = description
+        self.assigned_agent = assigned_agent
+        self.status = status
+        self.depends_on = depends_on or []
+        self.tool_seconds = tool_seconds
+        self.first_write_at = first_write_at
+        self.context_tokens_saved = context_tokens_saved or 0
+        self.files = files or {}
+        self.batched_with = batched_with or []
+
+    @classmethod
+    def from_task(cls, task):
+        """Record for a Task dict; keys that aren't task fields (e.g. a merged task's 'batch') are dropped."""
+        return cls(**{k: v for k, v in task.items() if k in cls.__slots__})
+
+    def as_task(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class TaskStore:
+    """
+    Completed task records of every run, keyed by run id (the checkpoint thread id) and
+    task id. Graph state carries only {task id: status}; the records live here, in memory
+    and in SQLite, so a resumed run still finds them. Runs are pruned with their checkpoints, and
+    runs that never had one after DYNAMICFLOW_TASK_RETENTION_DAYS.
+    """
+
+    def __init__(self, path=config.TASK_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._tables = {}  # run id -> {task id: TaskRecord}
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            # Records are written every superstep; WAL commits don't wait on a full fsync each time
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "run_id TEXT NOT NULL, id TEXT NOT NULL, description TEXT, assigned_agent TEXT, "
+                "status TEXT, depends_on TEXT, tool_seconds REAL, first_write_at REAL, "
+                "context_tokens_saved INTEGER, files TEXT, batched_with TEXT, updated_at REAL, "
+                "PRIMARY KEY (run_id, id))"
+            )
+        return self._conn
+
+    def _table(self, run_id):
+        table = self._tables.get(run_id)
+        if table is None:
+            table = {}
+            rows = self._db().execute(
+                f"SELECT {', '.join(TaskRecord.__slots__)} FROM tasks WHERE run_id = ?", (run_id,)
+            )
+            for row in rows:
+                values = dict(zip(TaskRecord.__slots__, row))
+                for field in _JSON_FIELDS:
+                    values[field] = json.loads(values[field]) if values[field] else None
+                table[values["id"]] = TaskRecord(**values)
+            self._tables[run_id] = table
+        return table
+
+    def put(self, run_id, records):
+        """Upserts records and returns the {id: status} delta to merge into graph state."""
+        with self._lock:
+            table = self._table(run_id)
+            now = time.time()
+            rows = []
+            for record in records:
+                table[record.id] = record
+                rows.append((run_id, *(
+                    json.dumps(getattr(record, f)) if f in _JSON_FIELDS else getattr(record, f)
+                    for f in TaskRecord.__slots__
+                ), now))
+            db = self._db()
+            db.executemany(
+                f"INSERT OR REPLACE INTO tasks (run_id, {', '.join(TaskRecord.__slots__)}, updated_at) "
+                f"VALUES ({', '.join('?' * (len(TaskRecord.__slots__) + 2))})",
+                rows,
+            )
+            db.commit()
+        return {record.id: record.status for record in records}
+
+    def get(self, run_id, task_id):
+        with self._lock:
+            return self._table(run_id).get(task_id)
+
+    def records(self, run_id, ids):
+        """Records for the given ids, in their order; ids without a record are skipped."""
+        with self._lock:
+            table = self._table(run_id)
+            return [table[i] for i in ids if i in table]
+
+    def prune(self, keep, dropped=(), max_age=config.TASK_RETENTION_DAYS * 86400):
+        """
+        Deletes the records of the `dropped` runs, and of runs not in `keep` that nothing
+        has written to for `max_age` seconds (batch runs have no checkpoint to keep them by).
+        Returns the number of records deleted.
+        """
+        with self._lock:
+            db = self._db()
+            db.execute("CREATE TEMP TABLE IF NOT EXISTS keep_runs (run_id TEXT PRIMARY KEY)")
+            db.execute("CREATE TEMP TABLE IF NOT EXISTS dropped_runs (run_id TEXT PRIMARY KEY)")
+            db.execute("DELETE FROM keep_runs")
+            db.execute("DELETE FROM dropped_runs")
+            db.executemany("INSERT OR IGNORE INTO keep_runs VALUES (?)", [(run_id,) for run_id in keep])
+            db.executemany("INSERT OR IGNORE INTO dropped_runs VALUES (?)", [(run_id,) for run_id in dropped])
+            deleted = db.execute(
+                """
+                DELETE FROM tasks WHERE run_id IN (SELECT run_id FROM dropped_runs) OR run_id IN (
+                    SELECT run_id FROM tasks WHERE run_id NOT IN (SELECT run_id FROM keep_runs)
+                    GROUP BY run_id HAVING MAX(updated_at) < ?
+                )
+                """,
+                (time.time() - max_age,),
+            ).rowcount
+            db.commit()
+            remaining = {row[0] for row in db.execute("SELECT DISTINCT run_id FROM tasks")}
+            for run_id in [r for r in self._tables if r not in remaining]:
+                del self._tables[run_id]
+            return deleted
+
+
+task_store = TaskStore()
+
+
+def run_key(state):
+    """The id a run's task records are stored under: its run (checkpoint thread) id."""
+    return state["run_id"]
+
+
+def completed_records(state):
+    """The records of the tasks a graph state lists as completed."""
+    return task_store.records(run_key(state), state.get("completed_tasks") or {})
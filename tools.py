@@ -1,7 +1,39 @@
-from langchain_ollama import ChatOllama
+from routing import RoutedLLM
 import os
-import subprocess
 from langchain_core.tools import tool
+from cache import CachedLLM
+from patching import apply_patch
+from indexer import project_tree
+from filecache import file_cache
+from processes import process_manager
+from codeindex import code_index, snippet
+from typing import Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+import tracing
+import config
+
+# The project the running agent works on; write_file and edit_file refuse paths outside it
+_write_root = ContextVar("write_root", default=None)
+
+
+@contextmanager
+def writes_confined_to(project_root):
+    """Makes write_file and edit_file calls in the enclosed block refuse files outside project_root."""
+    token = _write_root.set(os.path.abspath(project_root))
+    try:
+        yield
+    finally:
+        _write_root.reset(token)
+
+
+def _outside_project(abs_path):
+    """Error message for a write outside the running agent's project, or None."""
+    root = _write_root.get()
+    if root and os.path.commonpath([abs_path, root]) != root:
+        return f"Error: this task may only write inside {root}/."
+    return None
+
 
 @tool
 def write_file(file_path: str, content: str):
@@ -15,12 +47,19 @@ def write_file(file_path: str, content: str):
 
     if not abs_path.startswith(root):
         return "Error: write_file is restricted to the ./builds/ directory."
+    outside = _outside_project(abs_path)
+    if outside:
+        return outside
 
     try:
         os.makedirs(os.path.dirname(abs_path), exist_ok=True)
 
-        with open(abs_path, "w", encoding="utf-8") as f:
+        # Replace rather than overwrite, so hard-linked workspace clones never share the write
+        tmp_path = f"{abs_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             f.write(content)
+        os.replace(tmp_path, abs_path)
+        code_index.update(abs_path)
 
         return f"Successfully wrote {len(content)} bytes to {abs_path}"
 
@@ -29,11 +68,93 @@ def write_file(file_path: str, content: str):
 
 
 @tool
-def read_file(file_path: str):
-    """Reads a file. Args: file_path"""
+def edit_file(file_path: str, patch: str):
+    """
+    Edits an existing file inside ./builds/ without rewriting all of it.
+    The patch is either a unified diff or one or more blocks of the form:
+    <<<<<<< SEARCH
+    lines to find
+    =======
+    lines to put in their place
+    >>>>>>> REPLACE
+    The edit is all-or-nothing: if any block can't be matched, the file is left unchanged.
+    """
+
+    root = os.path.abspath("builds")
+    abs_path = os.path.abspath(file_path)
+
+    if not abs_path.startswith(root):
+        return "Error: edit_file is restricted to the ./builds/ directory."
+    outside = _outside_project(abs_path)
+    if outside:
+        return outside
+
+    try:
+        # newline="" both ways, so a CRLF file is patched and written back as CRLF
+        with open(abs_path, "r", encoding="utf-8", newline="") as f:
+            original = f.read()
+
+        updated, applied, rejected = apply_patch(original, patch)
+        if not applied and not rejected:
+            return "Error: no SEARCH/REPLACE blocks or diff hunks found in patch."
+        if rejected:
+            details = "\n".join(f"  hunk {n}: could not find '{line[:80]}'" for n, line in rejected)
+            return f"Error: {len(rejected)} of {applied + len(rejected)} hunks rejected; {abs_path} left unchanged.\n{details}"
+
+        # Write to a temporary file first so readers never see a half-written file
+        tmp_path = f"{abs_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            f.write(updated)
+        os.replace(tmp_path, abs_path)
+        code_index.update(abs_path)
+
+        return f"Successfully applied {applied} hunks to {abs_path}"
+
+    except Exception as e:
+        return f"Error editing file: {e}"
+
+
+@tool
+def read_file(
+    file_path: str,
+    start_line: Optional[int] = None,
+    end_line: Optional[int] = None,
+    chunk: Optional[int] = None,
+    start_byte: Optional[int] = None,
+    end_byte: Optional[int] = None,
+):
+    """
+    Reads a file. Large files are returned one chunk at a time.
+    Args:
+        file_path: the file to read
+        start_line, end_line: optional 1-based, inclusive line range
+        chunk: optional chunk number, as named in a previous read of a large file
+        start_byte, end_byte: optional raw byte range
+    """
     try:
-        with open(file_path, "r") as f:
-            return f.read()
+        if start_byte is not None or end_byte is not None:
+            data = file_cache.read_range(file_path, start_byte or 0, end_byte)
+            return data.decode("utf-8", errors="replace")
+
+        cached = file_cache.get(file_path)
+
+        if start_line is not None or end_line is not None:
+            first = max((start_line or 1) - 1, 0)
+            last = min(end_line or len(cached.lines), len(cached.lines))
+            return "".join(cached.lines[first:last])
+
+        if chunk is None:
+            if len(cached.chunks) <= 1:
+                return cached.text
+            chunk = 1
+
+        if not 1 <= chunk <= len(cached.chunks):
+            return f"Error: chunk must be between 1 and {len(cached.chunks)}"
+        first, last, text = cached.chunk(chunk)
+        header = f"[{file_path}: chunk {chunk} of {len(cached.chunks)}, lines {first + 1}-{last} of {len(cached.lines)}"
+        if chunk < len(cached.chunks):
+            header += f"; call read_file with chunk={chunk + 1} for more"
+        return f"{header}]\n{text}"
     except Exception as e:
         return f"Error reading file: {e}"
 
@@ -42,62 +163,124 @@ def list_files(root_path: str):
     """
     Returns a simple directory tree structure as a string.
     Useful for agents to quickly inspect files and folders.
+    Dependency folders such as node_modules and venv, and anything in the
+    project's .gitignore, are listed as skipped rather than expanded.
 
     Args:
         root_path: The directory to scan (must be inside ./builds/)
     """
 
-    import os
-
     if "builds/" not in root_path:
         return "Error: Only allowed to inspect files inside 'builds/' directory."
 
     if not os.path.exists(root_path):
         return f"Error: Path does not exist -> {root_path}"
 
-    tree_output = []
+    return project_tree(root_path)
+
 
-    # walk the directory
-    for base, dirs, files in os.walk(root_path):
-        level = base.replace(root_path, "").count(os.sep)
-        indent = "  " * level
-        tree_output.append(f"{indent}{os.path.basename(base)}/")
+@tool
+def code_outline(root_path: str):
+    """
+    Lists, per source file in the project, the functions, classes and DOM ids it defines
+    (with line numbers) and the modules, scripts, stylesheets and DOM ids it imports or uses.
+    """
+    if not os.path.isdir(root_path):
+        return f"Error: Path does not exist -> {root_path}"
+    return code_index.outline(root_path) or "No source files indexed yet."
 
-        sub_indent = "  " * (level + 1)
-        for f in files:
-            tree_output.append(f"{sub_indent}{f}")
 
-    return "\n".join(tree_output)
+@tool
+def find_symbol(root_path: str, name: str):
+    """
+    Shows where a function, class or DOM id is defined in the project (the code itself,
+    with line numbers) and which files import or reference it.
+    """
+    if not os.path.isdir(root_path):
+        return f"Error: Path does not exist -> {root_path}"
+    parts = [snippet(path, sym["line"], min(sym["end"], sym["line"] + 60), root=root_path)
+             for path, sym in code_index.definitions(root_path, name)]
+    users = [os.path.relpath(p, root_path) for p in code_index.references(root_path, name)]
+    if users:
+        parts.append(f"Referenced by: {', '.join(users)}")
+    return "\n".join(parts) or f"'{name}' is not defined or referenced in {root_path}"
 
 
 @tool
 def run_shell_command(command: str, work_dir: str):
     """
-    Executes a terminal command.
+    Executes a terminal command and waits for it to finish.
+    Use start_server instead for anything that keeps running, such as a web server.
     Args:
         command: e.g., 'python main.py' or 'npm install'
         work_dir: the directory to run in (e.g., ./builds/app-1)
     """
     try:
-        result = subprocess.run(
-            command,
-            cwd=work_dir,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=20
-        )
-        if result.returncode == 0:
-            return f"SUCCESS:\n{result.stdout}"
-        else:
-            return f"FAILED:\nSTDOUT: {result.stdout}\nSTDERR: {result.stderr}"
+        code, stdout, stderr = process_manager.run(command, work_dir)
+        if code == 0:
+            return f"SUCCESS:\n{stdout}"
+        if code is None:
+            return f"FAILED: timed out after {config.SHELL_TIMEOUT:.0f}s and was killed\nSTDOUT: {stdout}\nSTDERR: {stderr}"
+        return f"FAILED:\nSTDOUT: {stdout}\nSTDERR: {stderr}"
     except Exception as e:
         return f"System Error: {e}"
 
-llm = ChatOllama(
-    model="llama3.1:8b", 
+
+@tool
+def start_server(command: str, work_dir: str, port: Optional[int] = None, ready_pattern: Optional[str] = None):
+    """
+    Starts a long-running process (e.g. 'python app.py' or 'npm start') in the background
+    and waits until it is ready: until `port` accepts connections, or until a line matching
+    the regex `ready_pattern` appears in its output. An identical server that is already
+    running with unchanged files is reused. Test it afterwards with run_shell_command (e.g. curl).
+    """
+    try:
+        process, reused, ready = process_manager.start_service(command, work_dir, port, ready_pattern)
+        stdout, stderr = process.output()
+        if ready:
+            how = "reused running server" if reused else "started"
+            return f"SUCCESS: {how} (pid {process.pid})\nSTDOUT: {stdout[-2000:]}\nSTDERR: {stderr[-2000:]}"
+        state = "exited" if not process.alive() else f"not ready after {config.SERVICE_READY_TIMEOUT:.0f}s"
+        return f"FAILED: server {state}\nSTDOUT: {stdout}\nSTDERR: {stderr}"
+    except Exception as e:
+        return f"System Error: {e}"
+
+
+@tool
+def server_logs(work_dir: str):
+    """Recent output of the servers started in work_dir with start_server."""
+    services = process_manager.service_logs(work_dir)
+    if not services:
+        return f"No servers started in {work_dir}"
+    parts = []
+    for command, process in services:
+        stdout, stderr = process.output()
+        status = "running" if process.alive() else f"exited with code {process.proc.returncode}"
+        parts.append(f"$ {command} ({status})\nSTDOUT: {stdout}\nSTDERR: {stderr}")
+    return "\n\n".join(parts)
+
+llm = RoutedLLM(
+    config.DEFAULT_MODEL,
     temperature=0,
     format="json" 
 )
 
-llm_worker = llm.bind_tools([write_file, read_file, run_shell_command])
\ No newline at end of file
+llm_worker = llm.bind_tools([
+    write_file, edit_file, read_file, list_files, code_outline, find_symbol,
+    run_shell_command, start_server, server_logs,
+])
+
+# Nodes that need the tool-bound model
+TOOL_NODES = {"backend_worker", "frontend_worker", "tester"}
+
+def llm_for(node: str, schema=None):
+    """Returns the model a graph node should call, wrapped with the response cache.
+    With a JSON schema (and DYNAMICFLOW_STRUCTURED_OUTPUT on), its output is constrained to it."""
+    base = llm_worker if node in TOOL_NODES else llm
+    model_name = config.NODE_MODELS.get(node, config.DEFAULT_MODEL)
+    if model_name != config.DEFAULT_MODEL:
+        base = base.with_model(model_name)
+    if schema is not None and config.STRUCTURED_OUTPUT:
+        base = base.with_format(schema)
+    model = CachedLLM(base, node)
+    return tracing.TracedLLM(model, node) if tracing.ENABLED else model
\ No newline at end of file
@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+import config
+
+ENABLED = config.TRACE_ENABLED
+
+# The timeline row ("thread" in the trace viewer) that spans are drawn on
+_lane = ContextVar("lane", default="main")
+_NOOP = nullcontext()
+
+
+class Tracer:
+    """Collects spans and counters as Chrome trace events, plus per-span totals."""
+
+    def __init__(self):
+        self.events = []
+        self.totals = {}
+        self.lanes = {}
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _tid(self, lane):
+        if lane not in self.lanes:
+            self.lanes[lane] = len(self.lanes) + 1
+            self.events.append({
+                "name": "thread_name", "ph": "M", "pid": 1, "tid": self.lanes[lane],
+                "args": {"name": lane},
+            })
+        return self.lanes[lane]
+
+    def _us(self, t):
+        return round((t - self.origin) * 1e6)
+
+    def add_span(self, name, cat, start, end, args):
+        with self._lock:
+            self.events.append({
+                "name": name, "cat": cat, "ph": "X", "pid": 1, "tid": self._tid(_lane.get()),
+                "ts": self._us(start), "dur": self._us(end) - self._us(start), "args": args,
+            })
+            row = self.totals.setdefault((cat, name), {
+                "count": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+            })
+            row["count"] += 1
+            row["seconds"] += end - start
+            row["prompt_tokens"] += args.get("prompt_tokens", 0)
+            row["completion_tokens"] += args.get("completion_tokens", 0)
+
+    def add_counter(self, name, **values):
+        with self._lock:
+            self.events.append({
+                "name": name, "ph": "C", "pid": 1, "ts": self._us(time.perf_counter()), "args": values,
+            })
+
+
+tracer = Tracer()
+
+
+@contextmanager
+def _span(name, cat, args):
+    start = time.perf_counter()
+    try:
+        yield args  # Callers may add results (e.g. token counts) before the span closes
+    finally:
+        tracer.add_span(name, cat, start, time.perf_counter(), args)
+
+
+def span(name, cat="node", **args):
+    """Times the enclosed block. A shared no-op when tracing is disabled."""
+    if not ENABLED:
+        return _NOOP
+    return _span(name, cat, args)
+
+
+def counter(name, **values):
+    if ENABLED:
+        tracer.add_counter(name, **values)
+
+
+def lane(name):
+    """Draws spans in the enclosed block on their own timeline row."""
+    if not ENABLED or not name:
+        return _NOOP
+    return _lane_context(name)
+
+
+@contextmanager
+def _lane_context(name):
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane():
+    return _lane.get()
+
+
+def traced_node(name):
+    """Decorator recording a span for every run of a graph node. Returns the node unchanged when disabled."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        def lane_for(state):
+            root = state.get("project_root") if isinstance(state, dict) else None
+            return os.path.basename(root.rstrip("/")) if root and current_lane() == "main" else None
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(state, *a, **kw):
+                with lane(lane_for(state)), span(name, "node"):
+                    return await fn(state, *a, **kw)
+        else:
+            @functools.wraps(fn)
+            def wrapper(state, *a, **kw):
+                with lane(lane_for(state)), span(name, "node"):
+                    return fn(state, *a, **kw)
+        return wrapper
+    return decorate
+
+
+def _token_usage(msg, args):
+    usage = getattr(msg, "usage_metadata", None) or {}
+    args["prompt_tokens"] = usage.get("input_tokens", 0)
+    args["completion_tokens"] = usage.get("output_tokens", 0)
+
+
+class TracedLLM:
+    """Wraps a (cached) chat model, recording one span per call with its token usage."""
+
+    def __init__(self, runnable, node):
+        self.runnable = runnable
+        self.node = node
+
+    def invoke(self, prompt, **kwargs):
+        with span(f"llm {self.node}", "llm") as args:
+            response = self.runnable.invoke(prompt, **kwargs)
+            _token_usage(response, args)
+            return response
+
+    async def ainvoke(self, prompt, **kwargs):
+        with span(f"llm {self.node}", "llm") as args:
+            response = await self.runnable.ainvoke(prompt, **kwargs)
+            _token_usage(response, args)
+            return response
+
+    async def astream(self, prompt, **kwargs):
+        with span(f"llm {self.node}", "llm") as args:
+            response = None
+            async for chunk in self.runnable.astream(prompt, **kwargs):
+                response = chunk if response is None else response + chunk
+                yield chunk
+            if response is not None:
+                _token_usage(response, args)
+
+
+def export(path=config.TRACE_PATH):
+    """Writes the collected events as a Chrome trace (open in chrome://tracing or Perfetto)."""
+    if not ENABLED:
+        return None
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": tracer.events, "displayTimeUnit": "ms"}, f)
+    return path
+
+
+def summary_table():
+    """Per-span totals, slowest first, as printable text."""
+    if not ENABLED or not tracer.totals:
+        return ""
+    lines = [f"{'Span':<32} {'Kind':<6} {'Calls':>5} {'Total s':>9} {'Prompt tok':>10} {'Compl tok':>10}"]
+    for (cat, name), row in sorted(tracer.totals.items(), key=lambda kv: -kv[1]["seconds"]):
+        lines.append(
+            f"{name[:32]:<32} {cat:<6} {row['count']:>5} {row['seconds']:>9.2f} "
+            f"{row['prompt_tokens']:>10} {row['completion_tokens']:>10}"
+        )
+    return "\n".join(lines)
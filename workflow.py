@@ -1,13 +1,35 @@
-import json
+import os
+import re
 from prompts import *
-from state import AgentState, WorkerState
+from state import AgentState, WorkerState, time_to_first_file
 from langgraph.graph import StateGraph, END
-from langgraph.types import Send
-from tools import llm, llm_worker, write_file, read_file, run_shell_command
-import json
+from tools import (
+    llm_for, write_file, edit_file, read_file, list_files, code_outline, find_symbol,
+    run_shell_command, start_server, server_logs, writes_confined_to,
+)
+from langchain_core.messages import HumanMessage, ToolMessage
+from scheduler import run_schedule
+from coalesce import FileCoalescer, split_batch
+from tasktable import TaskRecord, task_store, completed_records, run_key
+from workqueue import executor as queue_executor
+from jsonstream import TaskStreamParser
+from structured import PLAN_SCHEMA, CANDIDATES_SCHEMA, check_task, parse_items, repair
+from context import build_context, context_budget, estimate_tokens
+from preflight import run_preflight, format_diagnostics
+from codeindex import excerpts_for
+from plans import plan_store, rebase, reusable
+from manifest import scan, hashes_for, digest, changed
+from processes import process_manager
+from workspace import clone_workspace, promote_workspace, discard_workspace
+from tracing import traced_node
+import tracing
+import config
+import asyncio
+import time
 
 # --- 1. ARCHITECT ---
-def architect_node(state: AgentState):
+@traced_node("architect")
+async def architect_node(state: AgentState):
     print(f"DEBUG STATE KEYS: {list(state.keys())}") 
     
     print(f"\n🏗️  [Architect] Designing {state['project_root']}...")
@@ -16,36 +38,99 @@ def architect_node(state: AgentState):
         project_root=state["project_root"], 
         user_query=state["requirements"],
     )
-    response = llm.invoke(msg)
+
+    if config.PLAN_REUSE_ENABLED:
+        score, run = plan_store.most_similar(state["requirements"])
+        if reusable(score, run):
+            architecture, tasks = rebase(run, state["project_root"])
+            print(f"   -> ♻️  Reusing the design and plan of a past run ({score:.2f} similar): {run['requirements'][:60]}")
+            return {"architecture": architecture, "reused_plan": {"run_id": run["id"], "score": round(score, 3), "tasks": tasks}}
+        if run and score >= config.PLAN_OFFER_THRESHOLD:
+            print(f"   -> Offering the design of a similar past run ({score:.2f} similar) as a reference")
+            msg += architect_reference.format(requirements=run["requirements"], architecture=rebase(run, state["project_root"])[0])
+
+    response = await llm_for("architect").ainvoke(msg)
     print(response.content)
     return {"architecture": response.content}
 
 # --- 2. PLANNER ---
-def planner_node(state: AgentState):
+@traced_node("planner")
+async def planner_node(state: AgentState):
     print("\n📅 [Planner] Creating task list...")
 
     if state.get("task_queue") or state.get("completed_tasks"):
         print("   -> Skipping planning (tasks already exist or completed).")
         return {}
 
+    reused = state.get("reused_plan")
+    if reused:
+        print(f"   -> Using the {len(reused['tasks'])} tasks of past run {reused['run_id']}")
+        return {**await dispatch_tasks(state, reused["tasks"]), "plan": reused["tasks"]}
+
+    # Workers start on each task as soon as it is parsed, while the rest of the plan streams in
+    plan = []
+    result = await dispatch_tasks(state, stream_plan(state, plan))
+    return {**result, "plan": plan}
+
+@traced_node("planner")
+async def plan_only_node(state: AgentState):
+    """Planner for plan-only runs: collects the streamed plan without starting any worker."""
+    print("\n📅 [Planner] Creating task list (plan only)...")
+    reused = state.get("reused_plan")
+    if reused:
+        print(f"   -> Using the {len(reused['tasks'])} tasks of past run {reused['run_id']}")
+        return {"plan": reused["tasks"], "task_queue": reused["tasks"]}
+    plan = []
+    async for _ in stream_plan(state, plan):
+        pass
+    return {"plan": plan, "task_queue": plan}
+
+async def stream_plan(state: AgentState, plan):
+    """Yields the planner's tasks as they stream in, appending each one's plan_entry to `plan`."""
     msg = planner_prompt.format(
         project_root=state["project_root"],
         architecture=state["architecture"]
     )
-    response = llm.invoke(msg)
-    
-    try:
-        content = response.content.replace("```json", "").replace("```", "").strip()
-        tasks = json.loads(content)
-        print(tasks)
-        # Ensure it's a list
-        if isinstance(tasks, dict) and "tasks" in tasks: tasks = tasks["tasks"]
-        return {"task_queue": tasks}
-    except Exception as e:
-        print(f"Error parsing plan: {e}")
-        return {"task_queue": []}
+    model = llm_for("planner", PLAN_SCHEMA)
+    parser = TaskStreamParser()
+    content = ""
+    seen = set()
+
+    def accept(task):
+        key = task.get("id") or task["description"]
+        if key in seen:
+            return False
+        seen.add(key)
+        plan.append(plan_entry(task))
+        print(f"   -> Planned {task.get('id', len(seen))} [{task['assigned_agent']}]: {task['description'][:60]}")
+        return True
+
+    async for chunk in model.astream(msg):
+        content += chunk.content
+        for task in parser.feed(chunk.content):
+            # Tasks that don't check out are left to the repair pass below
+            if not check_task(task) and accept(task):
+                yield task
+
+    # Tasks the stream couldn't use (malformed, cut off, wrong agent) are repaired, then re-asked for
+    parsed = parse_items(content, "tasks")
+    for task in parsed.items:
+        if accept(task):
+            yield task
+    for task in await repair("planner", model, "tasks", parsed, sorted(seen)):
+        if accept(task):
+            yield task
+    if not seen:
+        raise RuntimeError(f"Planner returned no usable tasks ({parsed.problem or 'empty plan'})")
+
+def plan_entry(task):
+    """The parts of a planned task worth storing for reuse."""
+    entry = {k: task[k] for k in ("id", "description", "assigned_agent", "depends_on") if k in task}
+    entry["status"] = "pending"
+    return entry
 
 # --- 3. ORCHESTRATOR (The Decision Maker) ---
+@traced_node("orchestrator")
 def orchestrator_node(state: AgentState):
     """
     The Orchestrator node itself acts as a router. 
@@ -64,95 +149,268 @@ def orchestrator_node(state: AgentState):
     
     return {}
 
-# Helper function to execute tool calls
-def execute_tools(ai_msg):
-    """Manually executes tool calls generated by the LLM."""
-    if hasattr(ai_msg, "tool_calls") and ai_msg.tool_calls:
-        for tool_call in ai_msg.tool_calls:
-            tool_name = tool_call["name"]
-            tool_args = tool_call["args"]
-            
-            # Map tool names to actual functions
-            tools_map = {
-                "write_file": write_file,
-                "read_file": read_file,
-                "run_shell_command": run_shell_command
-            }
-            
-            selected_tool = tools_map.get(tool_name)
-            if selected_tool:
-                print(f"   🛠️  Executing Tool: {tool_name} with args: {tool_args}")
-                selected_tool.invoke(tool_args)
+# Map tool names to actual functions
+TOOLS_MAP = {
+    "write_file": write_file,
+    "edit_file": edit_file,
+    "read_file": read_file,
+    "list_files": list_files,
+    "code_outline": code_outline,
+    "find_symbol": find_symbol,
+    "run_shell_command": run_shell_command,
+    "start_server": start_server,
+    "server_logs": server_logs,
+}
+
+async def _run_tool_group(calls, limit):
+    """Runs tool calls that touch the same path one after another, timing each call."""
+    records = []
+    for tool_call in calls:
+        tool_name = tool_call["name"]
+        tool_args = tool_call["args"]
+        selected_tool = TOOLS_MAP.get(tool_name)
+
+        start = time.perf_counter()
+        if selected_tool:
+            print(f"   🛠️  Executing Tool: {tool_name} with args: {tool_args}")
+            try:
+                async with limit:
+                    kind = "shell" if tool_name == "run_shell_command" else "tool"
+                    with tracing.span(f"tool {tool_name}", kind):
+                        result = await selected_tool.ainvoke(tool_args)
+            except Exception as e:
+                result = f"Error running {tool_name}: {e}"
+        else:
+            result = f"Error: unknown tool '{tool_name}'"
+
+        records.append({
+            "id": tool_call.get("id"),
+            "name": tool_name,
+            "args": tool_args,
+            "result": str(result),
+            "seconds": time.perf_counter() - start,
+            "finished_at": time.time(),
+        })
+    return records
+
+async def execute_tools(ai_msg):
+    """
+    Executes one round of tool calls generated by the LLM.
+    Calls on different paths run concurrently; calls on the same path keep their order.
+    Returns one record per call, in the order the model issued them.
+    """
+    tool_calls = getattr(ai_msg, "tool_calls", None) or []
+    if not tool_calls:
+        return []
+
+    groups = {}
+    for i, tool_call in enumerate(tool_calls):
+        args = tool_call.get("args") or {}
+        path = args.get("file_path") or args.get("root_path") or args.get("work_dir")
+        groups.setdefault(path or f"call_{i}", []).append(tool_call)
+
+    limit = asyncio.Semaphore(config.TOOL_CONCURRENCY)
+    parent = tracing.current_lane()
+
+    async def run_group(i, calls):
+        # Concurrent groups get their own timeline rows so their spans don't overlap
+        with tracing.lane(f"{parent}/tools{i}" if len(groups) > 1 else None):
+            return await _run_tool_group(calls, limit)
+
+    batches = await asyncio.gather(*(run_group(i, calls) for i, calls in enumerate(groups.values())))
+
+    by_id = {id(call): rec for calls, recs in zip(groups.values(), batches) for call, rec in zip(calls, recs)}
+    return [by_id[id(call)] for call in tool_calls]
+
+def first_write_at(trace):
+    """Wall-clock time of the first successful write_file call, or None."""
+    writes = [r["finished_at"] for r in trace if r["name"] == "write_file" and r["result"].startswith("Successfully")]
+    return min(writes, default=None)
+
+def written_files(trace, project_root):
+    """Content hashes of the files a worker wrote or edited, keyed by path relative to project_root."""
+    root = os.path.abspath(project_root)
+    paths = {
+        os.path.relpath(os.path.abspath(r["args"]["file_path"]), root) for r in trace
+        if r["name"] in ("write_file", "edit_file") and r["result"].startswith("Successfully")
+    }
+    return hashes_for(project_root, sorted(p for p in paths if not p.startswith("..")))
+
+def _tokens_used(msg):
+    """Tokens spent on one model call, estimated from its length when the model doesn't report usage."""
+    usage = getattr(msg, "usage_metadata", None)
+    if usage and usage.get("total_tokens"):
+        return usage["total_tokens"]
+    return estimate_tokens(str(msg.content))
+
+async def run_agent(node, msg, project_root=None):
+    """
+    Calls the node's model until it stops requesting tools, feeding each tool's
+    result back as a ToolMessage. Bounded by AGENT_MAX_ROUNDS and AGENT_TOKEN_BUDGET.
+    With a project_root, the agent's file writes are confined to it.
+    Returns the final AI message and the records of every tool call made.
+    """
+    if project_root:
+        with writes_confined_to(project_root):
+            return await run_agent(node, msg)
+
+    model = llm_for(node)
+    messages = [HumanMessage(content=msg)]
+    tokens = estimate_tokens(msg)
+    trace = []
+
+    for round_no in range(1, config.AGENT_MAX_ROUNDS + 1):
+        response = await model.ainvoke(messages)
+        tokens += _tokens_used(response)
+        messages.append(response)
+
+        records = await execute_tools(response)
+        if not records:
+            break
+        trace.extend(records)
+        for rec in records:
+            print(f"   ⏱️  {rec['name']} took {rec['seconds']:.2f}s")
+            messages.append(ToolMessage(content=rec["result"], tool_call_id=rec["id"] or rec["name"]))
+            tokens += estimate_tokens(rec["result"])
+
+        if tokens >= config.AGENT_TOKEN_BUDGET:
+            print(f"   ⚠️  [{node}] Token budget reached after {round_no} rounds ({tokens} tokens).")
+            break
+    else:
+        print(f"   ⚠️  [{node}] Stopped after {config.AGENT_MAX_ROUNDS} tool rounds.")
+
+    return response, trace
 
 # --- 4. BACKEND WORKER (Parallel Execution) ---
-def backend_worker(state: WorkerState):
+@traced_node("backend_worker")
+async def backend_worker(state: WorkerState):
     """Worker that executes a single backend task in parallel"""
     task = state["task"]
     print(f"\n⚙️  [Backend Worker] Working on: {task['description'][:60]}...")
     
+    architecture, saved = build_context(state.get("architecture"), task, context_budget("backend_worker"))
     msg = backend_prompt_template.format(
         task_description=task["description"],
-        project_root=state["project_root"]
+        project_root=state["project_root"],
+        architecture=architecture or "(not available)"
     )
-    result = llm_worker.invoke(msg)
-
-    execute_tools(result)
+    result, trace = await run_agent("backend_worker", msg, state["project_root"])
     
     # Mark task as completed
     task_completed = task.copy()
     task_completed["status"] = "completed"
+    task_completed["context_tokens_saved"] = saved
+    task_completed["tool_seconds"] = round(sum(r["seconds"] for r in trace), 3)
+    task_completed["first_write_at"] = first_write_at(trace)
+    task_completed["files"] = written_files(trace, state["project_root"])
     
-    # Return to be merged with main state via operator.add
-    return {"completed_tasks": [task_completed]}
+    # The dispatcher stores the record and merges only its id and status into the graph state
+    return {"completed": task_completed}
 
 # --- 5. FRONTEND WORKER (Parallel Execution) ---
-def frontend_worker(state: WorkerState):
+@traced_node("frontend_worker")
+async def frontend_worker(state: WorkerState):
     """Worker that executes a single frontend task in parallel"""
     task = state["task"]
     print(f"\n🎨 [Frontend Worker] Working on: {task['description'][:60]}...")
     
+    architecture, saved = build_context(state.get("architecture"), task, context_budget("frontend_worker"))
     msg = frontend_prompt_template.format(
         task_description=task["description"],
-        project_root=state["project_root"]
+        project_root=state["project_root"],
+        architecture=architecture or "(not available)"
     )
-    result = llm_worker.invoke(msg)
-
-    execute_tools(result)
+    result, trace = await run_agent("frontend_worker", msg, state["project_root"])
     
     # Mark task as completed
     task_completed = task.copy()
     task_completed["status"] = "completed"
+    task_completed["context_tokens_saved"] = saved
+    task_completed["tool_seconds"] = round(sum(r["seconds"] for r in trace), 3)
+    task_completed["first_write_at"] = first_write_at(trace)
+    task_completed["files"] = written_files(trace, state["project_root"])
     
-    # Return to be merged with main state via operator.add
-    return {"completed_tasks": [task_completed]}
-
-# --- 6. TESTER ---
-def tester_node(state: AgentState):
-    print("\n🧪 [Tester] Verifying application...")
-    msg = tester_prompt_template.format(project_root=state["project_root"])
-    
+    # The dispatcher stores the record and merges only its id and status into the graph state
+    return {"completed": task_completed}
+
+# --- 6. PREFLIGHT ---
+async def preflight(project_root):
+    """Deterministic syntax checks. Returns (results, diagnostics); diagnostics is empty when all pass."""
+    results = await run_preflight(project_root)
+    return results, format_diagnostics(results, project_root)
+
+@traced_node("preflight")
+async def preflight_node(state: AgentState):
+    print("\n🔎 [Preflight] Syntax-checking generated files...")
+    results, diagnostics = await preflight(state["project_root"])
+    failed = sum(not r["ok"] for r in results)
+    rechecked = sum(not r["cached"] for r in results)
+    print(f"   -> {len(results) - failed}/{len(results)} files passed ({rechecked} changed and re-checked)")
+
+    if failed:
+        print(diagnostics)
+        return {
+            "preflight_results": results,
+            "test_logs": f"Preflight syntax checks failed:\n{diagnostics}",
+            "test_status": "failed",
+        }
+    return {"preflight_results": results, "test_status": "pending"}
 
-    response = llm_worker.invoke(msg)
+def preflight_decision(state: AgentState):
+    """Skips the LLM tester when preflight already found errors."""
+    if state.get("test_status") == "failed":
+        return test_decision(state)
+    return "tester"
 
-    execute_tools(response)
+# --- 6b. TESTER ---
+async def run_tests(project_root):
+    """Has the tester agent run the project at project_root. Returns (logs, status)."""
+    msg = tester_prompt_template.format(project_root=project_root)
+    response, trace = await run_agent("tester", msg, project_root)
 
     logs = response.content
-    
-    status = "passed"
-    if any(err in logs for err in ["Error", "Traceback", "Failed"]):
-        status = "failed"
+    failures = [
+        r["result"] for r in trace
+        if r["name"] in ("run_shell_command", "start_server") and not r["result"].startswith("SUCCESS")
+    ]
+    if failures:
+        logs += "\n\nCommand output:\n" + "\n".join(failures)
+
+    status = "failed" if failures or any(err in logs for err in ["Error", "Traceback", "Failed"]) else "passed"
+    return logs, status
+
+async def verify(project_root):
+    """Preflight, then the LLM tester only if preflight passed. Returns (logs, status)."""
+    results, diagnostics = await preflight(project_root)
+    if diagnostics:
+        return f"Preflight syntax checks failed:\n{diagnostics}", "failed"
+    return await run_tests(project_root)
+
+@traced_node("tester")
+async def tester_node(state: AgentState):
+    print("\n🧪 [Tester] Verifying application...")
+    project = digest(await asyncio.to_thread(scan, state["project_root"]))
+    last = state.get("last_test")
+    if last and last["digest"] == project:
+        print("   -> ♻️  No files changed since the last test run; reusing its result")
+        logs, status = last["logs"], last["status"]
+    else:
+        logs, status = await run_tests(state["project_root"])
+
+    if status == "failed":
         print("   -> ❌ Tests Failed")
     else:
         print("   -> ✅ Tests Passed")
 
-    return {"test_logs": logs, "test_status": status}
+    return {"test_logs": logs, "test_status": status, "last_test": {"digest": project, "logs": logs, "status": status}}
 
 # --- 7. SYNTHESIZER (Collect Results from Parallel Workers) ---
+@traced_node("synthesizer")
 def synthesizer_node(state: AgentState):
     """Synthesizes all completed tasks into a final report"""
     print("\n🔗 [Synthesizer] Compiling results from all workers...")
     
-    completed_tasks = state.get("completed_tasks", [])
+    completed_tasks = completed_records(state)
     
     if not completed_tasks:
         print("   -> No tasks completed yet.")
@@ -160,47 +418,201 @@ def synthesizer_node(state: AgentState):
     
     # Create a summary report
     report_sections = []
-    backend_tasks = [t for t in completed_tasks if t.get("assigned_agent") == "backend"]
-    frontend_tasks = [t for t in completed_tasks if t.get("assigned_agent") == "frontend"]
+    backend_tasks = [t for t in completed_tasks if t.assigned_agent == "backend"]
+    frontend_tasks = [t for t in completed_tasks if t.assigned_agent == "frontend"]
     
     report_sections.append(f"✅ Total Tasks Completed: {len(completed_tasks)}")
     report_sections.append(f"   - Backend: {len(backend_tasks)} tasks")
     report_sections.append(f"   - Frontend: {len(frontend_tasks)} tasks")
+
+    # Link every file in the project to the task that last wrote it
+    hashes = scan(state["project_root"])
+    owners = {path: t.id for t in completed_tasks for path in t.files}
+    previous = {path: entry["hash"] for path, entry in (state.get("manifest") or {}).items()}
+    manifest = {path: {"hash": h, "task": owners.get(path)} for path, h in hashes.items()}
+    report_sections.append(f"📦 Manifest: {len(manifest)} files, {len(changed(previous, hashes))} changed this round")
+
+    saved = sum(t.context_tokens_saved for t in completed_tasks)
+    if saved:
+        report_sections.append(f"✂️  Architecture context trimmed: {saved} prompt tokens saved")
+
+    first_file = time_to_first_file(state)
+    if first_file is not None:
+        report_sections.append(f"📄 Time to first file written: {first_file:.1f}s")
+
+    stats = state.get("schedule_stats")
+    if stats:
+        report_sections.append(
+            f"⏱️  Makespan: {stats['makespan']:.1f}s (serial: {stats['serial']:.1f}s, {stats['speedup']:.2f}x)"
+        )
+
+    speculation = state.get("speculation_stats")
+    if speculation and speculation.get("winner"):
+        report_sections.append(
+            f"🧬 Time to green: {speculation['time_to_green']:.1f}s with {speculation['candidates']} candidate fixes "
+            f"(serial loop est. {speculation['serial_estimate']:.1f}s)"
+        )
     report_sections.append("\nCompleted Tasks:")
     
     for i, task in enumerate(completed_tasks, 1):
-        report_sections.append(f"{i}. [{task.get('assigned_agent', 'unknown').upper()}] {task.get('description', 'No description')[:80]}...")
+        report_sections.append(f"{i}. [{(task.assigned_agent or 'unknown').upper()}] {(task.description or 'No description')[:80]}...")
     
     final_report = "\n".join(report_sections)
     print(final_report)
     
-    return {"final_report": final_report, "task_queue": []}
+    return {"final_report": final_report, "task_queue": [], "manifest": manifest}
 
 # --- 8. DEBUGGER ---
-def debugger_node(state: AgentState):
-    print("\n🐞 [Debugger] Analyzing errors and creating fix...")
-    msg = debugger_prompt.format(test_logs=state["test_logs"])
-    response = llm.invoke(msg)
-    
+def rebase_paths(text, root, clone):
+    """`text` with paths under root, as given or absolute, pointing into clone instead."""
+    paths = {os.path.abspath(root): os.path.abspath(clone), os.path.normpath(root): os.path.normpath(clone), root: clone}
+    pattern = "|".join(re.escape(p) for p in sorted(paths, key=len, reverse=True))
+    return re.sub(pattern, lambda m: paths[m.group()], text)
+
+async def try_fix(state: AgentState, fix, number):
+    """Applies one candidate fix to a hard-linked clone of the project and tests it there."""
+    root = state["project_root"].rstrip("/")
+    clone = clone_workspace(root, f"{root}.candidate-{number}")
+    description = fix["description"]
+    fix = {**fix, "description": rebase_paths(description, root, clone)}
+    # The architecture names the real project's paths too; left as is, the worker would write there
+    architecture = rebase_paths(state.get("architecture") or "", root, clone) or None
+    start = time.perf_counter()
+
     try:
-        content = response.content.replace("```json", "").replace("```", "").strip()
-        fix_task = json.loads(content)
-        print(f"   -> Created Fix Task: {fix_task['description']}")
+        with tracing.lane(f"{tracing.current_lane()}/candidate{number}"):
+            worker_state = {"task": fix, "project_root": clone, "architecture": architecture}
+            if config.WORK_QUEUE_ENABLED:
+                # A losing candidate's job is withdrawn when it is cancelled
+                completed = await queue_executor().run(worker_state)
+            else:
+                worker = WORKERS.get(fix.get("assigned_agent"), backend_worker)
+                completed = (await worker(worker_state))["completed"]
+            logs, status = await verify(clone)
+    finally:
+        # Frees its server's port for the next candidate; start_service makes them take turns
+        process_manager.stop_services(under=clone)
+
+    print(f"   -> Candidate {number}: {'✅ passed' if status == 'passed' else '❌ failed'} in {time.perf_counter() - start:.1f}s")
+    return {
+        "number": number,
+        "clone": clone,
+        "task": {**completed, "description": description},
+        "logs": logs,
+        "status": status,
+        "seconds": time.perf_counter() - start,
+    }
+
+async def speculate(state: AgentState, fixes):
+    """
+    Tries every candidate fix at once, each in its own workspace. The first to pass
+    is promoted into project_root and the others are cancelled and discarded.
+    If none pass, the top-ranked candidate is kept, as the serial loop would have done.
+    """
+    start = time.perf_counter()
+    # The warm server of the unfixed project would answer the candidates' port probes
+    process_manager.stop_services(under=state["project_root"])
+    pending = {asyncio.create_task(try_fix(state, fix, i)): i for i, fix in enumerate(fixes, 1)}
+    finished, winner = {}, None
+
+    while pending and winner is None:
+        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            pending.pop(future)
+            if future.exception():
+                print(f"   ⚠️  Candidate failed to run: {future.exception()}")
+                continue
+            result = future.result()
+            finished[result["number"]] = result
+            if result["status"] == "passed" and winner is None:
+                winner = result
+
+    for future in pending:
+        future.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    kept = winner or finished.get(min(finished, default=None))
+    for i in range(1, len(fixes) + 1):
+        clone = f"{state['project_root'].rstrip('/')}.candidate-{i}"
+        process_manager.stop_services(under=clone)
+        if kept and clone == kept["clone"]:
+            promote_workspace(clone, state["project_root"].rstrip("/"))
+        else:
+            discard_workspace(clone)
+
+    # The serial loop tries fixes in rank order; candidates still running count as at least `elapsed`
+    serial = None
+    if winner:
+        serial = sum(finished[i]["seconds"] if i in finished else elapsed for i in range(1, winner["number"] + 1))
+
+    stats = {
+        "candidates": len(fixes),
+        "winner": winner["number"] if winner else None,
+        "time_to_green": round(elapsed, 3) if winner else None,
+        "serial_estimate": round(serial, 3) if serial is not None else None,
+    }
+    return kept, stats
+
+@traced_node("debugger")
+async def debugger_node(state: AgentState):
+    print("\n🐞 [Debugger] Analyzing errors and creating fix...")
+    excerpts = await asyncio.to_thread(excerpts_for, state["project_root"], state["test_logs"])
+    if excerpts:
+        print(f"   -> Resolved {sum(l.startswith('--- ') for l in excerpts.splitlines())} code excerpts from the logs ({estimate_tokens(excerpts)} tokens)")
+    msg = debugger_prompt.format(
+        test_logs=state["test_logs"],
+        code_excerpts=excerpts or "(no locations in the logs matched a project file)",
+        candidates=config.SPECULATIVE_FIXES,
+    )
+    model = llm_for("debugger", CANDIDATES_SCHEMA)
+    response = await model.ainvoke(msg)
+
+    # Usable candidates are enough to go on; only an answer with none is re-asked for
+    parsed = parse_items(response.content, "candidates")
+    fixes = parsed.items + await repair("debugger", model, "candidates", parsed, attempts=0 if parsed.items else config.REPAIR_REASKS)
+    fixes = fixes[:config.SPECULATIVE_FIXES]
+    if not fixes:
+        print(f"   ⚠️  No usable fix in the debugger's answer ({parsed.problem or 'no candidates'})")
+        return {"iteration_count": state["iteration_count"] + 1}
+    # Unique ids, so each round's fixes are kept as separate records
+    fixes = [{**fix, "id": f"fix_{state['iteration_count'] + 1}_{i}"} for i, fix in enumerate(fixes, 1)]
 
+    if len(fixes) == 1:
+        print(f"   -> Created Fix Task: {fixes[0]['description']}")
         return {
-            "task_queue": [fix_task],
+            "task_queue": fixes,
             "iteration_count": state["iteration_count"] + 1,
             "test_status": "pending",
-            "completed_tasks": []  # Reset for re-execution
         }
-    except:
-        return {"iteration_count": state["iteration_count"] + 1}
 
-# --- 9. ASSIGN WORKERS (Send API for Parallel Distribution) ---
+    print(f"   -> Trying {len(fixes)} candidate fixes in parallel workspaces...")
+    for i, fix in enumerate(fixes, 1):
+        print(f"      {i}. {fix['description'][:80]}")
+    kept, stats = await speculate(state, fixes)
+
+    if stats["winner"]:
+        print(
+            f"   -> Promoted candidate {stats['winner']}: green in {stats['time_to_green']:.1f}s "
+            f"(serial loop est. {stats['serial_estimate']:.1f}s)"
+        )
+    elif kept:
+        print(f"   -> No candidate passed; keeping candidate {kept['number']}")
+    completed = task_store.put(run_key(state), [TaskRecord.from_task(kept["task"])]) if kept else {}
+
+    return {
+        "task_queue": [],
+        "iteration_count": state["iteration_count"] + 1,
+        "test_status": "pending",  # The tester re-checks the promoted tree
+        "completed_tasks": completed,
+        "speculation_stats": stats,
+    }
+
+# --- 9. ASSIGN WORKERS ---
 def assign_workers(state: AgentState):
     """
-    Conditional edge function that uses Send() to distribute tasks to workers in parallel.
-    Each Send() creates a worker node execution with its own WorkerState.
+    Conditional edge function: routes pending tasks to the dispatcher,
+    or straight to the synthesizer when the queue is empty.
     """
     queue = state.get("task_queue", [])
     
@@ -209,25 +621,76 @@ def assign_workers(state: AgentState):
         print("\n👮 [Orchestrator] No tasks in queue, moving to synthesis...")
         return "synthesizer"
     
-    print(f"\n👮 [Orchestrator] Distributing {len(queue)} tasks to workers in parallel...")
-    
-    # Create a Send() for each task to enable parallel execution
-    sends = []
-    for task in queue:
-        agent_type = task.get("assigned_agent", "backend")
-        
-        # Create worker state with task and project_root
+    return "dispatcher"
+
+# Worker node functions by assigned_agent
+WORKERS = {
+    "backend": backend_worker,
+    "frontend": frontend_worker,
+}
+
+async def dispatch_tasks(state: AgentState, tasks):
+    """
+    Runs tasks (a list or an async stream) on a worker pool, starting each task as
+    soon as the tasks it depends_on are done. Critical-path tasks are dispatched first,
+    and small tasks on the same file are coalesced into one worker call.
+    """
+    key = run_key(state)
+    done_before = {(t.assigned_agent, t.description): t for t in completed_records(state)}
+
+    async def run_task(task):
+        # On resume, tasks this run already finished (and stored) are not run again
+        originals = task.get("batch") or [task]
+        stored = task_store.records(key, [t.get("id") for t in originals])
+        if len(stored) == len(originals) and all(
+            r.status == "completed" and r.description == t.get("description") for r, t in zip(stored, originals)
+        ):
+            print(f"   ⏭️  Skipping {task.get('id')}: already completed in this run")
+            return [r.as_task() for r in stored]
+
+        # A task that already ran with the same instructions, and whose files are untouched, is not run again
+        previous = done_before.get((task.get("assigned_agent"), task.get("description")))
+        if previous and previous.files:
+            current = await asyncio.to_thread(hashes_for, state["project_root"], list(previous.files))
+            if current == previous.files:
+                print(f"   ♻️  Skipping {task.get('id')}: its files are unchanged since it last ran")
+                return [previous.as_task()]
+
+        worker = WORKERS.get(task.get("assigned_agent"), backend_worker)
         worker_state = {
             "task": task,
-            "project_root": state["project_root"]
+            "project_root": state["project_root"],
+            "architecture": state.get("architecture")
         }
-        
-        if agent_type == "frontend":
-            sends.append(Send("frontend_worker", worker_state))
+        if config.WORK_QUEUE_ENABLED:
+            # Run by a worker process; the scheduler still decides what is ready and how much runs at once
+            completed = await queue_executor().run(worker_state)
         else:
-            sends.append(Send("backend_worker", worker_state))
-    
-    return sends
+            completed = (await worker(worker_state))["completed"]
+        # Stored as soon as it finishes, so an interrupted run resumes without redoing it
+        task_store.put(key, [TaskRecord.from_task(r) for r in split_batch(completed)])
+        return [completed]
+
+    coalescer = FileCoalescer() if config.COALESCE_ENABLED else None
+    results, stats = await run_schedule(tasks, run_task, max_workers=config.MAX_WORKERS, coalescer=coalescer)
+    print(
+        f"   -> Makespan {stats['makespan']:.1f}s vs {stats['serial']:.1f}s serial "
+        f"({stats['speedup']:.2f}x, critical path {stats['critical_path']} tasks, "
+        f"up to {stats['max_width']} at once, {stats['queue_wait']:.1f}s queued, "
+        f"{stats['tasks']} tasks in {stats['batches']} worker calls)"
+    )
+
+    # Merged tasks are reported under their original ids
+    completed = {r["id"]: r.get("status", "pending") for batch in results for task in batch for r in split_batch(task)}
+    return {"task_queue": [], "completed_tasks": completed, "schedule_stats": stats}
+
+# --- 9b. DISPATCHER (Dependency-aware parallel execution) ---
+@traced_node("dispatcher")
+async def dispatcher_node(state: AgentState):
+    """Runs the queued tasks, e.g. the Debugger's fix task."""
+    queue = state.get("task_queue", [])
+    print(f"\n👮 [Orchestrator] Scheduling {len(queue)} tasks across {config.MAX_WORKERS} workers...")
+    return await dispatch_tasks(state, queue)
 
 # --- 10. TEST DECISION ---
 def test_decision(state: AgentState):
@@ -254,52 +717,81 @@ def test_decision(state: AgentState):
 # BUILD WORKFLOW GRAPH WITH PARALLEL WORKERS
 # =============================================================================
 
-workflow = StateGraph(AgentState)
-
-# Add Nodes
-workflow.add_node("architect", architect_node)
-workflow.add_node("planner", planner_node)
-workflow.add_node("orchestrator", orchestrator_node)
-
-# Parallel workers (use WorkerState)
-workflow.add_node("backend_worker", backend_worker)
-workflow.add_node("frontend_worker", frontend_worker)
-
-# Synthesis and testing
-workflow.add_node("synthesizer", synthesizer_node)
-workflow.add_node("tester", tester_node)
-workflow.add_node("debugger", debugger_node)
-
-# Entry point
-workflow.set_entry_point("architect")
-
-# Planning phase (sequential)
-workflow.add_edge("architect", "planner")
-workflow.add_edge("planner", "orchestrator")
+def build_graph(plan_only=False):
+    """The workflow graph; plan_only stops after the architect and planner."""
+    workflow = StateGraph(AgentState)
+
+    if plan_only:
+        workflow.add_node("architect", architect_node)
+        workflow.add_node("planner", plan_only_node)
+        workflow.set_entry_point("architect")
+        workflow.add_edge("architect", "planner")
+        workflow.add_edge("planner", END)
+        return workflow
+
+    # Add Nodes
+    workflow.add_node("architect", architect_node)
+    workflow.add_node("planner", planner_node)
+    workflow.add_node("orchestrator", orchestrator_node)
+
+    # Parallel workers (run by the dispatcher's scheduler)
+    workflow.add_node("dispatcher", dispatcher_node)
+
+    # Synthesis and testing
+    workflow.add_node("synthesizer", synthesizer_node)
+    workflow.add_node("preflight", preflight_node)
+    workflow.add_node("tester", tester_node)
+    workflow.add_node("debugger", debugger_node)
+
+    # Entry point
+    workflow.set_entry_point("architect")
+
+    # Planning phase (sequential)
+    workflow.add_edge("architect", "planner")
+    workflow.add_edge("planner", "orchestrator")
+
+    # Dependency-aware task distribution
+    workflow.add_conditional_edges(
+        "orchestrator",
+        assign_workers,  # Returns "dispatcher" or "synthesizer"
+        ["dispatcher", "synthesizer"]
+    )
 
-# Parallel task distribution using Send() API
-workflow.add_conditional_edges(
-    "orchestrator",
-    assign_workers,  # Returns list of Send() or "synthesizer"
-    ["backend_worker", "frontend_worker", "synthesizer"]
-)
+    # Dispatcher flows to synthesizer once every task has run
+    workflow.add_edge("dispatcher", "synthesizer")
 
-# Both workers flow to synthesizer
-workflow.add_edge("backend_worker", "synthesizer")
-workflow.add_edge("frontend_worker", "synthesizer")
+    # Testing phase: cheap syntax checks first, the LLM tester only if they pass
+    workflow.add_edge("synthesizer", "preflight")
+    workflow.add_conditional_edges(
+        "preflight",
+        preflight_decision,
+        ["tester", "debugger", END]
+    )
 
-# Testing phase
-workflow.add_edge("synthesizer", "tester")
+    # Test result decision
+    workflow.add_conditional_edges(
+        "tester",
+        test_decision,
+        {"debugger": "debugger", END: END}
+    )
 
-# Test result decision
-workflow.add_conditional_edges(
-    "tester",
-    test_decision,
-    {"debugger": "debugger", END: END}
-)
+    # Debugger re-plans and goes back to orchestrator
+    workflow.add_edge("debugger", "orchestrator")
 
-# Debugger re-plans and goes back to orchestrator
-workflow.add_edge("debugger", "orchestrator")
+    return workflow
 
 # Compile the workflow
-app = workflow.compile()
\ No newline at end of file
+def build_app(checkpointer=None, plan_only=False):
+    """Compiles the graph; pass a checkpointer to make runs resumable by thread id."""
+    return build_graph(plan_only).compile(checkpointer=checkpointer)
+
+_app = None
+
+def __getattr__(name):
+    # `workflow.app` is compiled on first use rather than at import
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = build_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,364 @@
+"""
+Out-of-process worker pool. The dispatcher puts worker payloads (task, project root,
+architecture) on a SQLite work queue; worker processes claim them under a lease, run
+them, and post the completed task record back.
+
+    python workqueue.py --processes 4                     # a pool on this host
+    python workqueue.py --processes 8 --queue /shared/dynamicflow/work_queue.sqlite
+
+Pools on other hosts point --queue at the same file and run from a checkout whose
+builds/ directory is shared with the orchestrator. A worker that dies stops renewing its
+lease; once the lease expires the job is claimed again, up to WORK_MAX_ATTEMPTS times.
+Jobs run at least once, so a job whose worker stalled past its lease may run twice.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import socket
+import asyncio
+import sqlite3
+import argparse
+import importlib
+import threading
+import subprocess
+
+import config
+
+DEFAULT_HANDLER = "workqueue:run_worker"
+
+
+class WorkQueue:
+    """Jobs in a SQLite file, claimed by one worker at a time under a renewable lease."""
+
+    def __init__(self, path=config.WORK_QUEUE_PATH, lease=config.WORK_LEASE_SECONDS,
+                 max_attempts=config.WORK_MAX_ATTEMPTS):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # No WAL: the file may live on a filesystem shared with other hosts
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, "
+                "status TEXT NOT NULL DEFAULT 'queued', worker TEXT, lease_until REAL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT, "
+                "created_at REAL NOT NULL, finished_at REAL);"
+                "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);"
+                "CREATE TABLE IF NOT EXISTS workers (id TEXT PRIMARY KEY, started_at REAL, seen_at REAL);"
+            )
+        return self._conn
+
+    def _write(self, sql, params=()):
+        with self._lock:
+            return self._db().execute(sql, params)
+
+    def submit(self, payload):
+        cursor = self._write(
+            "INSERT INTO jobs (payload, created_at) VALUES (?, ?)", (json.dumps(payload), time.time())
+        )
+        return cursor.lastrowid
+
+    def claim(self, worker):
+        """Leases the oldest queued job to `worker`. Returns (job id, payload) or None."""
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose worker stopped renewing the lease go back on the queue, or fail for good
+                db.execute(
+                    "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                    "error = 'lease expired (worker ' || worker || ' stopped responding)', worker = NULL "
+                    "WHERE status = 'claimed' AND lease_until < ?",
+                    (self.max_attempts, now),
+                )
+                row = db.execute("SELECT id, payload FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+                if row:
+                    db.execute(
+                        "UPDATE jobs SET status = 'claimed', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                        "WHERE id = ?",
+                        (worker, now + self.lease, row[0]),
+                    )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return (row[0], json.loads(row[1])) if row else None
+
+    def heartbeat(self, job_id, worker):
+        """Renews the lease; False if the job was given to another worker meanwhile."""
+        cursor = self._write(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'claimed'",
+            (time.time() + self.lease, job_id, worker),
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, worker, result):
+        """Posts a result. Only the worker holding the lease can; a late duplicate is dropped."""
+        cursor = self._write(
+            "UPDATE jobs SET status = 'done', result = ?, finished_at = ? "
+            "WHERE id = ? AND worker = ? AND status = 'claimed'",
+            (json.dumps(result), time.time(), job_id, worker),
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, worker, error):
+        """Puts a job that raised back on the queue, or fails it once it is out of attempts."""
+        self._write(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+            "error = ?, worker = NULL, finished_at = ? WHERE id = ? AND worker = ? AND status = 'claimed'",
+            (self.max_attempts, error, time.time(), job_id, worker),
+        )
+
+    def finished(self, job_ids):
+        """(job id, status, result, error, attempts) for those of job_ids that are done or failed."""
+        if not job_ids:
+            return []
+        marks = ", ".join("?" * len(job_ids))
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT id, status, result, error, attempts FROM jobs "
+                f"WHERE id IN ({marks}) AND status IN ('done', 'failed')",
+                list(job_ids),
+            ).fetchall()
+        return [(i, status, json.loads(result) if result else None, error, attempts)
+                for i, status, result, error, attempts in rows]
+
+    def forget(self, job_ids):
+        if job_ids:
+            self._write(f"DELETE FROM jobs WHERE id IN ({', '.join('?' * len(job_ids))})", list(job_ids))
+
+    def register(self, worker):
+        now = time.time()
+        self._write("INSERT OR REPLACE INTO workers (id, started_at, seen_at) VALUES (?, ?, ?)", (worker, now, now))
+
+    def seen(self, worker):
+        self._write("UPDATE workers SET seen_at = ? WHERE id = ?", (time.time(), worker))
+
+    def live_workers(self):
+        """Workers that checked in within the last lease period."""
+        with self._lock:
+            return [row[0] for row in self._db().execute(
+                "SELECT id FROM workers WHERE seen_at > ?", (time.time() - self.lease,)
+            )]
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {"queued": counts.get("queued", 0), "claimed": counts.get("claimed", 0),
+                "done": counts.get("done", 0), "failed": counts.get("failed", 0)}
+
+
+# --- WORKER PROCESS ---
+
+async def run_worker(payload):
+    """Default job handler: runs the backend or frontend worker on a WorkerState payload."""
+    from workflow import WORKERS, backend_worker
+
+    worker = WORKERS.get(payload["task"].get("assigned_agent"), backend_worker)
+    return (await worker(payload))["completed"]
+
+
+def load_handler(spec):
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+async def serve(queue, handler, concurrency=config.WORKER_CONCURRENCY, idle=0.1):
+    """Claims and runs jobs, `concurrency` at a time, until the process is stopped."""
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    slots = asyncio.Semaphore(concurrency)
+    queue.register(worker)
+    print(f"👷 [Worker {worker}] Serving {queue.path} ({concurrency} at a time)")
+
+    async def keep_lease(job_id, runner):
+        while True:
+            await asyncio.sleep(queue.lease / 3)
+            if not await asyncio.to_thread(queue.heartbeat, job_id, worker):
+                # Withdrawn by its submitter or given to another worker; nobody wants this run's result
+                runner.cancel()
+                return
+
+    async def run(job_id, payload):
+        lease = asyncio.create_task(keep_lease(job_id, asyncio.current_task()))
+        try:
+            result = await handler(payload)
+            await asyncio.to_thread(queue.complete, job_id, worker, result)
+        except asyncio.CancelledError:
+            if not lease.done():
+                raise  # The worker is shutting down
+            print(f"   ⚠️  [Worker {worker}] Job {job_id} was withdrawn; stopped working on it")
+        except Exception as e:
+            print(f"   ⚠️  [Worker {worker}] Job {job_id} failed: {e}")
+            await asyncio.to_thread(queue.fail, job_id, worker, f"{type(e).__name__}: {e}")
+        finally:
+            lease.cancel()
+            slots.release()
+
+    running = set()  # The loop only keeps weak references to tasks; these keep running jobs alive
+
+    def finished(task):
+        running.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"   ⚠️  [Worker {worker}] Job runner crashed: {task.exception()!r}")
+
+    last_seen = 0.0
+    try:
+        while True:
+            await slots.acquire()
+            job = await asyncio.to_thread(queue.claim, worker)
+            if time.monotonic() - last_seen > queue.lease / 3:
+                await asyncio.to_thread(queue.seen, worker)
+                last_seen = time.monotonic()
+            if job is None:
+                slots.release()
+                await asyncio.sleep(idle)
+                continue
+            task = asyncio.create_task(run(*job))
+            running.add(task)
+            task.add_done_callback(finished)
+    finally:
+        # Jobs cut short here stop heartbeating, so another worker reclaims them when their lease runs out
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+
+def spawn(processes, queue_path, concurrency, handler=DEFAULT_HANDLER, quiet=False, share=None):
+    """
+    Starts worker processes running this module, in the current directory. Each gets
+    1/`share` of every endpoint's LLM concurrency limit (default: 1/`processes`).
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--processes", "1", "--queue", queue_path,
+               "--concurrency", str(concurrency), "--handler", handler]
+    env = {**os.environ, "DYNAMICFLOW_LLM_PROCESS_SHARE": str(share or processes)}
+    output = subprocess.DEVNULL if quiet else None
+    return [subprocess.Popen(command, stdout=output, stderr=output, env=env) for _ in range(processes)]
+
+
+def stop(processes):
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+# --- ORCHESTRATOR SIDE ---
+
+class QueueExecutor:
+    """
+    Runs worker payloads through the work queue. Starts WORKER_PROCESSES local worker
+    processes on first use (and restarts any that die); pools on other hosts can join
+    by pointing at the same queue. One poller per event loop collects every result.
+    """
+
+    def __init__(self, path=config.WORK_QUEUE_PATH, processes=config.WORKER_PROCESSES,
+                 concurrency=config.WORKER_CONCURRENCY, poll=0.05):
+        self.queue = WorkQueue(path)
+        self.processes = processes
+        self.concurrency = concurrency
+        self.poll = poll
+        self.local = []
+        self._waiting = {}  # job id -> future
+        self._poller = None
+        self._started = False
+
+    def _ensure_local_pool(self):
+        alive = [p for p in self.local if p.poll() is None]
+        if len(alive) < len(self.local):
+            print(f"   ⚠️  [Work Queue] {len(self.local) - len(alive)} worker processes exited; restarting them")
+        missing = self.processes - len(alive)
+        if missing > 0:
+            # The graph process calls the model too, so it counts as one of the sharers
+            alive += spawn(missing, self.queue.path, self.concurrency, share=self.processes + 1)
+        self.local[:] = alive  # In place: atexit holds this list
+
+    async def _collect(self):
+        while self._waiting:
+            await asyncio.sleep(self.poll)
+            for job_id, status, result, error, attempts in await asyncio.to_thread(self.queue.finished, list(self._waiting)):
+                future = self._waiting.pop(job_id)
+                # The scheduler cancels the other tasks when one fails; their results are dropped
+                if not future.done():
+                    if status == "done":
+                        future.set_result(result)
+                    else:
+                        future.set_exception(RuntimeError(f"job {job_id} failed after {attempts} attempts: {error}"))
+                await asyncio.to_thread(self.queue.forget, [job_id])
+            self._ensure_local_pool()
+        self._poller = None
+
+    async def run(self, payload):
+        """Queues one worker payload and returns the task record the worker posts back."""
+        if not self._started:
+            self._started = True
+            atexit.register(stop, self.local)
+            if not self.processes and not self.queue.live_workers():
+                print(f"   ⚠️  [Work Queue] No local worker processes and no pool serving {self.queue.path} yet; "
+                      f"start one with: python workqueue.py --queue {self.queue.path}")
+        self._ensure_local_pool()
+        job_id = await asyncio.to_thread(self.queue.submit, payload)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[job_id] = future
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._collect())
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # Withdraws the job: a worker running it stops at its next heartbeat
+            self._waiting.pop(job_id, None)
+            self.queue.forget([job_id])
+            raise
+
+
+_executor = None
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = QueueExecutor()
+    return _executor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run DynamicFlow worker processes against a work queue.")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Worker processes to start; they split each endpoint's LLM concurrency limit between them")
+    parser.add_argument("--concurrency", type=int, default=config.WORKER_CONCURRENCY, help="Jobs each process runs at once")
+    parser.add_argument("--queue", default=config.WORK_QUEUE_PATH, help="Work queue file, shared by every pool")
+    parser.add_argument("--handler", default=DEFAULT_HANDLER, help="module:function that runs one job")
+    args = parser.parse_args(argv)
+
+    if args.processes == 1:
+        if args.handler == DEFAULT_HANDLER:
+            importlib.import_module("workflow")  # Load the graph before registering, so a live worker is a ready one
+        try:
+            asyncio.run(serve(WorkQueue(args.queue), load_handler(args.handler), args.concurrency))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    processes = spawn(args.processes, args.queue, args.concurrency, args.handler)
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        stop(processes)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
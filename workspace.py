@@ -0,0 +1,56 @@
+import os
+import shutil
+
+# Code the agents write; write_file and edit_file replace these files rather than writing into them
+SOURCE_EXTENSIONS = (
+    ".py", ".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx", ".html", ".htm", ".css", ".scss",
+    ".vue", ".svelte", ".md", ".toml", ".yaml", ".yml", ".ini", ".cfg", ".sh", ".sql",
+)
+# Installed dependencies, which a running app reads but doesn't write
+DEPENDENCY_DIRS = {"node_modules", ".venv", "venv", "site-packages", "__pycache__"}
+
+
+def clone_workspace(src, dst):
+    """
+    Makes a cheap copy of the project at src. Source files and installed dependencies
+    are hard-linked, which is safe because the tools replace source files instead of
+    writing into them. Everything else (JSON and SQLite data, logs, uploads) is copied,
+    since the app under test writes those in place and a link would share them with
+    the original project and the other candidates. Falls back to a real copy where hard
+    links aren't possible (e.g. across filesystems).
+    """
+    discard_workspace(dst)  # Left over from an interrupted run
+    _clone_dir(src, dst)
+    return dst
+
+
+def _clone_dir(src, dst, link_all=False):
+    os.makedirs(dst, exist_ok=True)
+    with os.scandir(src) as it:
+        for entry in it:
+            target = os.path.join(dst, entry.name)
+            if entry.is_symlink():
+                os.symlink(os.readlink(entry.path), target)
+            elif entry.is_dir():
+                _clone_dir(entry.path, target, link_all or entry.name in DEPENDENCY_DIRS)
+            elif link_all or entry.name.lower().endswith(SOURCE_EXTENSIONS):
+                try:
+                    os.link(entry.path, target)
+                except OSError:
+                    shutil.copy2(entry.path, target)
+            else:
+                shutil.copy2(entry.path, target)
+
+
+def promote_workspace(clone, target):
+    """Swaps clone into target's place, then deletes the old tree."""
+    old = f"{target}.old-{os.getpid()}"
+    discard_workspace(old)
+    if os.path.exists(target):
+        os.rename(target, old)
+    os.rename(clone, target)
+    discard_workspace(old)
+
+
+def discard_workspace(path):
+    shutil.rmtree(path, ignore_errors=True)